@@ -0,0 +1,295 @@
+"""Service HTTP local : les chiffres du tableau de bord en JSON.
+
+Exemples :
+    python api.py --historique .solaire_historique.sqlite   # historique SQLite (voir `historique`)
+    python api.py --fichier site_solaire.csv --port 8502
+    curl "http://127.0.0.1:8502/indicateurs?site=Site_A&debut=2025-01-01&fin=2025-01-31&types=Solaire,Batterie"
+
+Routes (GET), avec les paramètres des filtres de la barre latérale :
+- `/sites` : sites, types d'énergie et plage de dates disponibles ;
+- `/indicateurs?site=&debut=&fin=&types=` : production, consommation,
+  rendement et consommation batterie ;
+- `/periodes?periode=15 min|Heure|Jour|Semaine|Mois|<durée>&site=&debut=&fin=&types=`
+  : totaux par période (durée d'une fenêtre personnalisée d'au moins 15 min,
+  par exemple `6h` ou `3D`) ; avec `reference=Année précédente|Période précédente`,
+  totaux de la période de référence et évolution en regard ;
+- `/multi_sites?sites=` : totaux par site ;
+- `/anomalies?fenetre=` : périodes signalées par la surveillance de flotte.
+
+Un paramètre absent prend la valeur par défaut du tableau de bord (premier
+site, tous les types, toute la période). Plusieurs valeurs s'écrivent
+séparées par des virgules ou en répétant le paramètre.
+
+Chaque réponse porte un ETag calculé à partir de la version des données et
+de la requête : une requête conditionnelle (`If-None-Match`) sur des
+données inchangées reçoit un 304 sans aucun calcul. Les réponses calculées
+sont gardées dans un cache LRU, invalidé par tout nouvel import.
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import math
+import os
+import sys
+import threading
+import traceback
+from collections import OrderedDict
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+import periodes
+from historique import CHEMIN_HISTORIQUE, Historique
+from maintenance import FENETRE_JOURS, sites_signales
+from moteur import Analyse, AnalyseHistorique, charger
+
+HOTE = "127.0.0.1"
+PORT = 8502
+# Réponses gardées en mémoire
+ENTREES_CACHE = 256
+
+
+class RequeteInvalide(ValueError):
+    """Paramètre de requête absent de l'historique ou mal formé."""
+
+
+def _json(valeur):
+    # Conversion des types numpy / pandas et des NaN pour json.dumps
+    if isinstance(valeur, (pd.Timestamp, datetime.date)):
+        return valeur.isoformat()
+    if hasattr(valeur, "item"):
+        valeur = valeur.item()
+    if isinstance(valeur, float) and math.isnan(valeur):
+        return None
+    return valeur
+
+
+def _enregistrements(df, index=None):
+    lignes = df.reset_index(names=index) if index else df
+    return [{col: _json(v) for col, v in zip(lignes.columns, ligne)}
+            for ligne in lignes.itertuples(index=False, name=None)]
+
+
+def _liste(parametres, nom):
+    valeurs = [v for brut in parametres.get(nom, []) for v in brut.split(",") if v]
+    return valeurs or None
+
+
+def _date(parametres, nom, defaut):
+    valeur = parametres.get(nom, [None])[-1]
+    if not valeur:
+        return defaut
+    try:
+        return datetime.date.fromisoformat(valeur)
+    except ValueError:
+        raise RequeteInvalide(f"Date invalide pour {nom} : {valeur} (attendu AAAA-MM-JJ)") from None
+
+
+class ServiceAnalyse:
+    """Requêtes du tableau de bord sur l'historique ou sur un export, avec cache de réponses."""
+
+    def __init__(self, historique=None, chemin=None, entrees_cache=ENTREES_CACHE):
+        self.historique = historique
+        self.chemin = chemin
+        self.entrees_cache = entrees_cache
+        self._reponses = OrderedDict()
+        self._analyse = None
+        self._version_analyse = None
+        self._verrou = threading.Lock()
+
+    def version(self):
+        """Version des données : change à chaque import dans l'historique ou modification du fichier."""
+        if self.historique is not None:
+            return self.historique.version()
+        stat = os.stat(self.chemin)
+        return f"{self.chemin}-{stat.st_size}-{stat.st_mtime_ns}"
+
+    def analyse(self, version):
+        with self._verrou:
+            if self._version_analyse != version:
+                if self.historique is not None:
+                    if self.historique.vide():
+                        raise RequeteInvalide("Historique vide : aucun fichier importé")
+                    self._analyse = AnalyseHistorique(self.historique)
+                else:
+                    # Fichier rechargé seulement s'il a changé depuis la dernière lecture
+                    self._analyse = Analyse(charger(self.chemin))
+                self._version_analyse = version
+            return self._analyse
+
+    @staticmethod
+    def etag(version, route, parametres):
+        requete = json.dumps([route, sorted((k, sorted(v)) for k, v in parametres.items())])
+        return '"' + hashlib.blake2b(f"{version}|{requete}".encode(), digest_size=12).hexdigest() + '"'
+
+    def repondre(self, route, parametres, si_different=None):
+        """(statut HTTP, corps JSON, ETag) ; 304 sans calcul si l'ETag `si_different` est à jour."""
+        version = self.version()
+        etag = self.etag(version, route, parametres)
+        if si_different is not None and etag in [e.strip() for e in si_different.split(",")]:
+            return HTTPStatus.NOT_MODIFIED, b"", etag
+
+        with self._verrou:
+            corps = self._reponses.get(etag)
+            if corps is not None:
+                self._reponses.move_to_end(etag)
+                return HTTPStatus.OK, corps, etag
+
+        try:
+            resultat = self.calculer(self.analyse(version), route, parametres)
+        except RequeteInvalide as exc:
+            return HTTPStatus.BAD_REQUEST, json.dumps({"erreur": str(exc)}, ensure_ascii=False).encode(), None
+        if resultat is None:
+            return HTTPStatus.NOT_FOUND, json.dumps({"erreur": f"Route inconnue : {route}"}).encode(), None
+
+        corps = json.dumps(resultat, ensure_ascii=False, default=_json).encode("utf-8")
+        with self._verrou:
+            self._reponses[etag] = corps
+            while len(self._reponses) > self.entrees_cache:
+                self._reponses.popitem(last=False)
+        return HTTPStatus.OK, corps, etag
+
+    # ---------------------------
+    # Requêtes
+    # ---------------------------
+
+    def _filtres(self, analyse, parametres):
+        """(site, types, debut, fin) comme dans la barre latérale, valeurs par défaut comprises."""
+        sites = analyse.sites()
+        site = parametres.get("site", [sites[0] if sites else None])[-1]
+        if site not in sites:
+            raise RequeteInvalide(f"Site inconnu : {site}")
+        types = _liste(parametres, "types") or analyse.types_energie()
+        inconnus = set(types) - set(analyse.types_energie())
+        if inconnus:
+            raise RequeteInvalide(f"Type(s) d'énergie inconnu(s) : {', '.join(sorted(inconnus))}")
+        premier, dernier = analyse.bornes_dates()
+        debut = _date(parametres, "debut", premier)
+        fin = _date(parametres, "fin", dernier)
+        return site, types, debut, fin
+
+    def calculer(self, analyse, route, parametres):
+        """Résultat JSON-isable d'une route, ou None si la route est inconnue."""
+        if route == "/sites":
+            premier, dernier = analyse.bornes_dates()
+            return {"sites": analyse.sites(), "types_energie": analyse.types_energie(),
+                    "debut": premier, "fin": dernier}
+
+        if route == "/indicateurs":
+            site, types, debut, fin = self._filtres(analyse, parametres)
+            indicateurs = analyse.indicateurs(site, types, debut, fin)
+            return {"site": site, "types": types, "debut": debut, "fin": fin,
+                    **{cle: _json(v) for cle, v in indicateurs.items()}}
+
+        if route == "/periodes":
+            periode = parametres.get("periode", ["Jour"])[-1]
+            reference = parametres.get("reference", [None])[-1]
+            try:
+                periodes.pas_periode(periode)
+            except ValueError as exc:
+                raise RequeteInvalide(f"{exc} ; périodes : {', '.join(periodes.PERIODES)} ou une durée") from None
+            if reference is not None and reference not in periodes.REFERENCES:
+                raise RequeteInvalide(f"Référence inconnue : {reference} (parmi {', '.join(periodes.REFERENCES)})")
+            site, types, debut, fin = self._filtres(analyse, parametres)
+            if debut > fin:
+                raise RequeteInvalide(f"Plage de dates vide : début {debut} après la fin {fin}")
+            try:
+                if reference is None:
+                    serie = analyse.regroupement(periode, site, types, debut, fin)
+                else:
+                    serie = analyse.comparaison(periode, site, types, debut, fin, reference)
+            except ValueError as exc:
+                # Trop de périodes sur la plage demandée (voir `periodes.PERIODES_MAX`)
+                raise RequeteInvalide(str(exc)) from None
+            return {"site": site, "types": types, "debut": debut, "fin": fin, "periode": periode,
+                    "reference": reference, "totaux": _enregistrements(serie, "Periode")}
+
+        if route == "/multi_sites":
+            sites = _liste(parametres, "sites") or analyse.sites()
+            inconnus = set(sites) - set(analyse.sites())
+            if inconnus:
+                raise RequeteInvalide(f"Site(s) inconnu(s) : {', '.join(sorted(inconnus))}")
+            return {"totaux": _enregistrements(analyse.par_site(sites), "Site")}
+
+        if route == "/anomalies":
+            try:
+                fenetre = int(parametres.get("fenetre", [FENETRE_JOURS])[-1])
+            except ValueError:
+                raise RequeteInvalide("La fenêtre doit être un nombre de jours") from None
+            try:
+                anomalies = analyse.anomalies(fenetre=fenetre)
+            except ValueError as exc:
+                # Fenêtre hors limites, refusée par `maintenance.balayer_flotte`
+                raise RequeteInvalide(str(exc)) from None
+            return {"fenetre": fenetre, "sites": _enregistrements(sites_signales(anomalies), "Site"),
+                    "anomalies": _enregistrements(anomalies)}
+        return None
+
+
+class Gestionnaire(BaseHTTPRequestHandler):
+    service = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        try:
+            statut, corps, etag = self.service.repondre(
+                url.path.rstrip("/") or "/", parse_qs(url.query), self.headers.get("If-None-Match"),
+            )
+        except Exception as exc:
+            # Erreur imprévue : réponse JSON plutôt qu'une connexion coupée
+            traceback.print_exc(file=sys.stderr)
+            statut, etag = HTTPStatus.INTERNAL_SERVER_ERROR, None
+            corps = json.dumps({"erreur": f"Erreur interne : {exc}"}, ensure_ascii=False).encode("utf-8")
+        self.send_response(statut)
+        if etag is not None:
+            self.send_header("ETag", etag)
+            # Les clients revalident à chaque appel : 304 tant que rien n'a changé
+            self.send_header("Cache-Control", "no-cache")
+        if statut != HTTPStatus.NOT_MODIFIED:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(corps)))
+        self.end_headers()
+        if statut != HTTPStatus.NOT_MODIFIED:
+            self.wfile.write(corps)
+
+    def log_message(self, format, *args):
+        # Journal sur la sortie d'erreur, sans l'horodatage par défaut
+        print(f"{self.command} {self.path} → {args[1] if len(args) > 1 else ''}", file=sys.stderr)
+
+
+def serveur(service, hote=HOTE, port=PORT):
+    gestionnaire = type("GestionnaireAnalyse", (Gestionnaire,), {"service": service})
+    return ThreadingHTTPServer((hote, port), gestionnaire)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Service JSON local des indicateurs du tableau de bord.")
+    parser.add_argument("--fichier", help="export CSV / Excel à servir (défaut : l'historique)")
+    parser.add_argument("--historique", default=CHEMIN_HISTORIQUE,
+                        help="base SQLite de l'historique (défaut : SOLAIRE_HISTORIQUE)")
+    parser.add_argument("--hote", default=HOTE, help=f"adresse d'écoute (défaut : {HOTE})")
+    parser.add_argument("--port", type=int, default=PORT, help=f"port d'écoute (défaut : {PORT})")
+    args = parser.parse_args(argv)
+
+    if args.fichier:
+        service = ServiceAnalyse(chemin=args.fichier)
+    elif args.historique:
+        service = ServiceAnalyse(historique=Historique(args.historique))
+    else:
+        print("Aucune donnée : indiquez --fichier ou --historique", file=sys.stderr)
+        return 1
+
+    with serveur(service, args.hote, args.port) as httpd:
+        print(f"API disponible sur http://{args.hote}:{args.port}", file=sys.stderr)
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
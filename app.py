@@ -1,10 +1,24 @@
+from collections import Counter
+
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-import io
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet
-import tempfile
+
+import diagnostics
+import graphiques
+import graphiques_vega
+import maintenance
+import periodes
+import qualite
+import rapports
+import stockage
+from historique import CHEMIN_HISTORIQUE, Historique
+from ingestion import (
+    COLONNES_ATTENDUES, CacheIngestion, ColonnesManquantes, charger_plusieurs, empreinte, empreinte_lot,
+    fusionner,
+)
+from moteur import (
+    Analyse, AnalyseHistorique, TropDeLignesExcel, alertes_maintenance, export_csv, export_excel,
+    export_excel_par_site, export_parquet,
+)
 
 # ===========================
 # CONFIGURATION DE LA PAGE
@@ -12,225 +26,482 @@ import tempfile
 st.set_page_config(page_title="Analyse Site Solaire", layout="wide")
 st.title("☀️ Tableau de bord - Site Solaire")
 
-# Style global des graphiques Matplotlib
-plt.style.use("seaborn-v0_8-whitegrid")
-plt.rcParams.update({
-    "figure.figsize": (8, 4),
-    "axes.titlesize": 14,
-    "axes.labelsize": 12,
-    "legend.fontsize": 10,
-    "font.family": "sans-serif",
-    "font.sans-serif": "Arial"
-})
+# Mesures du rerun (panneau 🩺 Diagnostics de la barre latérale)
+mesures = diagnostics.demarrer("app.py")
 
 # ===========================
 # CHARGEMENT DES DONNÉES
 # ===========================
-uploaded_file = st.file_uploader("📂 Importer un fichier (CSV ou Excel)", type=["csv", "xlsx"])
+# Plusieurs fichiers acceptés (par exemple un export par site et par mois)
+uploaded_files = st.file_uploader("📂 Importer des fichiers (CSV ou Excel)", type=["csv", "xlsx"],
+                                  accept_multiple_files=True)
 
-if uploaded_file:
-    if uploaded_file.name.endswith(".csv"):
-        data = pd.read_csv(uploaded_file, parse_dates=["Date"])
-    else:
-        data = pd.read_excel(uploaded_file, parse_dates=["Date"])
+@st.cache_resource
+def cache_ingestion():
+    # Un seul cache par processus, partagé par toutes les sessions
+    return CacheIngestion()
 
-    colonnes_attendues = {"Date", "Site", "Type_Energie", "Production_kWh", "Consommation_kWh"}
-    if not colonnes_attendues.issubset(data.columns):
-        st.error(f"❌ Le fichier doit contenir les colonnes suivantes : {colonnes_attendues}")
-        st.stop()
 
-    data = data.sort_values("Date")
+@st.cache_resource
+def cache_graphiques():
+    # Images des graphiques partagées par toutes les sessions
+    return graphiques.CacheGraphiques()
 
-    # ===========================
-    # BARRE LATÉRALE - FILTRES
-    # ===========================
-    st.sidebar.header("⚙️ Filtres généraux")
-    sites = data["Site"].unique()
-    site_choice = st.sidebar.selectbox("Choisir un site :", sites)
-    date_range = st.sidebar.date_input(
-        "Sélectionner la période :", 
-        [data["Date"].min().date(), data["Date"].max().date()]
-    )
-    energy_types = st.sidebar.multiselect(
-        "Types d’énergie :", 
-        options=data["Type_Energie"].unique(),
-        default=data["Type_Energie"].unique()
-    )
 
-    mask = (
-        (data["Date"].between(pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1]))) &
-        (data["Site"] == site_choice) &
-        (data["Type_Energie"].isin(energy_types))
-    )
-    df_filtered = data.loc[mask]
+@st.cache_resource
+def pool_rapports():
+    # Pool partagé : la génération des PDF ne bloque plus le script
+    return rapports.nouveau_pool()
 
-    if df_filtered.empty:
-        st.warning("⚠️ Aucune donnée disponible pour les filtres sélectionnés.")
-    else:
-        # ===========================
-        # ONGLET PRINCIPAUX
-        # ===========================
-        tab1, tab2, tab3, tab4 = st.tabs([
-            "⚡ Performance", 
-            "📊 Consommation", 
-            "📅 Comparaison", 
-            "🛠 Maintenance"
-        ])
 
-        # ---------------------------
-        # 🔹 ONGLET 1 : PERFORMANCE
-        # ---------------------------
-        with tab1:
-            st.subheader(f"Performance du site : {site_choice}")
-            st.write(df_filtered.head())
-
-            total_prod = df_filtered["Production_kWh"].sum()
-            total_cons = df_filtered["Consommation_kWh"].sum()
-            rendement = (total_cons / total_prod * 100) if total_prod > 0 else 0
-
-            col1, col2, col3 = st.columns(3)
-            col1.metric("Production totale", f"{total_prod:.2f} kWh")
-            col2.metric("Consommation totale", f"{total_cons:.2f} kWh")
-            col3.metric("Rendement global", f"{rendement:.1f} %")
-
-            # Graphique production vs consommation
-            fig, ax = plt.subplots()
-            ax.plot(df_filtered["Date"], df_filtered["Production_kWh"], 
-                    color="#1f77b4", linewidth=2.5, label="Production solaire")
-            ax.plot(df_filtered["Date"], df_filtered["Consommation_kWh"], 
-                    color="#ff7f0e", linewidth=2.5, linestyle="--", label="Consommation énergétique")
-
-            ax.set_title("Production vs Consommation d'énergie", fontsize=14, fontweight='bold')
-            ax.set_xlabel("Date")
-            ax.set_ylabel("Énergie (kWh)")
-            ax.legend(loc="upper left", frameon=True, facecolor="white", edgecolor="gray")
-            ax.grid(True, linestyle="--", alpha=0.6)
-            plt.tight_layout()
-            st.pyplot(fig)
+@st.cache_resource
+def historique():
+    # Historique SQLite partagé par toutes les sessions, activé par
+    # SOLAIRE_HISTORIQUE=<fichier.sqlite> (désactivé par défaut)
+    return Historique() if CHEMIN_HISTORIQUE else None
 
-        # ---------------------------
-        # 🔹 ONGLET 2 : CONSOMMATION
-        # ---------------------------
-        with tab2:
-            st.subheader("Analyse de la consommation par type d’énergie")
-
-            for etype in df_filtered["Type_Energie"].unique():
-                subset = df_filtered[df_filtered["Type_Energie"] == etype]
-                fig, ax = plt.subplots()
-                ax.plot(subset["Date"], subset["Consommation_kWh"], linewidth=2.2, label=f"{etype}")
-                ax.set_title(f"Consommation - {etype}")
-                ax.set_xlabel("Date")
-                ax.set_ylabel("Consommation (kWh)")
-                ax.legend()
-                st.pyplot(fig)
-
-            st.markdown("### Répartition totale de la consommation par type d’énergie")
-            df_sum = df_filtered.groupby("Type_Energie")["Consommation_kWh"].sum()
-            fig, ax = plt.subplots()
-            ax.bar(df_sum.index, df_sum.values, color=["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728"])
-            ax.set_ylabel("Consommation totale (kWh)")
-            ax.set_xlabel("Type d’énergie")
-            plt.xticks(rotation=15)
-            plt.tight_layout()
-            st.pyplot(fig)
 
-        # ---------------------------
-        # 🔹 ONGLET 3 : COMPARAISON
-        # ---------------------------
-        with tab3:
-            st.subheader("Comparaison de périodes et de sites")
-
-            periode = st.radio("Choisir la période :", ["Jour", "Semaine", "Mois"], horizontal=True)
-            if periode == "Jour":
-                df_grouped = df_filtered.groupby(df_filtered["Date"].dt.date).sum(numeric_only=True)
-            elif periode == "Semaine":
-                df_grouped = df_filtered.groupby(df_filtered["Date"].dt.isocalendar().week).sum(numeric_only=True)
-            else:
-                df_grouped = df_filtered.groupby(df_filtered["Date"].dt.to_period("M")).sum(numeric_only=True)
-
-            fig, ax = plt.subplots()
-            ax.plot(df_grouped.index.astype(str), df_grouped["Consommation_kWh"], color="#2ca02c", linewidth=2)
-            ax.set_title("Comparaison de la consommation selon la période")
-            ax.set_xlabel(periode)
-            ax.set_ylabel("Consommation (kWh)")
-            ax.grid(True, linestyle="--", alpha=0.6)
-            plt.tight_layout()
-            st.pyplot(fig)
-
-            st.markdown("### Comparaison multi-sites")
-            sites_selected = st.multiselect("Sélectionner les sites :", sites, default=sites)
-            df_sites = data[data["Site"].isin(sites_selected)].groupby("Site")["Consommation_kWh"].sum()
-
-            fig, ax = plt.subplots()
-            ax.bar(df_sites.index, df_sites.values, color="#9467bd")
-            ax.set_xlabel("Site")
-            ax.set_ylabel("Consommation totale (kWh)")
-            plt.xticks(rotation=10)
-            plt.tight_layout()
-            st.pyplot(fig)
+@diagnostics.en_cache("historique", st.cache_resource(max_entries=32))
+def historiser(cle, _data, nom):
+    # Chaque fichier importé est ajouté une seule fois à l'historique
+    return historique().ajouter(_data, empreinte=cle, nom=nom)
 
-        # ---------------------------
-        # 🔹 ONGLET 4 : MAINTENANCE
-        # ---------------------------
-        with tab4:
-            st.subheader("Indicateurs de maintenance")
-            seuil_rendement = 70
-            if rendement < seuil_rendement:
-                st.error(f"⚠️ Rendement faible : {rendement:.1f} % (seuil {seuil_rendement} %)")
+
+@diagnostics.en_cache("fusion", st.cache_resource(max_entries=8))
+def donnees_fusionnees(cle, _morceaux):
+    # Fichiers d'un import multiple réunis une fois par ensemble de fichiers
+    return fusionner(list(_morceaux.values()))
+
+
+@diagnostics.en_cache("qualite", st.cache_resource(max_entries=16))
+def rapport_qualite(cle, _data):
+    # Contrôle qualité d'un import (ou d'un fichier), une fois par empreinte
+    return qualite.valider(_data)
+
+
+@diagnostics.en_cache("quarantaine", st.cache_resource(max_entries=8))
+def donnees_quarantaine(cle, _data):
+    # (lignes gardées, lignes en quarantaine) d'un import
+    return qualite.quarantaine(_data, rapport_qualite(cle, _data))
+
+
+@diagnostics.en_cache("analyse", st.cache_resource(max_entries=8))
+def analyse_fichier(cle, _data):
+    # Index et cube d'agrégats construits une fois par fichier importé ; les
+    # totaux journaliers calculés pendant une ingestion en flux sont réutilisés.
+    # En mode partagé, l'analyse est publiée une seule fois (Arrow IPC) puis
+    # projetée en mémoire par chaque processus serveur
+    if not stockage.PARTAGE_ACTIF:
+        return Analyse(_data, jours=stockage.lire_jours(cle))
+    if not stockage.partage_publie(cle):
+        Analyse(_data, jours=stockage.lire_jours(cle)).publier(cle)
+    return Analyse.partagee(cle)
+
+
+ONGLETS = ["⚡ Performance", "📊 Consommation", "📅 Comparaison", "🛠 Maintenance"]
+
+MIME_EXCEL = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Format d'export : (nom du fichier, type MIME)
+FORMATS_EXPORT = {
+    "Excel": ("rapport_site_solaire.xlsx", MIME_EXCEL),
+    "Excel (une feuille par site)": ("rapport_sites_solaires.xlsx", MIME_EXCEL),
+    "CSV": ("rapport_site_solaire.csv", "text/csv"),
+}
+if stockage.parquet_disponible():
+    FORMATS_EXPORT["Parquet"] = ("rapport_site_solaire.parquet", "application/vnd.apache.parquet")
+
+
+@diagnostics.en_cache("maintenance", st.cache_resource(max_entries=8))
+def anomalies_flotte(cle, fenetre, _analyse):
+    # Balayage de toute la flotte, une fois par fichier et par fenêtre
+    return _analyse.anomalies(fenetre=fenetre)
+
+
+@diagnostics.en_cache("exports", st.cache_resource(max_entries=8))
+def fichier_export(format_export, filtres, _analyse, _df):
+    # Construit seulement à la demande, puis réutilisé tant que les filtres
+    # (empreinte, site, types, dates) ne changent pas
+    if format_export == "Excel (une feuille par site)":
+        _, _, energy_types, debut, fin = filtres
+        feuilles = ((site, _analyse.selection(site, energy_types, debut, fin)) for site in _analyse.sites())
+        return export_excel_par_site(feuilles)
+    if format_export == "CSV":
+        return export_csv(_df)
+    if format_export == "Parquet":
+        return export_parquet(_df)
+    return export_excel(_df)
+
+
+def afficher_graphique(mesures, cle, nom, *args):
+    # Graphique `nom` de `graphiques` : image lue dans le cache (ou rendue), ou
+    # spécification Vega-Lite dessinée par le navigateur si ce graphique a été
+    # choisi dans la barre latérale ; mesuré comme une étape du rerun
+    if nom in st.session_state.get("graphiques_navigateur", graphiques_vega.NAVIGATEUR_PAR_DEFAUT):
+        with mesures.etape(f"graphique {cle[0]} (navigateur)"):
+            st.altair_chart(getattr(graphiques_vega, nom)(*args), use_container_width=True)
+        return
+    with mesures.etape(f"graphique {cle[0]}"):
+        image = cache_graphiques().obtenir(cle, getattr(graphiques, nom), *args)
+    st.image(image, use_container_width=True)
+
+
+# ===========================
+# ONGLETS (fragments)
+# ===========================
+# Chaque onglet est un fragment : un widget interne (période, sites comparés)
+# ne relance que son onglet, et seul l'onglet affiché est calculé.
+
+@st.fragment
+def onglet_performance(analyse, filtres, df_filtered, indicateurs):
+    with diagnostics.fragment("performance") as mesures:
+        _, site_choice, _, _, _, reduire = filtres
+        st.subheader(f"Performance du site : {site_choice}")
+        st.write(df_filtered.head())
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Production totale", f"{indicateurs['total_prod']:.2f} kWh")
+        col2.metric("Consommation totale", f"{indicateurs['total_cons']:.2f} kWh")
+        col3.metric("Rendement global", f"{indicateurs['rendement']:.1f} %")
+
+        # Graphique production vs consommation
+        afficher_graphique(mesures, ("performance",) + filtres, "performance", df_filtered, reduire)
+
+
+@st.fragment
+def onglet_consommation(analyse, filtres, df_filtered):
+    with diagnostics.fragment("consommation") as mesures:
+        _, site_choice, energy_types, debut, fin, reduire = filtres
+        st.subheader("Analyse de la consommation par type d’énergie")
+
+        for etype in df_filtered["Type_Energie"].unique():
+            subset = df_filtered[df_filtered["Type_Energie"] == etype]
+            afficher_graphique(mesures, ("consommation", etype) + filtres, "consommation_type",
+                               subset, etype, reduire)
+
+        st.markdown("### Répartition totale de la consommation par type d’énergie")
+        with mesures.etape("totaux par type"):
+            df_sum = analyse.par_type(site_choice, energy_types, debut, fin)["Consommation_kWh"]
+        afficher_graphique(mesures, ("repartition",) + filtres, "repartition_types", df_sum)
+
+
+@st.fragment
+def onglet_comparaison(analyse, filtres):
+    with diagnostics.fragment("comparaison") as mesures:
+        cle, site_choice, energy_types, debut, fin, reduire = filtres
+        st.subheader("Comparaison de périodes et de sites")
+
+        col1, col2 = st.columns([3, 1])
+        periode = col1.radio("Choisir la période :", periodes.PERIODES + ["Personnalisée"],
+                             index=2, horizontal=True)
+        if periode == "Personnalisée":
+            heures = col1.number_input("Durée de la fenêtre (heures) :", min_value=1, max_value=24 * 92, value=6)
+            periode = f"{heures}h"
+        reference = col2.selectbox("Comparer avec :", ["Aucune"] + periodes.REFERENCES)
+        libelle = periodes.libelle_periode(periode)
+
+        try:
+            if reference == "Aucune":
+                with mesures.etape(f"regroupement {libelle}"):
+                    df_grouped = analyse.regroupement(periode, site_choice, energy_types, debut, fin)
             else:
-                st.success("✅ Rendement satisfaisant")
+                # Période et référence totalisées en un seul passage (voir `periodes.comparer`)
+                with mesures.etape(f"comparaison {libelle} / {reference}"):
+                    df_comparaison = analyse.comparaison(periode, site_choice, energy_types, debut, fin, reference)
+        except ValueError as exc:
+            # Trop de périodes sur la plage choisie (voir `periodes.PERIODES_MAX`)
+            st.error(f"❌ {exc}")
+            return
+
+        if reference == "Aucune":
+            afficher_graphique(mesures, ("periodes", periode) + filtres, "comparaison_periodes",
+                               df_grouped, libelle, reduire)
+        else:
+            afficher_graphique(mesures, ("reference", periode, reference) + filtres, "comparaison_reference",
+                               df_comparaison, libelle, reference, reduire)
+            st.dataframe(df_comparaison, use_container_width=True)
+
+        st.markdown("### Comparaison multi-sites")
+        sites = analyse.sites()
+        sites_selected = st.multiselect("Sélectionner les sites :", sites, default=sites)
+        with mesures.etape("multi-sites"):
+            df_sites = analyse.par_site(sites_selected)["Consommation_kWh"]
+
+        afficher_graphique(mesures, ("sites", cle, tuple(sites_selected)), "comparaison_sites", df_sites)
+
+
+@st.fragment
+def onglet_maintenance(analyse, filtres, indicateurs):
+    with diagnostics.fragment("maintenance") as mesures:
+        st.subheader("Indicateurs de maintenance")
+        for niveau, message in alertes_maintenance(indicateurs):
+            getattr(st, niveau)(message)
 
-            if "Batterie" in df_filtered["Type_Energie"].values:
-                bat_cons = df_filtered[df_filtered["Type_Energie"] == "Batterie"]["Consommation_kWh"].sum()
-                if bat_cons > 0.8 * total_cons:
-                    st.warning("🔋 Les batteries supportent une forte charge de consommation. Vérifiez leur état de santé.")
+        # Tous les sites à la fois, sur toute la période importée
+        st.markdown("### Surveillance de la flotte")
+        fenetre = st.slider("Fenêtre glissante (jours) :", 3, 30, maintenance.FENETRE_JOURS)
+        with mesures.etape("surveillance flotte"):
+            anomalies = anomalies_flotte(filtres[0], fenetre, analyse)
 
+        if anomalies.empty:
+            st.success("✅ Aucune anomalie détectée sur la flotte")
+            return
+        classement = maintenance.sites_signales(anomalies)
+        st.warning(f"⚠️ {len(classement)} site(s) signalé(s), {len(anomalies)} période(s) à vérifier")
+        st.dataframe(classement, use_container_width=True)
+        st.dataframe(anomalies, hide_index=True, use_container_width=True)
+
+
+@st.fragment
+def exports(analyse, filtres, df_filtered):
+    with diagnostics.fragment("exports") as mesures:
         # ---------------------------
-        # 📥 EXPORT EXCEL
+        # 📥 EXPORT DES DONNÉES
         # ---------------------------
-        buffer = io.BytesIO()
-        df_filtered.to_excel(buffer, index=False)
-        st.download_button(
-            label="📥 Télécharger les données en Excel",
-            data=buffer,
-            file_name="rapport_site_solaire.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+        # Le fichier n'est écrit qu'à la demande, plus à chaque rerun
+        format_export = st.selectbox("Format d'export :", list(FORMATS_EXPORT))
+        if st.button("📥 Préparer l'export des données"):
+            try:
+                with st.spinner("Écriture du fichier…"), mesures.etape(f"export {format_export}"):
+                    contenu = fichier_export(format_export, filtres[:5], analyse, df_filtered)
+            except TropDeLignesExcel as exc:
+                # Au-delà de 1 048 576 lignes par feuille, Excel ne peut pas ouvrir le fichier
+                st.warning(f"⚠️ {exc}")
+            else:
+                nom_fichier, mime = FORMATS_EXPORT[format_export]
+                st.download_button(
+                    label=f"📥 Télécharger {nom_fichier}",
+                    data=contenu,
+                    file_name=nom_fichier,
+                    mime=mime
+                )
 
         # ---------------------------
         # 📑 EXPORT PDF
         # ---------------------------
+        # Rapports générés en arrière-plan ; un lot est livré en archive ZIP
+        lot = st.selectbox("Rapport PDF :", rapports.LOTS)
         if st.button("📑 Générer rapport PDF"):
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmpfile:
-                doc = SimpleDocTemplate(tmpfile.name)
-                styles = getSampleStyleSheet()
-                story = []
-
-                story.append(Paragraph("Rapport - Analyse du site solaire", styles["Title"]))
-                story.append(Spacer(1, 20))
-                story.append(Paragraph(f"Production totale : {total_prod:.2f} kWh", styles["Normal"]))
-                story.append(Paragraph(f"Consommation totale : {total_cons:.2f} kWh", styles["Normal"]))
-                story.append(Paragraph(f"Rendement global : {rendement:.1f} %", styles["Normal"]))
-                story.append(Spacer(1, 20))
-
-                fig, ax = plt.subplots()
-                ax.plot(df_filtered["Date"], df_filtered["Production_kWh"], color="#1f77b4", linewidth=2, label="Production")
-                ax.plot(df_filtered["Date"], df_filtered["Consommation_kWh"], color="#ff7f0e", linewidth=2, linestyle="--", label="Consommation")
-                ax.set_title("Production vs Consommation")
-                ax.legend()
-                plt.tight_layout()
-
-                graph_path = tmpfile.name.replace(".pdf", ".png")
-                fig.savefig(graph_path)
-                plt.close(fig)
-
-                story.append(Image(graph_path, width=400, height=200))
-                doc.build(story)
-
-                with open(tmpfile.name, "rb") as f:
-                    st.download_button(
-                        "📥 Télécharger rapport PDF",
-                        f,
-                        file_name="rapport_site_solaire.pdf",
-                        mime="application/pdf"
-                    )
+            _, site_choice, energy_types, debut, fin, reduire = filtres
+            liste = rapports.travaux(lot, analyse, site_choice, list(energy_types), debut, fin)
+            tache = rapports.TacheRapports(pool_rapports(), analyse, liste, list(energy_types), reduire)
+            st.session_state["rapports"] = (filtres, lot, tache)
+
+        en_cours = st.session_state.get("rapports")
+        if en_cours is None or en_cours[:2] != (filtres, lot):
+            return
+        tache = en_cours[2]
+        if not tache.terminee():
+            suivi_rapports(tache)
+            return
+        try:
+            nom_fichier, contenu, mime = tache.resultat()
+        except Exception as exc:
+            st.error(f"❌ Échec de la génération du rapport : {exc}")
+            return
+        st.download_button(f"📥 Télécharger {nom_fichier}", contenu, file_name=nom_fichier, mime=mime)
+
+
+@st.fragment(run_every=0.5)
+def suivi_rapports(tache):
+    # Avancement relu deux fois par seconde ; rerun complet une fois terminé
+    faits, total = tache.avancement()
+    st.progress(faits / total, text=f"📑 Génération des rapports : {faits} / {total}")
+    if tache.terminee():
+        st.rerun()
+
+
+analyse, cle = None, None
+if uploaded_files:
+    # L'empreinte de chaque fichier est calculée une seule fois par import ;
+    # un même contenu importé deux fois n'est lu qu'une fois
+    empreintes = st.session_state.setdefault("empreintes_fichiers", {})
+    fichiers = {}
+    for fichier in uploaded_files:
+        if fichier.file_id not in empreintes:
+            empreintes[fichier.file_id] = empreinte(fichier.getvalue())
+        cle_fichier = empreintes[fichier.file_id]
+        if cle_fichier in fichiers:
+            st.info(f"ℹ️ {fichier.name} : même contenu que {fichiers[cle_fichier].name}, importé une seule fois")
+        else:
+            fichiers[cle_fichier] = fichier
+
+    # Fichiers repérés par leur empreinte ; deux fichiers différents de même
+    # nom (export.csv de deux dossiers) sont numérotés dans l'ordre d'import
+    occurrences = Counter(f.name for f in fichiers.values())
+    rangs = Counter()
+    noms = {}
+    for cle_fichier, f in fichiers.items():
+        rangs[f.name] += 1
+        noms[cle_fichier] = f"{f.name} ({rangs[f.name]})" if occurrences[f.name] > 1 else f.name
+
+    cle = empreinte_lot(list(fichiers))
+    morceaux = {}
+    if stockage.PARTAGE_ACTIF and stockage.partage_publie(cle):
+        # Import déjà analysé et publié par un autre processus serveur : projeté
+        # en mémoire, sans relecture ni copie propre à ce processus
+        with mesures.etape("jeu partagé"):
+            data = analyse_fichier(cle, None).data
+    else:
+        # Progression : octets lus pendant la lecture en flux d'un gros CSV,
+        # fichiers lus pour un import multiple
+        barre = st.empty()
+
+        def progression(lus, total):
+            barre.progress(min(lus / total, 1.0),
+                           text=f"📥 Import en cours : {lus / 1024 ** 2:.0f} / {total / 1024 ** 2:.0f} Mo")
+
+        def progression_fichiers(lus, total):
+            barre.progress(lus / total, text=f"📥 Import en cours : {lus} / {total} fichiers")
+
+        with mesures.etape("ingestion"):
+            if len(fichiers) == 1:
+                (cle_fichier, fichier), = fichiers.items()
+                try:
+                    morceaux = {cle_fichier: cache_ingestion().charger(
+                        fichier.name, fichier.getvalue(), cle=cle_fichier, progression=progression,
+                    )}
+                    erreurs = {}
+                except ColonnesManquantes as exc:
+                    morceaux, erreurs = {}, {cle_fichier: exc}
+            else:
+                morceaux, erreurs = charger_plusieurs(
+                    cache_ingestion(),
+                    [(f.name, f.getvalue(), cle_fichier) for cle_fichier, f in fichiers.items()],
+                    progression=progression_fichiers,
+                )
+        barre.empty()
+
+        for cle_fichier, exc in erreurs.items():
+            if isinstance(exc, ColonnesManquantes):
+                st.error(f"❌ {noms[cle_fichier]} : le fichier doit contenir les colonnes suivantes : "
+                         f"{COLONNES_ATTENDUES}")
+            else:
+                st.error(f"❌ {noms[cle_fichier]} : fichier illisible ({exc})")
+        if not morceaux:
+            st.stop()
+        for cle_fichier, morceau in morceaux.items():
+            invalides = morceau.attrs.get("lignes_invalides", 0)
+            if invalides:
+                st.warning(f"⚠️ {noms[cle_fichier]} : {invalides} ligne(s) écartée(s), date illisible")
+
+        cle = empreinte_lot(list(morceaux))
+        with mesures.etape("fusion"):
+            data = donnees_fusionnees(cle, morceaux)
+        if stockage.PARTAGE_ACTIF:
+            # Jeu complet publié sous son empreinte, même si la quarantaine est
+            # active : les autres processus le trouvent par le raccourci ci-dessus
+            with mesures.etape("publication"):
+                data = analyse_fichier(cle, data).data
+
+    # Contrôle qualité à chaque import ; les lignes signalées peuvent être
+    # écartées des analyses et de l'historique
+    with mesures.etape("contrôle qualité"):
+        rapport = rapport_qualite(cle, data)
+    signalees = rapport.lignes_signalees()
+    titre = "🧪 Qualité des données : " + (
+        "aucune anomalie" if rapport.propre()
+        else f"{signalees} ligne(s) signalée(s), {len(rapport.trous)} trou(s) de mesure"
+    )
+    with st.expander(titre, expanded=False):
+        st.dataframe(rapport.resume(), hide_index=True, use_container_width=True)
+        if not rapport.trous.empty:
+            st.dataframe(rapport.trous, hide_index=True, use_container_width=True)
+        en_quarantaine = st.toggle(
+            "Écarter les lignes signalées (quarantaine)", value=qualite.QUARANTAINE_PAR_DEFAUT, key="quarantaine",
+            help="Doublons, énergies négatives ou manquantes, production sur Batterie / Réseau "
+                 "et lignes sans site ou sans type sont exclus des indicateurs et de l'historique.",
+        )
+    if en_quarantaine and signalees:
+        with mesures.etape("quarantaine"):
+            data, ecartees = donnees_quarantaine(cle, data)
+        st.warning(f"🧪 {signalees} ligne(s) en quarantaine, exclue(s) des analyses")
+        st.download_button("📥 Lignes en quarantaine (CSV)", export_csv(ecartees),
+                           file_name="quarantaine.csv", mime="text/csv")
+        cle = f"{cle}-quarantaine"
+
+    with mesures.etape("index et cube"):
+        analyse = analyse_fichier(cle, data)
+    if historique() is not None:
+        with mesures.etape("historique"):
+            for cle_fichier, morceau in morceaux.items():
+                nom = fichiers[cle_fichier].name
+                if en_quarantaine and rapport_qualite(cle_fichier, morceau).lignes_signalees():
+                    morceau, _ = donnees_quarantaine(cle_fichier, morceau)
+                    cle_fichier = f"{cle_fichier}-quarantaine"
+                historiser(cle_fichier, morceau, nom)
+elif historique() is not None and not historique().vide():
+    # Sans import : tableau de bord ouvert sur l'historique local, seules les
+    # lignes de la sélection sont lues
+    cle = historique().version()
+    analyse = AnalyseHistorique(historique())
+    premier, dernier = analyse.bornes_dates()
+    st.info(f"🗄️ Historique local : {historique().resume()[0]} fichier(s) importé(s), "
+            f"du {premier:%d/%m/%Y} au {dernier:%d/%m/%Y}. Un nouvel import y est ajouté.")
+
+
+if analyse is not None:
+    # ===========================
+    # BARRE LATÉRALE - FILTRES
+    # ===========================
+    # Formulaire : les modifications sont appliquées ensemble, en un seul rerun
+    with st.sidebar.form("filtres"):
+        st.header("⚙️ Filtres généraux")
+        site_choice = st.selectbox("Choisir un site :", analyse.sites())
+        date_range = st.date_input(
+            "Sélectionner la période :", 
+            list(analyse.bornes_dates())
+        )
+        energy_types = st.multiselect(
+            "Types d’énergie :", 
+            options=analyse.types_energie(),
+            default=analyse.types_energie()
+        )
+        reduire = st.checkbox(
+            "Alléger les courbes (≈ 1 point par pixel)",
+            value=graphiques.REDUCTION_ACTIVE,
+            help="Réduit les longues séries avant tracé en conservant pics et creux."
+        )
+        st.multiselect(
+            "Graphiques dessinés dans le navigateur :",
+            options=list(graphiques_vega.GRAPHIQUES),
+            default=graphiques_vega.NAVIGATEUR_PAR_DEFAUT,
+            format_func=graphiques_vega.GRAPHIQUES.get,
+            key="graphiques_navigateur",
+            help="Graphiques vectoriels et zoomables, tracés par le navigateur plutôt qu'en image sur le serveur."
+        )
+        st.form_submit_button("Appliquer les filtres")
+
+    debut, fin = date_range[0], date_range[1]
+    with mesures.etape("filtrage"):
+        df_filtered = analyse.selection(site_choice, energy_types, debut, fin)
+
+    # État des filtres : clé commune des graphiques mis en cache
+    filtres = (cle, site_choice, tuple(energy_types), debut, fin, reduire)
+
+    if df_filtered.empty:
+        st.warning("⚠️ Aucune donnée disponible pour les filtres sélectionnés.")
+    else:
+        with mesures.etape("indicateurs"):
+            indicateurs = analyse.indicateurs(site_choice, energy_types, debut, fin)
+
+        # ===========================
+        # ONGLET PRINCIPAUX
+        # ===========================
+        # Seul l'onglet choisi est exécuté (contrairement à st.tabs)
+        onglet = st.radio("Onglet", ONGLETS, horizontal=True, key="onglet", label_visibility="collapsed")
+
+        with mesures.etape(f"onglet {onglet.split(' ', 1)[1]}"):
+            if onglet == ONGLETS[0]:
+                onglet_performance(analyse, filtres, df_filtered, indicateurs)
+            elif onglet == ONGLETS[1]:
+                onglet_consommation(analyse, filtres, df_filtered)
+            elif onglet == ONGLETS[2]:
+                onglet_comparaison(analyse, filtres)
+            else:
+                onglet_maintenance(analyse, filtres, indicateurs)
+
+        with mesures.etape("exports"):
+            exports(analyse, filtres, df_filtered)
+
+diagnostics.panneau(mesures, {"ingestion": cache_ingestion(), "graphiques": cache_graphiques()})
@@ -1,16 +1,40 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
+
+import diagnostics
+import graphiques
+from cube import CubeAgrege
+from index_donnees import IndexSites, bornes_journees
 
 st.set_page_config(page_title="Analyse Site Solaire", layout="wide")
 
 st.title("☀️ Tableau de bord - Site Solaire")
 
+# Mesures du rerun (panneau 🩺 Diagnostics de la barre latérale)
+mesures = diagnostics.demarrer("appli.py")
+
+
+@diagnostics.en_cache("index_sites", st.cache_resource(max_entries=8))
+def index_sites(cle, _data):
+    # Index (site, type, date) construit une fois par fichier importé
+    return IndexSites(_data)
+
+
+@diagnostics.en_cache("cube_agrege", st.cache_resource(max_entries=8))
+def cube_agrege(cle, _data):
+    # Agrégats jour / semaine / mois construits une fois par fichier importé
+    return CubeAgrege(_data)
+
+
 # --- Chargement des données ---
 uploaded_file = st.file_uploader("📂 Importer un fichier CSV (production & consommation)", type="csv")
 
 if uploaded_file:
-    data = pd.read_csv(uploaded_file, parse_dates=["Date"])
+    with mesures.etape("lecture"):
+        data = pd.read_csv(uploaded_file, parse_dates=["Date"])
+    with mesures.etape("index et cube"):
+        index = index_sites(uploaded_file.file_id, data)
+        cube = cube_agrege(uploaded_file.file_id, data)
 
     # -----------------------------
     # ⚙️ Filtres généraux (sidebar)
@@ -25,15 +49,9 @@ if uploaded_file:
                                           default=data["Type_Energie"].unique())
 
     # Application des filtres
-    mask = (
-        (data["Date"].dt.date.between(date_range[0], date_range[1])) &
-        (data["Site"] == site_choice) &
-        (data["Type_Energie"].isin(energy_types))
-
-
-
-    )
-    df_filtered = data.loc[mask]
+    debut, fin = bornes_journees(date_range[0], date_range[1])
+    with mesures.etape("filtrage"):
+        df_filtered = index.selection(site_choice, energy_types, debut, fin)
 
     # -----------------------------
     # 📑 Onglets
@@ -46,12 +64,14 @@ if uploaded_file:
     ])
 
     # --- Onglet 1 : Performance ---
-    with tab1:
+    with tab1, mesures.etape("onglet Performance"):
         st.subheader(f"Performance du site : {site_choice}")
         st.write(df_filtered.head())
 
-        total_prod = df_filtered["Production_kWh"].sum()
-        total_cons = df_filtered["Consommation_kWh"].sum()
+        # Totaux lus dans les sommes cumulées de l'index
+        totaux = index.sommes(site_choice, energy_types, debut, fin)
+        total_prod = totaux["Production_kWh"]
+        total_cons = totaux["Consommation_kWh"]
         rendement = (total_cons / total_prod * 100) if total_prod > 0 else 0
 
         col1, col2, col3 = st.columns(3)
@@ -60,44 +80,40 @@ if uploaded_file:
         col3.metric("Rendement global", f"{rendement:.1f} %")
 
         # Graphique production vs consommation
-        fig, ax = plt.subplots()
+        fig, ax = graphiques.nouvelle_figure()
         ax.plot(df_filtered["Date"], df_filtered["Production_kWh"], label="Production")
         ax.plot(df_filtered["Date"], df_filtered["Consommation_kWh"], label="Consommation")
         ax.set_xlabel("Date")
         ax.set_ylabel("Énergie (kWh)")
         ax.legend()
-        st.pyplot(fig)
+        with mesures.etape("graphique performance"):
+            st.pyplot(fig)
 
     # --- Onglet 2 : Consommation ---
-    with tab2:
+    with tab2, mesures.etape("onglet Consommation"):
         st.subheader("Analyse de la consommation par type d’énergie")
         for etype in df_filtered["Type_Energie"].unique():
             subset = df_filtered[df_filtered["Type_Energie"] == etype]
             st.line_chart(subset.set_index("Date")["Consommation_kWh"], height=200)
 
-        st.bar_chart(df_filtered.groupby("Type_Energie")["Consommation_kWh"].sum())
+        st.bar_chart(cube.par_type(site_choice, energy_types, debut, fin)["Consommation_kWh"])
 
     # --- Onglet 3 : Comparaison ---
-    with tab3:
+    with tab3, mesures.etape("onglet Comparaison"):
         st.subheader("Comparaison de périodes et de sites")
 
         periode = st.radio("Choisir la période :", ["Jour", "Semaine", "Mois"], horizontal=True)
-        if periode == "Jour":
-            df_grouped = df_filtered.groupby(df_filtered["Date"].dt.date).sum()
-        elif periode == "Semaine":
-            df_grouped = df_filtered.groupby(df_filtered["Date"].dt.isocalendar().week).sum()
-        else:
-            df_grouped = df_filtered.groupby(df_filtered["Date"].dt.to_period("M")).sum()
+        df_grouped = cube.serie(periode, site_choice, energy_types, debut, fin)
 
         st.line_chart(df_grouped["Consommation_kWh"])
 
         st.markdown("### Comparaison multi-sites")
         sites_selected = st.multiselect("Sélectionner les sites :", sites, default=sites)
-        df_sites = data[data["Site"].isin(sites_selected)].groupby("Site")["Consommation_kWh"].sum()
+        df_sites = cube.par_site(sites_selected)["Consommation_kWh"]
         st.bar_chart(df_sites)
 
     # --- Onglet 4 : Maintenance ---
-    with tab4:
+    with tab4, mesures.etape("onglet Maintenance"):
         st.subheader("Indicateurs de maintenance")
         seuil_rendement = 70
         if rendement < seuil_rendement:
@@ -106,7 +122,9 @@ if uploaded_file:
             st.success("✅ Rendement satisfaisant")
 
         # Exemple d'alerte sur batteries
-        if "Batterie" in df_filtered["Type_Energie"].values:
-            bat_cons = df_filtered[df_filtered["Type_Energie"] == "Batterie"]["Consommation_kWh"].sum()
+        if "Batterie" in energy_types:
+            bat_cons = index.sommes(site_choice, ["Batterie"], debut, fin)["Consommation_kWh"]
             if bat_cons > 0.8 * total_cons:
                 st.warning("🔋 Les batteries supportent une forte charge de consommation. Vérifiez leur état de santé.")
+
+diagnostics.panneau(mesures)
@@ -0,0 +1,155 @@
+"""Traitement par lots des exports de sites, en parallèle sur tous les cœurs.
+
+Exemple :
+    python batch.py exports/ --sortie rapports/ --excel --pdf
+
+Chaque fichier CSV/Excel du dossier est traité dans un processus du pool :
+indicateurs et alertes de maintenance pour chaque site qu'il contient, et
+optionnellement un export Excel et un rapport PDF par site. Un récapitulatif
+`indicateurs_sites.csv` et la liste classée des périodes signalées par la
+surveillance de flotte `anomalies_flotte.csv` sont écrits dans le dossier
+de sortie ; avec
+`--archive`, tous les rapports sont aussi regroupés dans `rapports.zip`.
+
+Le contrôle qualité de chaque fichier (voir `qualite`) est résumé dans
+`qualite_donnees.csv` ; avec `--quarantaine`, les lignes signalées sont
+exclues des indicateurs et écrites dans `quarantaine/<fichier>.csv`.
+"""
+import argparse
+import os
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+EXTENSIONS = (".csv", ".xlsx")
+
+
+def lister_exports(dossier):
+    return sorted(
+        os.path.join(dossier, nom)
+        for nom in os.listdir(dossier)
+        if nom.lower().endswith(EXTENSIONS)
+    )
+
+
+def traiter_fichier(chemin, sortie, excel=False, pdf=False, en_quarantaine=False):
+    """Indicateurs (et rapports) de chaque site d'un export, anomalies et contrôle qualité ; exécuté dans un worker."""
+    import qualite
+    from moteur import Analyse, alertes_maintenance, charger, export_excel, rapport_pdf
+
+    data = charger(chemin)
+    rapport = qualite.valider(data)
+    controle = {"fichier": os.path.basename(chemin), **rapport.to_dict()}
+    controle.update(controle.pop("anomalies"))
+    if en_quarantaine and controle["lignes_signalees"]:
+        data, ecartees = qualite.quarantaine(data, rapport)
+        dossier_quarantaine = os.path.join(sortie, "quarantaine")
+        os.makedirs(dossier_quarantaine, exist_ok=True)
+        nom_fichier = os.path.splitext(os.path.basename(chemin))[0]
+        ecartees.to_csv(os.path.join(dossier_quarantaine, f"{nom_fichier}.csv"), index=False)
+
+    analyse = Analyse(data)
+    types = analyse.types_energie()
+    debut, fin = analyse.bornes_dates()
+
+    lignes = []
+    for site in analyse.sites():
+        indicateurs = analyse.indicateurs(site, types, debut, fin)
+        alertes = [message for niveau, message in alertes_maintenance(indicateurs) if niveau != "success"]
+        lignes.append({
+            "fichier": os.path.basename(chemin),
+            "site": site,
+            "debut": debut,
+            "fin": fin,
+            "production_kWh": indicateurs["total_prod"],
+            "consommation_kWh": indicateurs["total_cons"],
+            "rendement_pct": indicateurs["rendement"],
+            "consommation_batterie_kWh": indicateurs["bat_cons"],
+            "alertes": " | ".join(alertes),
+        })
+
+        if excel or pdf:
+            nom_fichier = os.path.splitext(os.path.basename(chemin))[0]
+            dossier_site = os.path.join(sortie, nom_fichier, str(site))
+            os.makedirs(dossier_site, exist_ok=True)
+            df = analyse.selection(site, types, debut, fin)
+            if excel:
+                # Écrit en flux directement dans le fichier
+                export_excel(df, destination=os.path.join(dossier_site, "rapport_site_solaire.xlsx"))
+            if pdf:
+                with open(os.path.join(dossier_site, "rapport_site_solaire.pdf"), "wb") as f:
+                    f.write(rapport_pdf(indicateurs, df, titre=f"Rapport - {site}"))
+
+    anomalies = analyse.anomalies()
+    anomalies.insert(0, "fichier", os.path.basename(chemin))
+    return lignes, anomalies, controle
+
+
+def archiver(sortie, nom="rapports.zip"):
+    """Regroupe les rapports écrits dans `sortie` dans une seule archive ZIP."""
+    chemin_archive = os.path.join(sortie, nom)
+    with zipfile.ZipFile(chemin_archive, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for dossier, _, noms in os.walk(sortie):
+            for nom_fichier in sorted(noms):
+                chemin = os.path.join(dossier, nom_fichier)
+                if chemin != chemin_archive:
+                    archive.write(chemin, os.path.relpath(chemin, sortie))
+    return chemin_archive
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Indicateurs et rapports pour un dossier d'exports de sites.")
+    parser.add_argument("dossier", help="dossier contenant les exports CSV / Excel")
+    parser.add_argument("--sortie", default="rapports", help="dossier des résultats (défaut : rapports)")
+    parser.add_argument("--workers", type=int, default=None, help="nombre de processus (défaut : tous les cœurs)")
+    parser.add_argument("--excel", action="store_true", help="écrire un export Excel par site")
+    parser.add_argument("--pdf", action="store_true", help="écrire un rapport PDF par site")
+    parser.add_argument("--archive", action="store_true", help="regrouper les résultats dans rapports.zip")
+    parser.add_argument("--quarantaine", action="store_true",
+                        help="exclure les lignes signalées par le contrôle qualité")
+    args = parser.parse_args(argv)
+
+    fichiers = lister_exports(args.dossier)
+    if not fichiers:
+        print(f"Aucun export CSV / Excel dans {args.dossier}", file=sys.stderr)
+        return 1
+    os.makedirs(args.sortie, exist_ok=True)
+
+    lignes, anomalies, controles, erreurs = [], [], [], 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        taches = {
+            pool.submit(traiter_fichier, chemin, args.sortie, args.excel, args.pdf, args.quarantaine): chemin
+            for chemin in fichiers
+        }
+        for tache in as_completed(taches):
+            chemin = taches[tache]
+            try:
+                lignes_fichier, anomalies_fichier, controle = tache.result()
+                lignes.extend(lignes_fichier)
+                anomalies.append(anomalies_fichier)
+                controles.append(controle)
+                print(f"✅ {os.path.basename(chemin)}")
+            except Exception as exc:
+                erreurs += 1
+                print(f"❌ {os.path.basename(chemin)} : {exc}", file=sys.stderr)
+
+    recap = pd.DataFrame(lignes)
+    if not recap.empty:
+        recap = recap.sort_values(["fichier", "site"])
+    recap.to_csv(os.path.join(args.sortie, "indicateurs_sites.csv"), index=False)
+    if anomalies:
+        (pd.concat(anomalies, ignore_index=True)
+         .sort_values("Gravite", ascending=False, kind="stable")
+         .to_csv(os.path.join(args.sortie, "anomalies_flotte.csv"), index=False))
+    if controles:
+        (pd.DataFrame(controles).sort_values("fichier")
+         .to_csv(os.path.join(args.sortie, "qualite_donnees.csv"), index=False))
+    destination = archiver(args.sortie) if args.archive else args.sortie
+    print(f"{len(recap)} site(s) traité(s), {erreurs} fichier(s) en erreur → {destination}")
+    return 1 if erreurs else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""Mesure des performances par étape sur des flottes de sites synthétiques.
+
+Exemples :
+    python benchmark.py --tailles 1000 100000 1000000 --sortie mesures.json
+    python benchmark.py --reference mesures.json --tolerance 0.3
+    python benchmark.py --demarrage
+
+Les données générées ont la forme de `site_solaire.csv` (Date, Site,
+Type_Energie, Production_kWh, Consommation_kWh), avec de nombreux sites, les
+trois types d'énergie et un pas journalier, horaire ou quart-horaire. Chaque
+étape du traitement est chronométrée séparément ; le meilleur temps sur
+plusieurs répétitions est gardé. Les résultats sont enregistrés en JSON et
+peuvent servir de référence : une étape plus lente que la référence au-delà
+de la tolérance est signalée comme régression (code de sortie 1).
+
+`--demarrage` mesure le temps d'import des modules du tableau de bord dans
+un interpréteur neuf (démarrage à froid) et vérifie qu'il tient dans le
+budget, sans charger ReportLab, matplotlib, Altair ni les writers Excel.
+"""
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+TYPES_ENERGIE = ["Solaire", "Batterie", "Réseau"]
+RESOLUTIONS = {"jour": "D", "heure": "h", "15min": "15min"}
+ETAPES = ["lecture", "tri", "qualite", "index", "filtre", "indicateurs", "periodes",
+          "multi_sites", "graphique", "excel", "pdf"]
+TAILLES_DEFAUT = [1_000, 10_000, 100_000, 1_000_000]
+
+# En dessous de cet écart absolu (s), une différence est considérée comme du bruit
+BRUIT_SECONDES = 0.005
+
+# Démarrage à froid : modules importés par le tableau de bord, modules qui ne
+# doivent être chargés qu'au premier besoin, et budget d'import
+MODULES_DEMARRAGE = ["diagnostics", "graphiques", "graphiques_vega", "historique", "ingestion", "moteur", "periodes",
+                     "qualite", "rapports", "stockage"]
+MODULES_DIFFERES = ["reportlab", "matplotlib", "altair", "openpyxl", "xlsxwriter"]
+BUDGET_IMPORT_MS = float(os.environ.get("SOLAIRE_BUDGET_IMPORT_MS", "1000"))
+
+
+def generer_flotte(n_lignes, n_sites=20, resolution="jour", graine=0):
+    """Jeu de données synthétique de `n_lignes` lignes, dans l'ordre d'un export."""
+    rng = np.random.default_rng(graine)
+    par_instant = n_sites * len(TYPES_ENERGIE)
+    n_instants = math.ceil(n_lignes / par_instant)
+    instants = pd.date_range("2025-01-01", periods=n_instants, freq=RESOLUTIONS[resolution])
+
+    # Énergie par pas de temps : part de journée couverte par un pas
+    part_jour = pd.Timedelta(pd.tseries.frequencies.to_offset(RESOLUTIONS[resolution])) / pd.Timedelta(days=1)
+    if resolution == "jour":
+        profil = np.ones(n_instants)
+    else:
+        # Production nulle la nuit, maximale vers midi
+        heures = instants.hour + instants.minute / 60
+        profil = np.clip(np.sin(np.pi * (heures - 6) / 12), 0, None) * np.pi / 2
+
+    sites = np.array([f"Site_{i:03d}" for i in range(n_sites)])
+    dates = np.repeat(instants.values, par_instant)[:n_lignes]
+    site = np.tile(np.repeat(sites, len(TYPES_ENERGIE)), n_instants)[:n_lignes]
+    etype = np.tile(TYPES_ENERGIE, n_instants * n_sites)[:n_lignes]
+
+    solaire = etype == "Solaire"
+    production = np.where(
+        solaire,
+        rng.uniform(150, 350, n_lignes) * np.repeat(profil, par_instant)[:n_lignes] * part_jour,
+        0.0,
+    )
+    consommation = rng.uniform(50, 300, n_lignes) * part_jour
+    return pd.DataFrame({
+        "Date": dates,
+        "Site": site,
+        "Type_Energie": etype,
+        "Production_kWh": production,
+        "Consommation_kWh": consommation,
+    })
+
+
+def _chrono(fonction, repetitions):
+    """(meilleur temps en secondes, résultat du dernier appel)."""
+    meilleur, resultat = math.inf, None
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        resultat = fonction()
+        meilleur = min(meilleur, time.perf_counter() - debut)
+    return meilleur, resultat
+
+
+def mesurer(n_lignes, n_sites=20, resolution="jour", repetitions=3, etapes=ETAPES):
+    """Temps de chaque étape (secondes) pour une flotte de `n_lignes` lignes.
+
+    Une étape non mesurée (hors de `etapes`, ou export Excel au-delà de la
+    limite d'une feuille) vaut None.
+    """
+    import graphiques
+    import qualite
+    from index_donnees import trier
+    from ingestion import lire_brut
+    from moteur import LIGNES_MAX_EXCEL, Analyse, export_excel, rapport_pdf
+    from stockage import compacter
+
+    contenu = generer_flotte(n_lignes, n_sites, resolution).to_csv(index=False).encode("utf-8")
+    temps = dict.fromkeys(ETAPES)
+
+    def etape(nom, fonction):
+        if nom not in etapes:
+            return fonction()
+        temps[nom], resultat = _chrono(fonction, repetitions)
+        return resultat
+
+    brut = etape("lecture", lambda: lire_brut("flotte.csv", contenu))
+    trie = etape("tri", lambda: trier(brut))
+    etape("qualite", lambda: qualite.valider(trie))
+    analyse = etape("index", lambda: Analyse(compacter(trie)))
+
+    site = analyse.sites()[0]
+    types = analyse.types_energie()
+    debut, fin = analyse.bornes_dates()
+
+    df = etape("filtre", lambda: analyse.selection(site, types, debut, fin))
+    indicateurs = etape("indicateurs", lambda: analyse.indicateurs(site, types, debut, fin))
+    etape("periodes", lambda: [analyse.regroupement(p, site, types, debut, fin)
+                               for p in ("Heure", "Jour", "Semaine", "Mois")]
+          + [analyse.comparaison("Mois", site, types, debut, fin)])
+    etape("multi_sites", lambda: analyse.par_site(analyse.sites()))
+    etape("graphique", lambda: graphiques.performance(df))
+    if len(df) <= LIGNES_MAX_EXCEL:
+        etape("excel", lambda: export_excel(df))
+    etape("pdf", lambda: rapport_pdf(indicateurs, df))
+    return temps
+
+
+def mesurer_demarrage(repetitions=5):
+    """(meilleur temps d'import en ms, modules différés chargés malgré tout)."""
+    code = (
+        "import json, sys, time\n"
+        "debut = time.perf_counter()\n"
+        f"import {', '.join(MODULES_DEMARRAGE)}\n"
+        "duree = (time.perf_counter() - debut) * 1000\n"
+        f"charges = [m for m in {MODULES_DIFFERES!r} if m in sys.modules]\n"
+        "print(json.dumps([duree, charges]))\n"
+    )
+    dossier = os.path.dirname(os.path.abspath(__file__))
+    meilleur, charges = math.inf, []
+    for _ in range(repetitions):
+        sortie = subprocess.run([sys.executable, "-c", code], cwd=dossier, check=True,
+                                capture_output=True, text=True).stdout
+        duree, charges = json.loads(sortie)
+        meilleur = min(meilleur, duree)
+    return meilleur, charges
+
+
+def verifier_demarrage(budget_ms=BUDGET_IMPORT_MS, repetitions=5):
+    duree, charges = mesurer_demarrage(repetitions)
+    print(f"Import des modules du tableau de bord : {duree:.0f} ms (budget {budget_ms:.0f} ms)")
+    ok = True
+    if duree > budget_ms:
+        print(f"❌ Budget d'import dépassé de {duree - budget_ms:.0f} ms", file=sys.stderr)
+        ok = False
+    if charges:
+        print(f"❌ Modules chargés dès l'import : {', '.join(charges)}", file=sys.stderr)
+        ok = False
+    return ok
+
+
+def comparer(resultats, reference, tolerance):
+    """Liste de (taille, étape, temps de référence, temps mesuré) en régression."""
+    regressions = []
+    for taille, temps in resultats.items():
+        for etape, mesure in temps.items():
+            ancien = reference.get(taille, {}).get(etape)
+            if mesure is None or ancien is None:
+                continue
+            if mesure > ancien * (1 + tolerance) and mesure - ancien > BRUIT_SECONDES:
+                regressions.append((taille, etape, ancien, mesure))
+    return regressions
+
+
+def afficher(resultats):
+    tailles = list(resultats)
+    print(f"{'étape':<12}" + "".join(f"{int(t):>14,}" for t in tailles).replace(",", " "))
+    for etape in ETAPES:
+        ligne = ""
+        for t in tailles:
+            mesure = resultats[t][etape]
+            ligne += f"{'—':>14}" if mesure is None else f"{mesure * 1000:>12.1f}ms"
+        print(f"{etape:<12}{ligne}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mesure des performances par étape sur des flottes synthétiques.")
+    parser.add_argument("--tailles", type=int, nargs="+", default=TAILLES_DEFAUT,
+                        help="nombres de lignes à mesurer (jusqu'à 50 000 000)")
+    parser.add_argument("--sites", type=int, default=20, help="nombre de sites (défaut : 20)")
+    parser.add_argument("--resolution", choices=list(RESOLUTIONS), default="15min",
+                        help="pas de temps des mesures (défaut : 15min)")
+    parser.add_argument("--repetitions", type=int, default=3, help="répétitions par étape (défaut : 3)")
+    parser.add_argument("--etapes", nargs="+", choices=ETAPES, default=ETAPES, help="étapes à mesurer")
+    parser.add_argument("--sortie", help="fichier JSON où enregistrer les mesures")
+    parser.add_argument("--reference", help="fichier JSON de référence à comparer")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="ralentissement toléré par rapport à la référence (défaut : 0.25)")
+    parser.add_argument("--demarrage", action="store_true",
+                        help="mesurer seulement le temps d'import à froid et le comparer au budget")
+    parser.add_argument("--budget-import-ms", type=float, default=BUDGET_IMPORT_MS,
+                        help=f"budget d'import à froid en ms (défaut : {BUDGET_IMPORT_MS:.0f})")
+    args = parser.parse_args(argv)
+
+    if args.demarrage:
+        return 0 if verifier_demarrage(args.budget_import_ms, args.repetitions) else 1
+
+    resultats = {}
+    for taille in args.tailles:
+        print(f"… {taille} lignes", file=sys.stderr)
+        resultats[str(taille)] = mesurer(taille, args.sites, args.resolution, args.repetitions, args.etapes)
+    afficher(resultats)
+
+    if args.sortie:
+        with open(args.sortie, "w", encoding="utf-8") as f:
+            json.dump({
+                "date": datetime.datetime.now().isoformat(timespec="seconds"),
+                "machine": {
+                    "python": platform.python_version(),
+                    "pandas": pd.__version__,
+                    "numpy": np.__version__,
+                    "processeur": platform.processor() or platform.machine(),
+                },
+                "parametres": {"sites": args.sites, "resolution": args.resolution,
+                               "repetitions": args.repetitions},
+                "resultats": resultats,
+            }, f, indent=2, ensure_ascii=False)
+
+    if args.reference:
+        with open(args.reference, encoding="utf-8") as f:
+            reference = json.load(f)["resultats"]
+        regressions = comparer(resultats, reference, args.tolerance)
+        for taille, etape, ancien, mesure in regressions:
+            print(f"❌ {etape} ({taille} lignes) : {ancien * 1000:.1f} ms → {mesure * 1000:.1f} ms",
+                  file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"✅ Aucune régression (tolérance {args.tolerance:.0%})", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,22 +1,40 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
+
+import graphiques
+from cube import CubeAgrege
+from index_donnees import IndexSites, bornes_journees
+from ingestion import lire_brut
 
 st.set_page_config(page_title="Analyse Site Solaire", layout="wide")
 
 st.title("☀️ Tableau de bord - Site Solaire")
 
+
+@st.cache_resource(max_entries=8)
+def index_sites(cle, _data):
+    # Index (site, type, date) construit une fois par fichier importé
+    return IndexSites(_data)
+
+
+@st.cache_resource(max_entries=8)
+def cube_agrege(cle, _data):
+    # Agrégats jour / semaine / mois construits une fois par fichier importé
+    return CubeAgrege(_data)
+
+
 # --- Chargement des données ---
 uploaded_file = st.file_uploader("📂 Importer un fichier CSV (production & consommation)", type="csv")
 
 if uploaded_file:
-    # Lecture et nettoyage
-    data = pd.read_csv(uploaded_file)
-
-    # Conversion forcée en datetime (évite 1970-01-01)
-    data["Date"] = pd.to_datetime(data["Date"], errors="coerce", dayfirst=True)
-    data = data.dropna(subset=["Date"])  # supprime les dates invalides
+    # Lecture et nettoyage : format des dates détecté une fois, dates
+    # invalides écartées (évite 1970-01-01)
+    data = lire_brut(uploaded_file.name, uploaded_file.getvalue())
+    if data.attrs["lignes_invalides"]:
+        st.warning(f"⚠️ {data.attrs['lignes_invalides']} ligne(s) écartée(s), date illisible")
     data = data.sort_values("Date").reset_index(drop=True)
+    index = index_sites(uploaded_file.file_id, data)
+    cube = cube_agrege(uploaded_file.file_id, data)
 
     # -----------------------------
     # ⚙️ Filtres généraux (sidebar)
@@ -47,12 +65,8 @@ if uploaded_file:
     )
 
     # Application des filtres
-    mask = (
-        (data["Date"].dt.date.between(start_date, end_date)) &
-        (data["Site"] == site_choice) &
-        (data["Type_Energie"].isin(energy_types))
-    )
-    df_filtered = data.loc[mask]
+    debut, fin = bornes_journees(start_date, end_date)
+    df_filtered = index.selection(site_choice, energy_types, debut, fin)
 
     # -----------------------------
     # 📑 Onglets
@@ -69,8 +83,10 @@ if uploaded_file:
         st.subheader(f"Performance du site : {site_choice}")
         st.write(df_filtered.head())
 
-        total_prod = df_filtered["Production_kWh"].sum()
-        total_cons = df_filtered["Consommation_kWh"].sum()
+        # Totaux lus dans les sommes cumulées de l'index
+        totaux = index.sommes(site_choice, energy_types, debut, fin)
+        total_prod = totaux["Production_kWh"]
+        total_cons = totaux["Consommation_kWh"]
         rendement = (total_cons / total_prod * 100) if total_prod > 0 else 0
 
         col1, col2, col3 = st.columns(3)
@@ -87,13 +103,13 @@ if uploaded_file:
                 .reset_index()
             )
 
-            fig, ax = plt.subplots()
+            fig, ax = graphiques.nouvelle_figure()
             ax.plot(df_daily["Date"], df_daily["Production_kWh"], label="Production")
             ax.plot(df_daily["Date"], df_daily["Consommation_kWh"], label="Consommation")
             ax.set_xlabel("Date")
             ax.set_ylabel("Énergie (kWh)")
             ax.legend()
-            plt.xticks(rotation=45)
+            ax.tick_params(axis="x", labelrotation=45)
             st.pyplot(fig)
         else:
             st.warning("⚠️ Aucune donnée disponible pour les filtres sélectionnés.")
@@ -107,7 +123,7 @@ if uploaded_file:
                 st.line_chart(subset.set_index("Date")["Consommation_kWh"], height=200)
 
             st.bar_chart(
-                df_filtered.groupby("Type_Energie")["Consommation_kWh"].sum()
+                cube.par_type(site_choice, energy_types, debut, fin)["Consommation_kWh"]
             )
         else:
             st.info("Sélectionnez une période et un site pour voir les données.")
@@ -119,12 +135,7 @@ if uploaded_file:
         periode = st.radio("Choisir la période :", ["Jour", "Semaine", "Mois"], horizontal=True)
 
         if not df_filtered.empty:
-            if periode == "Jour":
-                df_grouped = df_filtered.groupby(df_filtered["Date"].dt.date).sum(numeric_only=True)
-            elif periode == "Semaine":
-                df_grouped = df_filtered.groupby(df_filtered["Date"].dt.isocalendar().week).sum(numeric_only=True)
-            else:
-                df_grouped = df_filtered.groupby(df_filtered["Date"].dt.to_period("M")).sum(numeric_only=True)
+            df_grouped = cube.serie(periode, site_choice, energy_types, debut, fin)
 
             st.line_chart(df_grouped["Consommation_kWh"])
         else:
@@ -133,7 +144,7 @@ if uploaded_file:
         st.markdown("### Comparaison multi-sites")
         sites_selected = st.multiselect("Sélectionner les sites :", sites, default=sites)
         if sites_selected:
-            df_sites = data[data["Site"].isin(sites_selected)].groupby("Site")["Consommation_kWh"].sum()
+            df_sites = cube.par_site(sites_selected)["Consommation_kWh"]
             st.bar_chart(df_sites)
 
     # --- Onglet 4 : Maintenance ---
@@ -146,8 +157,8 @@ if uploaded_file:
             st.success("✅ Rendement satisfaisant")
 
         # Exemple d'alerte sur batteries
-        if "Batterie" in df_filtered["Type_Energie"].values:
-            bat_cons = df_filtered[df_filtered["Type_Energie"] == "Batterie"]["Consommation_kWh"].sum()
+        if "Batterie" in energy_types:
+            bat_cons = index.sommes(site_choice, ["Batterie"], debut, fin)["Consommation_kWh"]
             if bat_cons > 0.8 * total_cons:
                 st.warning("🔋 Les batteries supportent une forte charge de consommation. Vérifiez leur état de santé.")
 st
\ No newline at end of file
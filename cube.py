@@ -0,0 +1,132 @@
+"""Cube d'agrégats (jour / semaine ISO / mois × site × type d'énergie).
+
+Le cube est construit une fois à l'ingestion. Les graphiques de comparaison
+lisent ces agrégats au lieu de regrouper les lignes brutes à chaque rerun.
+Chaque niveau est un `IndexSites` : sélection par tranches et totaux par
+sommes cumulées, comme pour les données brutes.
+"""
+import pandas as pd
+
+from index_donnees import IndexSites
+
+PERIODES = ["Jour", "Semaine", "Mois"]
+COLONNES_ENERGIE = ["Production_kWh", "Consommation_kWh"]
+
+
+def cles_periode(dates, periode):
+    """Début et clé lisible de la période contenant chaque date.
+
+    Les semaines sont qualifiées par leur année ISO (`2025-W01`) : la même
+    semaine de deux années différentes n'est jamais fusionnée.
+    """
+    dates = pd.Series(pd.to_datetime(dates)).dt.normalize()
+    if periode == "Jour":
+        return dates, dates.dt.strftime("%Y-%m-%d")
+    if periode == "Semaine":
+        iso = dates.dt.isocalendar()
+        debut = dates - pd.to_timedelta(dates.dt.weekday, unit="D")
+        cle = iso["year"].astype(str) + "-W" + iso["week"].astype(str).str.zfill(2)
+        return debut, cle
+    if periode == "Mois":
+        debut = dates.dt.to_period("M").dt.start_time
+        return debut, dates.dt.strftime("%Y-%m")
+    raise ValueError(f"Période inconnue : {periode}")
+
+
+def fin_periode(debut, periode):
+    """Début de la période suivante (borne exclue)."""
+    if periode == "Jour":
+        return debut + pd.Timedelta(days=1)
+    if periode == "Semaine":
+        return debut + pd.Timedelta(days=7)
+    return debut + pd.offsets.MonthBegin(1)
+
+
+def agreger_jours(data):
+    """Totaux journaliers par site et type d'énergie (niveau de base du cube)."""
+    return (
+        data.assign(Date=data["Date"].dt.floor("D"))
+        .groupby(["Site", "Type_Energie", "Date"], observed=True, sort=True)[COLONNES_ENERGIE]
+        .sum()
+        .astype("float64")
+        .reset_index()
+    )
+
+
+def fusionner_jours(morceaux):
+    """Fusionne des totaux journaliers partiels (une journée peut être à cheval sur deux blocs)."""
+    morceaux = [m.astype({"Site": str, "Type_Energie": str}) for m in morceaux]
+    return (
+        pd.concat(morceaux, ignore_index=True)
+        .groupby(["Site", "Type_Energie", "Date"], sort=True)[COLONNES_ENERGIE]
+        .sum()
+        .reset_index()
+    )
+
+
+def _agreger(jours, periode):
+    debut, cle = cles_periode(jours["Date"], periode)
+    niveau = (
+        jours.assign(Date=debut.to_numpy(), Cle=cle.to_numpy())
+        .groupby(["Site", "Type_Energie", "Date", "Cle"], observed=True, sort=True)[COLONNES_ENERGIE]
+        .sum()
+        .reset_index()
+    )
+    niveau["Fin"] = fin_periode(niveau["Date"], periode)
+    return niveau
+
+
+class CubeAgrege:
+    """Agrégats pré-calculés par période, site et type d'énergie."""
+
+    def __init__(self, data=None, jours=None):
+        # Un seul passage sur les lignes brutes : le niveau jour ; les autres
+        # niveaux sont obtenus à partir de celui-ci. Les totaux journaliers
+        # peuvent aussi être fournis directement (calculés à l'ingestion).
+        if jours is None:
+            jours = agreger_jours(data)
+        self.niveaux = {periode: IndexSites(_agreger(jours, periode)) for periode in PERIODES}
+
+    def serie(self, periode, site, types, debut, fin):
+        """Totaux par période (index = clé de période), limités aux dates `debut`-`fin`.
+
+        Les périodes entièrement comprises dans la plage sont lues au niveau
+        demandé ; les périodes tronquées aux bords sont complétées à partir
+        du niveau jour, pour rester exact.
+        """
+        debut = pd.Timestamp(debut).normalize()
+        fin_exclue = pd.Timestamp(fin).normalize() + pd.Timedelta(days=1)
+
+        niveau = self.niveaux[periode]
+        lignes = niveau.selection(site, types, debut, fin)
+        completes = lignes[lignes["Fin"] <= fin_exclue]
+
+        morceaux = [completes[["Date", "Cle"] + COLONNES_ENERGIE]]
+        if periode != "Jour":
+            jours = self.niveaux["Jour"].selection(site, types, debut, fin)
+            if not jours.empty:
+                debut_periode, cle = cles_periode(jours["Date"], periode)
+                bords = jours.assign(Date=debut_periode.to_numpy(), Cle=cle.to_numpy())
+                bords = bords[~bords["Cle"].isin(completes["Cle"])]
+                morceaux.append(bords[["Date", "Cle"] + COLONNES_ENERGIE])
+
+        serie = pd.concat(morceaux).groupby(["Date", "Cle"], sort=True)[COLONNES_ENERGIE].sum()
+        return serie.reset_index("Date", drop=True)
+
+    def par_type(self, site, types, debut, fin):
+        """Totaux par type d'énergie pour le site et la plage de dates."""
+        jours = self.niveaux["Jour"]
+        totaux = {}
+        for etype in types:
+            i, j = jours.plage(site, etype, debut, fin)
+            if j > i:
+                totaux[etype] = jours.sommes(site, [etype], debut, fin)
+        return pd.DataFrame.from_dict(totaux, orient="index", columns=COLONNES_ENERGIE)
+
+    def par_site(self, sites, debut=None, fin=None):
+        """Totaux par site, tous types d'énergie confondus."""
+        # Sans plage de dates, le niveau mois suffit (moins de lignes à lire)
+        niveau = self.niveaux["Mois" if debut is None and fin is None else "Jour"]
+        types = niveau.types_energie()
+        totaux = {site: niveau.sommes(site, types, debut, fin) for site in sites}
+        return pd.DataFrame.from_dict(totaux, orient="index", columns=COLONNES_ENERGIE)
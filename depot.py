@@ -0,0 +1,145 @@
+"""Surveillance d'un dossier de dépôt : les exports déposés alimentent l'historique.
+
+Exemples :
+    python depot.py depot/ --historique .solaire_historique.sqlite --intervalle 60
+    python depot.py depot/ --historique .solaire_historique.sqlite --une-fois
+
+Les sites déposent leurs exports quotidiens (mêmes colonnes que
+`site_solaire.csv`) dans un dossier. À chaque passage, seuls les octets
+ajoutés depuis le passage précédent sont lus : un nouveau fichier est lu en
+entier, un CSV qui grandit n'est relu qu'à partir de la dernière ligne
+traitée. Les nouvelles lignes sont ajoutées à l'historique SQLite (voir
+`historique`) et seuls les totaux journaliers des journées touchées sont
+recalculés : le coût d'un passage suit la taille des données nouvelles.
+
+Un CSV réécrit (plus court, avec un autre en-tête, ou dont les derniers
+octets déjà lus ont changé) et un classeur Excel modifié sont relus en entier ; les mesures déjà connues sont remplacées,
+sans doublon. Une dernière ligne sans fin de ligne n'est lue qu'une fois le
+fichier stable d'un passage à l'autre (fichier encore en cours d'écriture).
+Le tableau de bord ouvert sur l'historique voit les nouvelles données au
+rerun suivant.
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+from historique import CHEMIN_HISTORIQUE, Historique
+from ingestion import MEMOIRE_BLOC_MO, empreinte, lignes_par_bloc, lire_brut, lire_par_blocs
+
+EXTENSIONS = (".csv", ".xlsx")
+INTERVALLE_S = 60
+# Octets relus avant la dernière ligne traitée pour vérifier qu'elle n'a pas été réécrite
+FENETRE_CONTROLE = 64 * 1024
+
+
+def _empreinte_avant(f, position):
+    # Empreinte des FENETRE_CONTROLE octets qui précèdent `position`
+    debut = max(0, position - FENETRE_CONTROLE)
+    f.seek(debut)
+    return empreinte(f.read(position - debut))
+
+
+def _nouveaux_octets(chemin, etat, taille):
+    """(en-tête, octets nouveaux, position de fin, empreinte de la fin lue) d'un CSV.
+
+    Les octets nouveaux commencent après la dernière ligne traitée, ou au
+    début du fichier s'il est nouveau ou a été réécrit. Un fichier réécrit
+    sur place avec le même en-tête et une taille au moins égale est reconnu
+    à l'empreinte des derniers octets déjà lus, qui a changé.
+    """
+    with open(chemin, "rb") as f:
+        entete = f.readline()
+        debut = f.tell()
+        if etat is not None:
+            _, _, lus, entete_avant, empreinte_lus = etat
+            if entete == entete_avant and lus <= taille and _empreinte_avant(f, lus) == empreinte_lus:
+                debut = max(lus, debut)
+        f.seek(debut)
+        contenu = f.read(taille - debut)
+
+        fin = debut + contenu.rfind(b"\n") + 1
+        # Dernière ligne incomplète : attendue tant que le fichier change encore
+        stable = etat is not None and etat[0] == taille
+        if stable or contenu.endswith(b"\n"):
+            fin = debut + len(contenu)
+        empreinte_fin = _empreinte_avant(f, fin)
+    return entete, contenu[:fin - debut], fin, empreinte_fin
+
+
+def traiter_fichier(historique, chemin, memoire_octets=MEMOIRE_BLOC_MO * 1024 ** 2):
+    """Ajoute à l'historique les lignes nouvelles d'un fichier déposé ; renvoie leur nombre."""
+    stat = os.stat(chemin)
+    etat = historique.etat_fichier(chemin)
+    if etat is not None and etat[:2] == (stat.st_size, stat.st_mtime_ns) and etat[2] == stat.st_size:
+        return 0
+
+    nom = os.path.basename(chemin)
+    if not nom.lower().endswith(".csv"):
+        # Classeur Excel : relu en entier à chaque modification
+        with open(chemin, "rb") as f:
+            contenu = f.read()
+        lignes = historique.ajouter(lire_brut(nom, contenu), empreinte=empreinte(contenu), nom=nom)
+        historique.noter_fichier(chemin, stat.st_size, stat.st_mtime_ns, stat.st_size, None)
+        return lignes
+
+    entete, contenu, fin, empreinte_fin = _nouveaux_octets(chemin, etat, stat.st_size)
+    lignes = 0
+    if contenu.strip():
+        source = io.BytesIO(entete + contenu)
+        blocs = lire_par_blocs(source, lignes_par_bloc(source, memoire_octets))
+        lignes = historique.ajouter_blocs(blocs, empreinte=empreinte(entete + contenu), nom=nom)
+    historique.noter_fichier(chemin, stat.st_size, stat.st_mtime_ns, fin, entete, empreinte_fin)
+    return lignes
+
+
+def passage(historique, dossier, memoire_octets=MEMOIRE_BLOC_MO * 1024 ** 2):
+    """Traite tous les fichiers du dossier.
+
+    Renvoie ({nom: lignes ajoutées}, {nom: erreur}) ; un fichier illisible
+    n'empêche pas de traiter les autres et sera retenté au passage suivant.
+    """
+    ajouts, erreurs = {}, {}
+    for nom in sorted(os.listdir(dossier)):
+        if not nom.lower().endswith(EXTENSIONS):
+            continue
+        try:
+            lignes = traiter_fichier(historique, os.path.join(dossier, nom), memoire_octets)
+        except Exception as exc:
+            erreurs[nom] = exc
+            continue
+        if lignes:
+            ajouts[nom] = lignes
+    return ajouts, erreurs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ajoute à l'historique les exports déposés dans un dossier.")
+    parser.add_argument("dossier", help="dossier de dépôt des exports CSV / Excel")
+    parser.add_argument("--historique", default=CHEMIN_HISTORIQUE,
+                        help="base SQLite de l'historique (défaut : SOLAIRE_HISTORIQUE)")
+    parser.add_argument("--intervalle", type=float, default=INTERVALLE_S,
+                        help=f"secondes entre deux passages (défaut : {INTERVALLE_S})")
+    parser.add_argument("--une-fois", action="store_true", help="un seul passage, puis sortie")
+    parser.add_argument("--memoire-mo", type=int, default=MEMOIRE_BLOC_MO,
+                        help=f"mémoire visée par bloc lu, en Mo (défaut : {MEMOIRE_BLOC_MO})")
+    args = parser.parse_args(argv)
+
+    if not args.historique:
+        print("Aucun historique : indiquez --historique ou SOLAIRE_HISTORIQUE", file=sys.stderr)
+        return 1
+    historique = Historique(args.historique)
+    while True:
+        ajouts, erreurs = passage(historique, args.dossier, args.memoire_mo * 1024 ** 2)
+        for nom, lignes in ajouts.items():
+            print(f"✅ {nom} : {lignes} ligne(s) ajoutée(s)")
+        for nom, exc in erreurs.items():
+            print(f"❌ {nom} : {exc}", file=sys.stderr)
+        if args.une_fois:
+            return 1 if erreurs else 0
+        time.sleep(args.intervalle)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,284 @@
+"""Instrumentation des reruns : temps et mémoire par étape, caches, profil.
+
+Mesures activées à la demande (panneau « 🩺 Diagnostics » de la barre
+latérale, ou `SOLAIRE_DIAGNOSTICS=1`) : chaque étape entourée de
+`mesures.etape(nom)` est chronométrée et son pic mémoire relevé avec
+tracemalloc. Les étapes sont aussi écrites en JSON, une ligne par étape,
+dans le journal `solaire.diagnostics` ; `SOLAIRE_JOURNAL_PERF=1` les envoie
+sur la sortie d'erreur, `SOLAIRE_JOURNAL_PERF=<fichier>` dans un fichier.
+
+tracemalloc et le pic mémoire sont globaux au processus : deux sessions
+mesurées en même temps se mélangent. Le panneau est un outil de diagnostic,
+pas un suivi de production.
+"""
+import cProfile
+import functools
+import io
+import json
+import logging
+import marshal
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+
+ACTIF_PAR_DEFAUT = os.environ.get("SOLAIRE_DIAGNOSTICS", "0") == "1"
+JOURNAL_PERF = os.environ.get("SOLAIRE_JOURNAL_PERF", "")
+
+journal = logging.getLogger("solaire.diagnostics")
+
+_verrou = threading.Lock()
+_sessions_tracemalloc = 0
+
+
+def configurer_journal(destination=JOURNAL_PERF):
+    """Envoie le journal des étapes sur stderr ("1") ou dans un fichier (une seule fois)."""
+    if not destination or journal.handlers:
+        return
+    handler = logging.StreamHandler() if destination == "1" else logging.FileHandler(destination, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    journal.addHandler(handler)
+    journal.setLevel(logging.INFO)
+    journal.propagate = False
+
+
+# ---------------------------
+# Compteurs des caches Streamlit
+# ---------------------------
+
+class Compteur:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+
+COMPTEURS = {}
+
+
+def en_cache(nom, decorateur):
+    """Applique `decorateur` (ex. `st.cache_resource(max_entries=8)`) en comptant hits et misses.
+
+    Le corps de la fonction ne s'exécute qu'en cas de miss : les hits sont
+    les appels qui ne l'ont pas exécuté.
+    """
+    compteur = COMPTEURS.setdefault(nom, Compteur())
+
+    def appliquer(fonction):
+        @functools.wraps(fonction)
+        def calcul(*args, **kwargs):
+            compteur.misses += 1
+            return fonction(*args, **kwargs)
+
+        en_memoire = decorateur(calcul)
+
+        @functools.wraps(fonction)
+        def appel(*args, **kwargs):
+            misses = compteur.misses
+            resultat = en_memoire(*args, **kwargs)
+            if compteur.misses == misses:
+                compteur.hits += 1
+            return resultat
+
+        return appel
+
+    return appliquer
+
+
+# ---------------------------
+# Mesures d'un rerun
+# ---------------------------
+
+class Mesures:
+    """Temps et pics mémoire des étapes d'un rerun.
+
+    Inactif, `etape` ne mesure rien : les scripts entourent leurs étapes
+    sans condition.
+    """
+
+    def __init__(self, script, actif=False, memoire=False):
+        self.script = script
+        self.rerun = uuid.uuid4().hex[:8]
+        self.actif = actif or bool(journal.handlers)
+        self.memoire = memoire and self.actif
+        self.etapes = []
+        self.profil = None
+        self._pile = []
+        self.termine = False
+        self._debut = time.perf_counter()
+        if self.memoire:
+            _demarrer_tracemalloc()
+
+    @contextmanager
+    def etape(self, nom):
+        if not self.actif:
+            yield
+            return
+        cadre = {"debut": time.perf_counter()}
+        if self.memoire:
+            cadre["courant"], _ = tracemalloc.get_traced_memory()
+            cadre["pic"] = cadre["courant"]
+            tracemalloc.reset_peak()
+        self._pile.append(cadre)
+        try:
+            yield
+        finally:
+            self._pile.pop()
+            mesure = {
+                "etape": nom,
+                "profondeur": len(self._pile),
+                "duree_ms": round((time.perf_counter() - cadre["debut"]) * 1000, 2),
+            }
+            if self.memoire:
+                pic = max(tracemalloc.get_traced_memory()[1], cadre["pic"])
+                mesure["pic_memoire_ko"] = round((pic - cadre["courant"]) / 1024, 1)
+                # Le pic d'une étape imbriquée compte aussi pour l'étape parente
+                if self._pile:
+                    self._pile[-1]["pic"] = max(self._pile[-1]["pic"], pic)
+            self.etapes.append(mesure)
+            journal.info(json.dumps(
+                {"evenement": "etape", "script": self.script, "rerun": self.rerun, **mesure},
+                ensure_ascii=False,
+            ))
+
+    def terminer(self, caches=None):
+        """Clôt le rerun : durée totale et compteurs des caches ({nom: (hits, misses)})."""
+        if self.memoire:
+            _arreter_tracemalloc()
+            self.memoire = False
+        self.termine = True
+        duree_ms = round((time.perf_counter() - self._debut) * 1000, 2)
+        if self.actif:
+            journal.info(json.dumps(
+                {"evenement": "rerun", "script": self.script, "rerun": self.rerun,
+                 "duree_ms": duree_ms, "caches": caches or {}},
+                ensure_ascii=False,
+            ))
+        return duree_ms
+
+
+def _demarrer_tracemalloc():
+    global _sessions_tracemalloc
+    with _verrou:
+        if _sessions_tracemalloc == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _sessions_tracemalloc += 1
+
+
+def _arreter_tracemalloc():
+    global _sessions_tracemalloc
+    with _verrou:
+        _sessions_tracemalloc -= 1
+        if _sessions_tracemalloc == 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+def etat_caches(caches=None):
+    """{nom: (hits, misses)} des caches fournis (objets avec hits / misses) et des caches comptés."""
+    etat = {nom: (c.hits, c.misses) for nom, c in COMPTEURS.items()}
+    etat.update({nom: (c.hits, c.misses) for nom, c in (caches or {}).items()})
+    return etat
+
+
+def profil_en_octets(profil):
+    """Profil cProfile au format `.prof` (lisible par pstats, snakeviz…)."""
+    profil.create_stats()
+    return marshal.dumps(profil.stats)
+
+
+def resume_profil(profil, lignes=25):
+    texte = io.StringIO()
+    pstats.Stats(profil, stream=texte).sort_stats("cumulative").print_stats(lignes)
+    return texte.getvalue()
+
+
+# ---------------------------
+# Panneau Streamlit
+# ---------------------------
+# Les cases du panneau sont affichées en fin de script mais lues dès le
+# début (`demarrer`), via leur clé dans st.session_state.
+
+def demarrer(script):
+    """Mesures du rerun qui commence (et profil cProfile s'il a été demandé)."""
+    import streamlit as st
+
+    configurer_journal()
+    actif = st.session_state.get("diagnostics_actifs", ACTIF_PAR_DEFAUT)
+    mesures = Mesures(script, actif=actif, memoire=actif)
+    if actif and st.session_state.get("diagnostics_profil"):
+        mesures.profil = cProfile.Profile()
+        try:
+            mesures.profil.enable()
+        except ValueError:
+            # Un autre profileur est déjà actif dans ce processus
+            mesures.profil = None
+    st.session_state["_diagnostics_mesures"] = mesures
+    return mesures
+
+
+@contextmanager
+def fragment(nom):
+    """Mesures à utiliser dans un fragment `st.fragment`.
+
+    Exécuté avec le script, le fragment mesure ses étapes dans le rerun en
+    cours. Relancé seul, il trouve ce rerun déjà terminé : ses étapes sont
+    alors mesurées comme un rerun à part (« app.py:<nom> »), écrit dans le
+    journal mais absent du panneau.
+    """
+    import streamlit as st
+
+    mesures = st.session_state.get("_diagnostics_mesures")
+    if mesures is not None and not mesures.termine:
+        yield mesures
+        return
+    script = f"{mesures.script if mesures is not None else 'app.py'}:{nom}"
+    actif = st.session_state.get("diagnostics_actifs", ACTIF_PAR_DEFAUT)
+    mesures = Mesures(script, actif=actif, memoire=actif)
+    try:
+        yield mesures
+    finally:
+        mesures.terminer(etat_caches())
+
+
+def panneau(mesures, caches=None):
+    """Termine les mesures du rerun et affiche le panneau dans la barre latérale."""
+    import pandas as pd
+    import streamlit as st
+
+    if mesures.profil is not None:
+        mesures.profil.disable()
+        st.session_state["diagnostics_resultat_profil"] = (
+            profil_en_octets(mesures.profil), resume_profil(mesures.profil)
+        )
+        # Un seul rerun profilé par demande
+        st.session_state["diagnostics_profil"] = False
+    etat = etat_caches(caches)
+    duree_ms = mesures.terminer(etat)
+
+    with st.sidebar.expander("🩺 Diagnostics", expanded=st.session_state.get("diagnostics_actifs", ACTIF_PAR_DEFAUT)):
+        actif = st.toggle("Mesurer les reruns", value=ACTIF_PAR_DEFAUT, key="diagnostics_actifs")
+        st.toggle("Profiler le prochain rerun (cProfile)", key="diagnostics_profil", disabled=not actif)
+        if not actif:
+            return
+
+        st.caption(f"Rerun {mesures.rerun} : {duree_ms:.0f} ms")
+        if mesures.etapes:
+            tableau = pd.DataFrame(mesures.etapes)
+            tableau["etape"] = ["· " * p + nom for p, nom in zip(tableau["profondeur"], tableau["etape"])]
+            st.dataframe(tableau.drop(columns="profondeur"), hide_index=True, use_container_width=True)
+
+        if etat:
+            st.dataframe(
+                pd.DataFrame.from_dict(etat, orient="index", columns=["hits", "misses"]).rename_axis("cache"),
+                use_container_width=True,
+            )
+
+        resultat = st.session_state.get("diagnostics_resultat_profil")
+        if resultat is not None:
+            contenu, resume = resultat
+            st.download_button("📥 Télécharger le profil (.prof)", contenu,
+                               file_name=f"profil_{mesures.script}.prof", mime="application/octet-stream")
+            st.caption("Fonctions les plus coûteuses (temps cumulé)")
+            st.code(resume)
@@ -1,14 +1,32 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
+
+import graphiques
+from cube import CubeAgrege
+from index_donnees import IndexSites, bornes_journees
 
 st.title("⚡ Tableau de bord - Performance & Consommation Énergétique")
 
+
+@st.cache_resource(max_entries=8)
+def index_sites(cle, _data):
+    # Index (site, type, date) construit une fois par fichier importé
+    return IndexSites(_data)
+
+
+@st.cache_resource(max_entries=8)
+def cube_agrege(cle, _data):
+    # Agrégats jour / semaine / mois construits une fois par fichier importé
+    return CubeAgrege(_data)
+
+
 # --- Chargement des données ---
 uploaded_file = st.file_uploader("Importer un fichier CSV (production & consommation)", type="csv")
 
 if uploaded_file:
     data = pd.read_csv(uploaded_file, parse_dates=["Date"])
+    index = index_sites(uploaded_file.file_id, data)
+    cube = cube_agrege(uploaded_file.file_id, data)
 
     # Filtres
     st.sidebar.header("⚙️ Filtres")
@@ -20,14 +38,14 @@ if uploaded_file:
     site_choice = st.sidebar.selectbox("Choisir le site :", data["Site"].unique())
 
     # Application des filtres
-    mask = (data["Date"].between(date_range[0], date_range[1])) & (data["Type_Energie"].isin(energy_types)) & (data["Site"] == site_choice)
-    df_filtered = data.loc[mask]
+    debut, fin = bornes_journees(date_range[0], date_range[1])
+    df_filtered = index.selection(site_choice, energy_types, debut, fin)
 
     st.subheader(f"📊 Consommation du site {site_choice}")
     st.write(df_filtered.head())
 
     # --- Visualisation Consommation ---
-    fig, ax = plt.subplots()
+    fig, ax = graphiques.nouvelle_figure()
     for etype in df_filtered["Type_Energie"].unique():
         subset = df_filtered[df_filtered["Type_Energie"] == etype]
         ax.plot(subset["Date"], subset["Consommation_kWh"], label=etype)
@@ -40,18 +58,13 @@ if uploaded_file:
     # --- Comparaison par période ---
     st.subheader("📅 Comparaison des périodes")
     periode = st.radio("Choisir la période :", ["Jour", "Semaine", "Mois"])
-    if periode == "Jour":
-        df_grouped = df_filtered.groupby(df_filtered["Date"].dt.date).sum()
-    elif periode == "Semaine":
-        df_grouped = df_filtered.groupby(df_filtered["Date"].dt.isocalendar().week).sum()
-    else:
-        df_grouped = df_filtered.groupby(df_filtered["Date"].dt.to_period("M")).sum()
+    df_grouped = cube.serie(periode, site_choice, energy_types, debut, fin)
 
     st.bar_chart(df_grouped["Consommation_kWh"])
 
     # --- Comparaison multi-sites ---
     st.subheader("🏭 Comparaison avec d’autres sites")
     sites_selected = st.multiselect("Sélectionner les sites à comparer :", data["Site"].unique(), default=data["Site"].unique())
-    df_sites = data[data["Site"].isin(sites_selected)].groupby("Site")["Consommation_kWh"].sum()
+    df_sites = cube.par_site(sites_selected)["Consommation_kWh"]
 
     st.bar_chart(df_sites)
@@ -0,0 +1,233 @@
+"""Rendu des graphiques en images PNG, avec un cache borné des rendus.
+
+Les figures sont construites avec l'API objet de matplotlib (`Figure` et
+canevas Agg), sans pyplot : pas de figure courante globale ni de registre
+de figures à fermer. Chaque rendu a sa propre figure, si bien que plusieurs
+sessions (et la génération des rapports en arrière-plan) dessinent en même
+temps sans verrou ni interférence. Les images sont mises en cache par type
+de graphique et état des filtres, pour ne pas redessiner un graphique
+identique.
+
+matplotlib n'est importé qu'au premier rendu, et le style du tableau de
+bord n'est appliqué qu'une fois par processus. Les mêmes graphiques peuvent
+être dessinés dans le navigateur (voir `graphiques_vega`).
+"""
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import sous_echantillonnage
+
+# Mêmes réglages que st.pyplot, pour garder le rendu d'origine
+DPI = 200
+BUDGET_CACHE_MO = int(os.environ.get("SOLAIRE_CACHE_GRAPHIQUES_MO", "64"))
+
+# Réduction des courbes à environ un point par pixel (désactivable)
+REDUCTION_ACTIVE = os.environ.get("SOLAIRE_REDUCTION_POINTS", "1") != "0"
+METHODE_REDUCTION = os.environ.get("SOLAIRE_METHODE_REDUCTION", "lttb")
+
+COULEURS_TYPES = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728"]
+
+STYLE = "seaborn-v0_8-whitegrid"
+PARAMETRES_STYLE = {
+    "figure.figsize": (8, 4),
+    "axes.titlesize": 14,
+    "axes.labelsize": 12,
+    "legend.fontsize": 10,
+    "font.family": "sans-serif",
+    "font.sans-serif": "Arial"
+}
+
+# Le style modifie les rcParams globaux : appliqué une seule fois, sous verrou,
+# puis seulement lu par les figures
+_verrou_style = threading.Lock()
+_style_applique = False
+
+
+def _preparer_matplotlib():
+    """Importe matplotlib et applique le style du tableau de bord (une fois par processus)."""
+    global _style_applique
+    with _verrou_style:
+        if not _style_applique:
+            import matplotlib
+            import matplotlib.style
+
+            # Backend non interactif aussi pour les scripts qui passent par pyplot
+            matplotlib.use("Agg")
+            matplotlib.style.use(STYLE)
+            matplotlib.rcParams.update(PARAMETRES_STYLE)
+            _style_applique = True
+
+
+def nouvelle_figure(**options):
+    """(fig, ax) : figure indépendante, rendue par Agg, hors de l'état global de pyplot.
+
+    Rien à fermer : la figure est libérée avec sa dernière référence.
+    """
+    _preparer_matplotlib()
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(**options)
+    FigureCanvasAgg(fig)
+    return fig, fig.subplots()
+
+
+def tracer(ax, x, y, reduire=True, **style):
+    """`ax.plot` après réduction de la série au nombre de pixels de la figure."""
+    x, y = np.asarray(x), np.asarray(y, dtype=np.float64)
+    if reduire:
+        largeur_px = int(ax.figure.get_figwidth() * DPI)
+        positions = sous_echantillonnage.reduire(x, y, largeur_px, METHODE_REDUCTION)
+        x, y = x[positions], y[positions]
+    return ax.plot(x, y, **style)
+
+
+def en_png(fig, **options):
+    buffer = io.BytesIO()
+    options.setdefault("dpi", DPI)
+    options.setdefault("bbox_inches", "tight")
+    fig.savefig(buffer, format="png", **options)
+    return buffer.getvalue()
+
+
+def performance(df, reduire=REDUCTION_ACTIVE):
+    fig, ax = nouvelle_figure()
+    tracer(ax, df["Date"], df["Production_kWh"], reduire,
+           color="#1f77b4", linewidth=2.5, label="Production solaire")
+    tracer(ax, df["Date"], df["Consommation_kWh"], reduire,
+           color="#ff7f0e", linewidth=2.5, linestyle="--", label="Consommation énergétique")
+
+    ax.set_title("Production vs Consommation d'énergie", fontsize=14, fontweight='bold')
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Énergie (kWh)")
+    ax.legend(loc="upper left", frameon=True, facecolor="white", edgecolor="gray")
+    ax.grid(True, linestyle="--", alpha=0.6)
+    fig.tight_layout()
+    return en_png(fig)
+
+
+def consommation_type(subset, etype, reduire=REDUCTION_ACTIVE):
+    fig, ax = nouvelle_figure()
+    tracer(ax, subset["Date"], subset["Consommation_kWh"], reduire, linewidth=2.2, label=f"{etype}")
+    ax.set_title(f"Consommation - {etype}")
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Consommation (kWh)")
+    ax.legend()
+    return en_png(fig)
+
+
+def repartition_types(df_sum):
+    fig, ax = nouvelle_figure()
+    ax.bar(df_sum.index, df_sum.values, color=COULEURS_TYPES)
+    ax.set_ylabel("Consommation totale (kWh)")
+    ax.set_xlabel("Type d’énergie")
+    ax.tick_params(axis="x", labelrotation=15)
+    fig.tight_layout()
+    return en_png(fig)
+
+
+def comparaison_periodes(df_grouped, periode, reduire=REDUCTION_ACTIVE):
+    fig, ax = nouvelle_figure()
+    tracer(ax, df_grouped.index.astype(str), df_grouped["Consommation_kWh"], reduire,
+           color="#2ca02c", linewidth=2)
+    ax.set_title("Comparaison de la consommation selon la période")
+    ax.set_xlabel(periode)
+    ax.set_ylabel("Consommation (kWh)")
+    ax.grid(True, linestyle="--", alpha=0.6)
+    fig.tight_layout()
+    return en_png(fig)
+
+
+def comparaison_reference(df_comparaison, periode, reference, reduire=REDUCTION_ACTIVE):
+    """Consommation par période et consommation de la période de référence (voir `periodes.comparer`)."""
+    fig, ax = nouvelle_figure()
+    # Abscisses numériques : les deux courbes réduites gardent le même axe
+    positions = np.arange(len(df_comparaison))
+    tracer(ax, positions, df_comparaison["Consommation_kWh"], reduire,
+           color="#2ca02c", linewidth=2, label="Période")
+    tracer(ax, positions, df_comparaison["Consommation_reference_kWh"], reduire,
+           color="gray", linewidth=2, linestyle="--", label=reference)
+    if len(positions):
+        reperes = np.unique(np.linspace(0, len(positions) - 1, 8).astype(int))
+        ax.set_xticks(reperes, df_comparaison.index[reperes], rotation=30, ha="right")
+    ax.set_title(f"Consommation par période - comparaison : {reference.lower()}")
+    ax.set_xlabel(periode)
+    ax.set_ylabel("Consommation (kWh)")
+    ax.legend()
+    ax.grid(True, linestyle="--", alpha=0.6)
+    fig.tight_layout()
+    return en_png(fig)
+
+
+def comparaison_sites(df_sites):
+    fig, ax = nouvelle_figure()
+    ax.bar(df_sites.index, df_sites.values, color="#9467bd")
+    ax.set_xlabel("Site")
+    ax.set_ylabel("Consommation totale (kWh)")
+    ax.tick_params(axis="x", labelrotation=10)
+    fig.tight_layout()
+    return en_png(fig)
+
+
+def rapport(df, reduire=REDUCTION_ACTIVE):
+    """Graphique production / consommation du rapport PDF."""
+    fig, ax = nouvelle_figure()
+    tracer(ax, df["Date"], df["Production_kWh"], reduire,
+           color="#1f77b4", linewidth=2, label="Production")
+    tracer(ax, df["Date"], df["Consommation_kWh"], reduire,
+           color="#ff7f0e", linewidth=2, linestyle="--", label="Consommation")
+    ax.set_title("Production vs Consommation")
+    ax.legend()
+    fig.tight_layout()
+    return en_png(fig, dpi=100, bbox_inches=None)
+
+
+class CacheGraphiques:
+    """Cache LRU des images rendues, borné en octets.
+
+    La clé décrit le graphique et l'état des filtres, par exemple
+    `("performance", empreinte, site, types, debut, fin)`.
+    """
+
+    def __init__(self, budget_octets=BUDGET_CACHE_MO * 1024 ** 2):
+        self.budget_octets = budget_octets
+        self.taille_octets = 0
+        self.hits = 0
+        self.misses = 0
+        self._images = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def __len__(self):
+        return len(self._images)
+
+    def obtenir(self, cle, construire, *args):
+        """Image en cache pour `cle`, sinon `construire(*args)` mise en cache."""
+        with self._verrou:
+            image = self._images.get(cle)
+            if image is not None:
+                self._images.move_to_end(cle)
+                self.hits += 1
+                return image
+            self.misses += 1
+
+        image = construire(*args)
+        if len(image) > self.budget_octets:
+            return image
+
+        with self._verrou:
+            if cle not in self._images:
+                self._images[cle] = image
+                self.taille_octets += len(image)
+            while self.taille_octets > self.budget_octets:
+                _, evincee = self._images.popitem(last=False)
+                self.taille_octets -= len(evincee)
+        return image
+
+    def vider(self):
+        with self._verrou:
+            self._images.clear()
+            self.taille_octets = 0
@@ -0,0 +1,161 @@
+"""Graphiques du tableau de bord dessinés dans le navigateur (Vega-Lite, via Altair).
+
+Mêmes fonctions et mêmes arguments que `graphiques`, mais chaque fonction
+renvoie une spécification Altair au lieu d'une image : le serveur n'envoie
+que les points (déjà réduits à environ un point par pixel) et le navigateur
+trace un graphique vectoriel, zoomable. Aucun rendu matplotlib n'a lieu.
+
+Altair n'est importé qu'au premier graphique demandé.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+import graphiques
+import sous_echantillonnage
+
+# Graphiques disponibles dans le navigateur (nom de fonction : libellé)
+GRAPHIQUES = {
+    "performance": "Production / consommation",
+    "consommation_type": "Consommation par type",
+    "repartition_types": "Répartition par type",
+    "comparaison_periodes": "Comparaison de périodes",
+    "comparaison_reference": "Comparaison à une période de référence",
+    "comparaison_sites": "Comparaison de sites",
+}
+# Graphiques dessinés dans le navigateur par défaut (liste séparée par des virgules)
+NAVIGATEUR_PAR_DEFAUT = [
+    nom for nom in os.environ.get("SOLAIRE_GRAPHIQUES_NAVIGATEUR", "").split(",") if nom in GRAPHIQUES
+]
+
+# Largeur de référence pour la réduction des courbes (pixels à l'écran)
+LARGEUR_PX = 1000
+HAUTEUR_PX = 320
+
+
+def _altair():
+    import altair as alt
+
+    return alt
+
+
+def _reduire(df, colonne_x, colonnes_y, reduire):
+    # Une seule réduction pour toutes les courbes : mêmes abscisses gardées
+    if not reduire or len(df) <= LARGEUR_PX:
+        return df
+    x = df[colonne_x].to_numpy()
+    positions = np.unique(np.concatenate([
+        sous_echantillonnage.reduire(x, df[col].to_numpy(dtype=np.float64), LARGEUR_PX,
+                                     graphiques.METHODE_REDUCTION)
+        for col in colonnes_y
+    ]))
+    return df.iloc[positions]
+
+
+def performance(df, reduire=graphiques.REDUCTION_ACTIVE):
+    alt = _altair()
+    donnees = _reduire(df[["Date", "Production_kWh", "Consommation_kWh"]], "Date",
+                       ["Production_kWh", "Consommation_kWh"], reduire)
+    donnees = donnees.rename(columns={"Production_kWh": "Production solaire",
+                                      "Consommation_kWh": "Consommation énergétique"})
+    series = ["Production solaire", "Consommation énergétique"]
+    return (
+        alt.Chart(donnees, title="Production vs Consommation d'énergie", height=HAUTEUR_PX)
+        .transform_fold(series, as_=["Série", "Énergie (kWh)"])
+        .mark_line(strokeWidth=2.5)
+        .encode(
+            x=alt.X("Date:T", title="Date"),
+            y=alt.Y("Énergie (kWh):Q"),
+            color=alt.Color("Série:N", sort=series,
+                            scale=alt.Scale(domain=series, range=["#1f77b4", "#ff7f0e"])),
+            strokeDash=alt.StrokeDash("Série:N", sort=series, legend=None,
+                                      scale=alt.Scale(domain=series, range=[[1, 0], [6, 4]])),
+            tooltip=["Date:T", "Série:N", alt.Tooltip("Énergie (kWh):Q", format=".2f")],
+        )
+        .interactive()
+    )
+
+
+def consommation_type(subset, etype, reduire=graphiques.REDUCTION_ACTIVE):
+    alt = _altair()
+    donnees = _reduire(subset[["Date", "Consommation_kWh"]], "Date", ["Consommation_kWh"], reduire)
+    return (
+        alt.Chart(donnees, title=f"Consommation - {etype}", height=HAUTEUR_PX)
+        .mark_line(strokeWidth=2.2)
+        .encode(
+            x=alt.X("Date:T", title="Date"),
+            y=alt.Y("Consommation_kWh:Q", title="Consommation (kWh)"),
+            tooltip=["Date:T", alt.Tooltip("Consommation_kWh:Q", format=".2f")],
+        )
+        .interactive()
+    )
+
+
+def _barres(serie, titre_x, titre_y, couleurs):
+    alt = _altair()
+    donnees = pd.DataFrame({"Categorie": serie.index.astype(str), "Valeur": serie.to_numpy()})
+    return (
+        alt.Chart(donnees, height=HAUTEUR_PX)
+        .mark_bar()
+        .encode(
+            x=alt.X("Categorie:N", title=titre_x, sort=None),
+            y=alt.Y("Valeur:Q", title=titre_y),
+            color=alt.Color("Categorie:N", legend=None, sort=None,
+                            scale=alt.Scale(range=couleurs)),
+            tooltip=[alt.Tooltip("Categorie:N", title=titre_x),
+                     alt.Tooltip("Valeur:Q", title=titre_y, format=".2f")],
+        )
+    )
+
+
+def repartition_types(df_sum):
+    return _barres(df_sum, "Type d’énergie", "Consommation totale (kWh)", graphiques.COULEURS_TYPES)
+
+
+def comparaison_periodes(df_grouped, periode, reduire=graphiques.REDUCTION_ACTIVE):
+    alt = _altair()
+    donnees = pd.DataFrame({"Periode": df_grouped.index.astype(str),
+                            "Consommation_kWh": df_grouped["Consommation_kWh"].to_numpy()})
+    donnees = _reduire(donnees.reset_index(drop=True).rename_axis("Rang").reset_index(),
+                       "Rang", ["Consommation_kWh"], reduire)
+    return (
+        alt.Chart(donnees, title="Comparaison de la consommation selon la période", height=HAUTEUR_PX)
+        .mark_line(strokeWidth=2, color="#2ca02c")
+        .encode(
+            x=alt.X("Periode:O", title=periode, sort=None),
+            y=alt.Y("Consommation_kWh:Q", title="Consommation (kWh)"),
+            tooltip=["Periode:O", alt.Tooltip("Consommation_kWh:Q", format=".2f")],
+        )
+    )
+
+
+def comparaison_reference(df_comparaison, periode, reference, reduire=graphiques.REDUCTION_ACTIVE):
+    alt = _altair()
+    donnees = pd.DataFrame({
+        "Rang": np.arange(len(df_comparaison)),
+        "Periode": df_comparaison.index.astype(str),
+        "Période": df_comparaison["Consommation_kWh"].to_numpy(),
+        reference: df_comparaison["Consommation_reference_kWh"].to_numpy(),
+    })
+    donnees = _reduire(donnees, "Rang", ["Période", reference], reduire)
+    series = ["Période", reference]
+    return (
+        alt.Chart(donnees, title=f"Consommation par période - comparaison : {reference.lower()}",
+                  height=HAUTEUR_PX)
+        .transform_fold(series, as_=["Série", "Consommation (kWh)"])
+        .mark_line(strokeWidth=2)
+        .encode(
+            x=alt.X("Periode:O", title=periode, sort=None),
+            y=alt.Y("Consommation (kWh):Q"),
+            color=alt.Color("Série:N", sort=series,
+                            scale=alt.Scale(domain=series, range=["#2ca02c", "gray"])),
+            strokeDash=alt.StrokeDash("Série:N", sort=series, legend=None,
+                                      scale=alt.Scale(domain=series, range=[[1, 0], [6, 4]])),
+            tooltip=["Periode:O", "Série:N", alt.Tooltip("Consommation (kWh):Q", format=".2f")],
+        )
+    )
+
+
+def comparaison_sites(df_sites):
+    return _barres(df_sites, "Site", "Consommation totale (kWh)", ["#9467bd"])
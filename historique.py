@@ -0,0 +1,284 @@
+"""Historique local persistant (SQLite) de toutes les mesures importées.
+
+Chaque import est ajouté à une base SQLite ; une mesure déjà connue (même
+site, type d'énergie et date) est remplacée par la plus récente, si bien
+qu'un même export réimporté ne crée pas de doublons. La clé primaire
+(site, type_energie, date) d'une table sans rowid sert d'index : une
+sélection ne lit que la plage de lignes demandée.
+
+Les totaux journaliers sont tenus à jour dans une seconde table à chaque
+ajout : indicateurs, regroupements par période et comparaisons de sites
+sont calculés sans relire les mesures brutes. Le tableau de bord peut ainsi
+s'ouvrir sans import, avec une mémoire bornée par la sélection affichée.
+
+L'historique est désactivé par défaut : chaque import y écrirait toutes ses
+lignes. `SOLAIRE_HISTORIQUE=<fichier.sqlite>` l'active pour le tableau de
+bord, `api.py` et `depot.py` (ou leur option `--historique`).
+
+Les dates sont stockées en secondes depuis 1970 (heure locale des exports,
+sans fuseau).
+"""
+import os
+import sqlite3
+import threading
+from contextlib import closing, contextmanager
+
+import numpy as np
+import pandas as pd
+
+CHEMIN_HISTORIQUE = os.environ.get("SOLAIRE_HISTORIQUE", "")
+LIGNES_PAR_LOT = 50_000
+JOUR = 86_400
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS mesures (
+    site TEXT NOT NULL,
+    type_energie TEXT NOT NULL,
+    date INTEGER NOT NULL,
+    production REAL,
+    consommation REAL,
+    PRIMARY KEY (site, type_energie, date)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS jours (
+    site TEXT NOT NULL,
+    type_energie TEXT NOT NULL,
+    jour INTEGER NOT NULL,
+    production REAL,
+    consommation REAL,
+    PRIMARY KEY (site, type_energie, jour)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS imports (
+    empreinte TEXT PRIMARY KEY,
+    nom TEXT,
+    lignes INTEGER,
+    importe_le TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS fichiers_depot (
+    chemin TEXT PRIMARY KEY,
+    taille INTEGER,
+    modifie_ns INTEGER,
+    octets_lus INTEGER,
+    entete BLOB,
+    empreinte_lus TEXT
+);
+"""
+
+
+def _secondes(dates):
+    return pd.to_datetime(dates).to_numpy().astype("datetime64[s]").astype(np.int64)
+
+
+def _dates(secondes):
+    return pd.to_datetime(np.asarray(secondes, dtype=np.int64), unit="s")
+
+
+def _condition(site=None, types=None, debut=None, fin=None, colonne="date"):
+    # Clause WHERE et paramètres, dans l'ordre de la clé primaire
+    clauses, parametres = [], []
+    if site is not None:
+        clauses.append("site = ?")
+        parametres.append(str(site))
+    if types is not None:
+        types = [str(t) for t in types]
+        clauses.append(f"type_energie IN ({', '.join('?' * len(types))})")
+        parametres += types
+    if debut is not None:
+        clauses.append(f"{colonne} >= ?")
+        parametres.append(int(_secondes([debut])[0]))
+    if fin is not None:
+        clauses.append(f"{colonne} <= ?")
+        parametres.append(int(_secondes([fin])[0]))
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), parametres
+
+
+class Historique:
+    """Base SQLite des mesures, partagée par les sessions et les threads."""
+
+    def __init__(self, chemin=CHEMIN_HISTORIQUE):
+        self.chemin = chemin
+        self._verrou_ecriture = threading.Lock()
+        with self._connexion() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.executescript(SCHEMA)
+            # Base créée avant la colonne empreinte_lus : ses fichiers seront relus en entier
+            colonnes = [ligne[1] for ligne in con.execute("PRAGMA table_info(fichiers_depot)")]
+            if "empreinte_lus" not in colonnes:
+                con.execute("ALTER TABLE fichiers_depot ADD COLUMN empreinte_lus TEXT")
+
+    @contextmanager
+    def _connexion(self):
+        # Une connexion par opération : utilisable depuis n'importe quel thread
+        with closing(sqlite3.connect(self.chemin, timeout=30)) as con:
+            with con:
+                yield con
+
+    def _requete(self, sql, parametres=()):
+        with self._connexion() as con:
+            return con.execute(sql, parametres).fetchall()
+
+    # ---------------------------
+    # Écriture
+    # ---------------------------
+
+    def deja_importe(self, empreinte):
+        return bool(self._requete("SELECT 1 FROM imports WHERE empreinte = ?", (empreinte,)))
+
+    def ajouter(self, data, empreinte=None, nom=None):
+        """Ajoute (ou remplace) les mesures de `data` ; renvoie le nombre de lignes écrites.
+
+        Avec une `empreinte`, un fichier déjà importé n'est pas relu.
+        """
+        return self.ajouter_blocs([data], empreinte, nom)
+
+    def ajouter_blocs(self, blocs, empreinte=None, nom=None):
+        """Comme `ajouter`, pour une suite de blocs écrits dans une seule transaction."""
+        if empreinte is not None and self.deja_importe(empreinte):
+            return 0
+        lignes = 0
+        with self._verrou_ecriture, self._connexion() as con:
+            con.execute("CREATE TEMP TABLE IF NOT EXISTS jours_touches "
+                        "(site TEXT, type_energie TEXT, jour INTEGER, PRIMARY KEY (site, type_energie, jour))")
+            for data in blocs:
+                lignes += self._inserer(con, data)
+            self._recalculer_jours(con)
+            if empreinte is not None:
+                con.execute("INSERT OR REPLACE INTO imports (empreinte, nom, lignes) VALUES (?, ?, ?)",
+                            (empreinte, nom, lignes))
+        return lignes
+
+    def _inserer(self, con, data):
+        data = data[["Site", "Type_Energie", "Date", "Production_kWh", "Consommation_kWh"]]
+        # Sans site ou sans type, une mesure n'a pas de clé : non enregistrée
+        # (et non sous le site "nan"), comme elle est ignorée par l'index
+        data = data[data["Site"].notna().to_numpy() & data["Type_Energie"].notna().to_numpy()]
+        secondes = _secondes(data["Date"])
+        sites = data["Site"].astype(str).to_numpy()
+        types = data["Type_Energie"].astype(str).to_numpy()
+        for i in range(0, len(data), LIGNES_PAR_LOT):
+            lot = slice(i, i + LIGNES_PAR_LOT)
+            con.executemany(
+                "INSERT INTO mesures VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (site, type_energie, date) DO UPDATE SET "
+                "production = excluded.production, consommation = excluded.consommation",
+                zip(sites[lot].tolist(), types[lot].tolist(), secondes[lot].tolist(),
+                    data["Production_kWh"].iloc[lot].astype(float).tolist(),
+                    data["Consommation_kWh"].iloc[lot].astype(float).tolist()),
+            )
+        # Journées touchées, dont les totaux seront recalculés
+        touches = pd.DataFrame({"site": sites, "type_energie": types, "jour": secondes - secondes % JOUR})
+        con.executemany("INSERT OR IGNORE INTO jours_touches VALUES (?, ?, ?)",
+                        touches.drop_duplicates().itertuples(index=False, name=None))
+        return len(data)
+
+    def _recalculer_jours(self, con):
+        # Seules les journées touchées sont recalculées, par lecture de l'index
+        # (site, type, date) : le coût suit la taille des données ajoutées
+        con.execute("DELETE FROM jours WHERE (site, type_energie, jour) IN "
+                    "(SELECT site, type_energie, jour FROM jours_touches)")
+        con.execute(
+            "INSERT INTO jours SELECT t.site, t.type_energie, t.jour, "
+            "SUM(m.production), SUM(m.consommation) FROM jours_touches AS t "
+            "JOIN mesures AS m ON m.site = t.site AND m.type_energie = t.type_energie "
+            "AND m.date BETWEEN t.jour AND t.jour + 86399 "
+            "GROUP BY t.site, t.type_energie, t.jour"
+        )
+        con.execute("DELETE FROM jours_touches")
+
+    # ---------------------------
+    # Dossier de dépôt
+    # ---------------------------
+
+    def etat_fichier(self, chemin):
+        """(taille, date de modification en ns, octets déjà lus, en-tête, empreinte de la fin lue)
+        d'un fichier déposé, ou None."""
+        lignes = self._requete(
+            "SELECT taille, modifie_ns, octets_lus, entete, empreinte_lus FROM fichiers_depot WHERE chemin = ?",
+            (chemin,),
+        )
+        return lignes[0] if lignes else None
+
+    def noter_fichier(self, chemin, taille, modifie_ns, octets_lus, entete, empreinte_lus=None):
+        with self._connexion() as con:
+            con.execute("INSERT OR REPLACE INTO fichiers_depot VALUES (?, ?, ?, ?, ?, ?)",
+                        (chemin, taille, modifie_ns, octets_lus, entete, empreinte_lus))
+
+    # ---------------------------
+    # Lecture
+    # ---------------------------
+
+    def version(self):
+        """Change à chaque import : clé des caches construits sur l'historique."""
+        nombre, dernier = self._requete("SELECT COUNT(*), MAX(importe_le) FROM imports")[0]
+        return f"historique-{nombre}-{dernier}"
+
+    def resume(self):
+        """(nombre de fichiers importés, lignes lues dans ces fichiers)."""
+        fichiers, lignes = self._requete("SELECT COUNT(*), SUM(lignes) FROM imports")[0]
+        return fichiers, lignes or 0
+
+    def vide(self):
+        return not self._requete("SELECT 1 FROM jours LIMIT 1")
+
+    def sites(self):
+        return [s for (s,) in self._requete("SELECT DISTINCT site FROM jours ORDER BY site")]
+
+    def types_energie(self):
+        return [t for (t,) in self._requete("SELECT DISTINCT type_energie FROM jours ORDER BY type_energie")]
+
+    def bornes_dates(self):
+        """Première et dernière journée de l'historique."""
+        premier, dernier = self._requete("SELECT MIN(jour), MAX(jour) FROM jours")[0]
+        if premier is None:
+            return None, None
+        return _dates([premier])[0], _dates([dernier])[0]
+
+    def lire(self, site=None, types=None, debut=None, fin=None):
+        """Mesures brutes de la sélection, triées par date (puis type d'énergie)."""
+        where, parametres = _condition(site, types, debut, fin)
+        with self._connexion() as con:
+            data = pd.read_sql_query(
+                "SELECT date AS Date, site AS Site, type_energie AS Type_Energie, "
+                "production AS Production_kWh, consommation AS Consommation_kWh "
+                f"FROM mesures{where} ORDER BY date, type_energie",
+                con, params=parametres,
+            )
+        return self._typer(data, "Date")
+
+    def jours(self, site=None, types=None, debut=None, fin=None):
+        """Totaux journaliers (Site, Type_Energie, Date, énergies) de la sélection."""
+        where, parametres = _condition(site, types, debut, fin, colonne="jour")
+        with self._connexion() as con:
+            data = pd.read_sql_query(
+                "SELECT site AS Site, type_energie AS Type_Energie, jour AS Date, "
+                "production AS Production_kWh, consommation AS Consommation_kWh "
+                f"FROM jours{where} ORDER BY site, type_energie, jour",
+                con, params=parametres,
+            )
+        return self._typer(data, "Date", categories=False)
+
+    def totaux(self, par, site=None, types=None, debut=None, fin=None, sites=None):
+        """Totaux des énergies groupés par `par` ("site" ou "type_energie")."""
+        where, parametres = _condition(site, types, debut, fin, colonne="jour")
+        if sites is not None:
+            sites = [str(s) for s in sites]
+            where += (" AND " if where else " WHERE ") + f"site IN ({', '.join('?' * len(sites))})"
+            parametres += sites
+        with self._connexion() as con:
+            return pd.read_sql_query(
+                f"SELECT {par}, SUM(production) AS Production_kWh, SUM(consommation) AS Consommation_kWh "
+                f"FROM jours{where} GROUP BY {par} ORDER BY {par}",
+                con, params=parametres, index_col=par,
+            )
+
+    @staticmethod
+    def _typer(data, colonne_date, categories=True):
+        data[colonne_date] = _dates(data[colonne_date])
+        if categories:
+            for col in ("Site", "Type_Energie"):
+                data[col] = data[col].astype("category")
+        for col in ("Production_kWh", "Consommation_kWh"):
+            data[col] = data[col].astype("float32" if categories else "float64")
+        return data
@@ -0,0 +1,137 @@
+"""Index trié (Site, Type_Energie, Date) pour filtrer sans masque booléen.
+
+Les lignes sont regroupées par site et type d'énergie, puis triées par date
+dans chaque groupe. Les lignes sans site ou sans type d'énergie sont rangées
+en fin de tableau et n'appartiennent à aucun groupe. Une sélection se fait
+par recherche dichotomique sur les dates et par tranches contiguës : son
+coût dépend de la taille du résultat et non de celle du jeu de données.
+
+Des sommes cumulées (préfixes) des énergies sont calculées à la création :
+le total d'une plage de dates s'obtient par deux lectures et une soustraction.
+"""
+import numpy as np
+import pandas as pd
+
+ORDRE_INDEX = ["Site", "Type_Energie", "Date"]
+COLONNES_CUMULEES = ["Production_kWh", "Consommation_kWh"]
+
+
+def codes_tries(serie):
+    """(codes entiers, valeurs) d'une colonne, codes dans l'ordre de tri des valeurs."""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.cat.codes.to_numpy(), serie.cat.categories
+    codes, valeurs = pd.factorize(serie, sort=True)
+    return codes, valeurs
+
+
+def _rangs(codes):
+    # Code -1 (valeur manquante) rangé après toutes les valeurs, comme dans sort_values
+    rangs = codes.astype(np.int64)
+    rangs[rangs < 0] = np.iinfo(np.int64).max
+    return rangs
+
+
+def _est_trie(codes_site, codes_type, dates):
+    if len(dates) < 2:
+        return True
+    d_site = np.diff(_rangs(codes_site))
+    d_type = np.diff(_rangs(codes_type))
+    d_date = np.diff(dates.view(np.int64))
+    return bool(np.all((d_site > 0) | ((d_site == 0) & ((d_type > 0) | ((d_type == 0) & (d_date >= 0))))))
+
+
+def trier(data):
+    """Trie les données dans l'ordre de l'index (sans copie si déjà trié)."""
+    codes_site, _ = codes_tries(data["Site"])
+    codes_type, _ = codes_tries(data["Type_Energie"])
+    if _est_trie(codes_site, codes_type, data["Date"].to_numpy()):
+        return data
+    return data.sort_values(ORDRE_INDEX, kind="stable").reset_index(drop=True)
+
+
+def bornes_journees(debut, fin):
+    """Bornes incluses couvrant entièrement les journées `debut` à `fin`."""
+    debut = pd.Timestamp(debut).normalize()
+    fin = pd.Timestamp(fin).normalize() + pd.Timedelta(days=1) - pd.Timedelta(1, "ns")
+    return debut, fin
+
+
+class IndexSites:
+    """Accès par (site, type d'énergie, plage de dates) à un DataFrame trié."""
+
+    def __init__(self, data, cumuls=None):
+        # `cumuls` : sommes cumulées déjà calculées pour `data`, déjà trié
+        # (jeu partagé, voir `stockage.projeter`)
+        self.data = trier(data)
+        self.dates = self.data["Date"].to_numpy()
+
+        codes_site, sites = codes_tries(self.data["Site"])
+        codes_type, types = codes_tries(self.data["Type_Energie"])
+
+        # Début de chaque groupe (site, type) dans le tableau trié
+        if len(self.data):
+            changements = np.flatnonzero(
+                (np.diff(codes_site) != 0) | (np.diff(codes_type) != 0)
+            ) + 1
+            debuts = np.concatenate(([0], changements))
+            fins = np.concatenate((changements, [len(self.data)]))
+        else:
+            debuts = fins = np.array([], dtype=np.int64)
+
+        # Lignes sans site ou sans type (code -1) : aucun groupe, jamais sélectionnées
+        self.groupes = {
+            (sites[codes_site[i]], types[codes_type[i]]): (int(i), int(j))
+            for i, j in zip(debuts, fins)
+            if codes_site[i] >= 0 and codes_type[i] >= 0
+        }
+
+        # cumuls[col][k] = somme des k premières lignes (en float64 pour la précision)
+        if cumuls is None:
+            cumuls = {}
+            for col in COLONNES_CUMULEES:
+                if col in self.data.columns:
+                    cumul = np.zeros(len(self.data) + 1, dtype=np.float64)
+                    np.cumsum(self.data[col].to_numpy(dtype=np.float64), out=cumul[1:])
+                    cumuls[col] = cumul
+        self.cumuls = cumuls
+
+    def __len__(self):
+        return len(self.data)
+
+    def sites(self):
+        return list(dict.fromkeys(site for site, _ in self.groupes))
+
+    def types_energie(self):
+        return list(dict.fromkeys(etype for _, etype in self.groupes))
+
+    def plage(self, site, etype, debut=None, fin=None):
+        """Positions [i, j) des lignes du groupe comprises entre `debut` et `fin` inclus."""
+        i, j = self.groupes.get((site, etype), (0, 0))
+        if debut is not None:
+            i += int(np.searchsorted(self.dates[i:j], pd.Timestamp(debut).to_datetime64(), "left"))
+        if fin is not None:
+            j = i + int(np.searchsorted(self.dates[i:j], pd.Timestamp(fin).to_datetime64(), "right"))
+        return i, j
+
+    def selection(self, site, types, debut=None, fin=None):
+        """Lignes du site pour les types donnés, entre `debut` et `fin` inclus, triées par date."""
+        morceaux = []
+        for etype in types:
+            i, j = self.plage(site, etype, debut, fin)
+            if j > i:
+                morceaux.append(self.data.iloc[i:j])
+
+        if not morceaux:
+            return self.data.iloc[0:0]
+        if len(morceaux) == 1:
+            return morceaux[0]
+        return pd.concat(morceaux).sort_values("Date", kind="stable")
+
+    def sommes(self, site, types, debut=None, fin=None):
+        """Totaux des énergies du site pour les types et la plage de dates donnés."""
+        totaux = dict.fromkeys(self.cumuls, 0.0)
+        for etype in types:
+            i, j = self.plage(site, etype, debut, fin)
+            for col, cumul in self.cumuls.items():
+                totaux[col] += float(cumul[j] - cumul[i])
+        return totaux
@@ -0,0 +1,385 @@
+"""Lecture des fichiers importés (CSV ou Excel) et cache d'ingestion partagé.
+
+Le format des dates est détecté une fois sur un échantillon, puis toute la
+colonne est lue avec ce format fixe ; les lignes dont la date est illisible
+sont écartées et comptées (`data.attrs["lignes_invalides"]`). Les CSV sont
+lus par le moteur Arrow et les classeurs par calamine quand ils sont
+installés.
+
+Les gros CSV sont lus en flux, par blocs de taille bornée, et écrits bloc par
+bloc dans le stockage Parquet. En ligne de commande, le fichier n'est jamais
+chargé en entier : la mémoire crête ne dépend pas de la taille du fichier.
+
+    python ingestion.py export_flotte.csv --memoire-mo 64
+
+Dans le tableau de bord, le fichier téléversé est déjà en mémoire et le jeu
+analysé est rechargé en entier depuis le stockage : la lecture en flux y
+évite seulement les copies intermédiaires du texte, et la mémoire crête
+reste proportionnelle à la taille du fichier.
+"""
+import argparse
+import datetime
+import hashlib
+import importlib.util
+import io
+import os
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+from pandas.api.types import is_datetime64_any_dtype, union_categoricals
+
+import stockage
+from index_donnees import trier
+
+COLONNES_ATTENDUES = {"Date", "Site", "Type_Energie", "Production_kWh", "Consommation_kWh"}
+
+# Budget mémoire par défaut du cache (en Mo), modifiable par variable d'environnement
+BUDGET_CACHE_MO = int(os.environ.get("SOLAIRE_CACHE_INGESTION_MO", "512"))
+
+# Au-delà de cette taille, un CSV est lu en flux ; mémoire visée par bloc lu.
+# Le seuil doit rester sous la limite de téléversement de Streamlit
+# (`server.maxUploadSize`, 1024 Mo dans .streamlit/config.toml)
+SEUIL_FLUX_MO = int(os.environ.get("SOLAIRE_SEUIL_FLUX_MO", "100"))
+MEMOIRE_BLOC_MO = int(os.environ.get("SOLAIRE_MEMOIRE_BLOC_MO", "64"))
+
+# Formats essayés sur l'échantillon, par ordre de préférence : en cas
+# d'ambiguïté (01/02/2025), le jour est lu avant le mois
+FORMATS_DATE = [
+    "ISO8601",
+    "%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%d/%m/%Y",
+    "%d-%m-%Y %H:%M:%S", "%d-%m-%Y %H:%M", "%d-%m-%Y",
+    "%d.%m.%Y %H:%M:%S", "%d.%m.%Y %H:%M", "%d.%m.%Y",
+    "%m/%d/%Y %H:%M:%S", "%m/%d/%Y %H:%M", "%m/%d/%Y",
+    "%Y/%m/%d %H:%M:%S", "%Y/%m/%d %H:%M", "%Y/%m/%d",
+]
+TAILLE_ECHANTILLON_DATES = 1000
+
+# Fichiers lus en parallèle lors d'un import multiple
+INGESTION_WORKERS = int(os.environ.get("SOLAIRE_INGESTION_WORKERS", str(min(8, os.cpu_count() or 1))))
+
+
+class ColonnesManquantes(ValueError):
+    """Le fichier importé ne contient pas toutes les colonnes attendues."""
+
+
+def empreinte(contenu):
+    """Empreinte du contenu brut du fichier (clé du cache)."""
+    return hashlib.blake2b(contenu, digest_size=16).hexdigest()
+
+
+def empreinte_chemin(chemin, taille_bloc=8 * 1024 ** 2):
+    """Même empreinte que `empreinte`, calculée sans charger le fichier en mémoire."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(chemin, "rb") as f:
+        for morceau in iter(lambda: f.read(taille_bloc), b""):
+            h.update(morceau)
+    return h.hexdigest()
+
+
+def verifier_colonnes(colonnes):
+    if not COLONNES_ATTENDUES.issubset(colonnes):
+        raise ColonnesManquantes(
+            f"Le fichier doit contenir les colonnes suivantes : {COLONNES_ATTENDUES}"
+        )
+
+
+def moteur_csv():
+    return "pyarrow" if importlib.util.find_spec("pyarrow") is not None else "c"
+
+
+def moteur_excel():
+    # calamine (Rust) lit les classeurs bien plus vite qu'openpyxl
+    return "calamine" if importlib.util.find_spec("python_calamine") is not None else None
+
+
+def detecter_format_date(valeurs, taille=TAILLE_ECHANTILLON_DATES):
+    """Format de `FORMATS_DATE` qui lit le plus de dates d'un échantillon, ou None.
+
+    L'échantillon est réparti sur toute la colonne (une date ambiguë en
+    début de fichier peut être tranchée plus loin).
+    """
+    valeurs = valeurs.dropna()
+    if valeurs.empty:
+        return None
+    echantillon = valeurs.iloc[::max(1, len(valeurs) // taille)].iloc[:taille].astype(str)
+    meilleur, lues_max = None, 0
+    for format_date in FORMATS_DATE:
+        lues = int(pd.to_datetime(echantillon, format=format_date, errors="coerce").notna().sum())
+        if lues > lues_max:
+            meilleur, lues_max = format_date, lues
+            if lues == len(echantillon):
+                break
+    return meilleur
+
+
+def convertir_dates(valeurs, format_date=None):
+    """(dates en datetime64[ns], format utilisé) ; les valeurs illisibles deviennent NaT.
+
+    Sans `format_date`, le format est détecté sur un échantillon.
+    """
+    if is_datetime64_any_dtype(valeurs):
+        return valeurs.astype("datetime64[ns]"), format_date
+    premiere = valeurs.dropna().iloc[:1]
+    if len(premiere) and isinstance(premiere.iloc[0], datetime.date):
+        # Dates déjà typées (classeur Excel, dates seules lues par Arrow)
+        return pd.to_datetime(valeurs, errors="coerce").astype("datetime64[ns]"), format_date
+    if format_date is None:
+        format_date = detecter_format_date(valeurs)
+    if format_date is None:
+        # Aucun format connu : déduction ligne à ligne, jour avant mois
+        return pd.to_datetime(valeurs, errors="coerce", format="mixed", dayfirst=True), None
+    return pd.to_datetime(valeurs, format=format_date, errors="coerce"), format_date
+
+
+def _ecarter_dates_invalides(data, format_date=None):
+    # Conversion de la colonne Date ; lignes illisibles écartées et comptées
+    dates, format_date = convertir_dates(data["Date"], format_date)
+    invalides = dates.isna()
+    data["Date"] = dates
+    if invalides.any():
+        data = data[~invalides.to_numpy()].reset_index(drop=True)
+    data.attrs["lignes_invalides"] = int(invalides.sum())
+    return data, format_date
+
+
+def lire_fichier(nom, contenu):
+    """Lit un fichier CSV/Excel, vérifie les colonnes et trie par site, type et date."""
+    return trier(lire_brut(nom, contenu))
+
+
+def lire_brut(nom, contenu):
+    """Lit un fichier CSV/Excel et vérifie les colonnes, sans trier les lignes."""
+    if nom.endswith(".csv"):
+        try:
+            data = pd.read_csv(io.BytesIO(contenu), engine=moteur_csv())
+        except Exception:
+            # Le moteur Arrow refuse certains CSV que le parseur C accepte
+            data = pd.read_csv(io.BytesIO(contenu))
+    else:
+        data = pd.read_excel(io.BytesIO(contenu), engine=moteur_excel())
+
+    # Vérification avant conversion : une colonne Date absente ne doit pas planter
+    verifier_colonnes(data.columns)
+
+    data, _ = _ecarter_dates_invalides(data)
+    return data
+
+
+def lignes_par_bloc(source, memoire_octets=MEMOIRE_BLOC_MO * 1024 ** 2):
+    """Nombre de lignes par bloc pour rester sous `memoire_octets`, estimé sur un échantillon."""
+    position = source.tell()
+    echantillon = pd.read_csv(source, nrows=2000)
+    source.seek(position)
+    if echantillon.empty:
+        return 10_000
+    octets_par_ligne = echantillon.memory_usage(deep=True).sum() / len(echantillon)
+    # Marge ×3 : texte brut du bloc, conversions (dates, float32) et écriture
+    return max(1_000, int(memoire_octets / (3 * octets_par_ligne)))
+
+
+def lire_par_blocs(source, lignes, progression=None, taille_totale=None):
+    """Blocs validés et convertis d'un CSV, lus `lignes` par `lignes`.
+
+    Les colonnes sont vérifiées sur chaque bloc et seules les colonnes
+    attendues sont gardées, pour un schéma identique d'un bloc à l'autre.
+    `progression(octets_lus, taille_totale)` est appelée après chaque bloc.
+    Le format des dates est détecté sur le premier bloc ; les lignes écartées
+    de chaque bloc sont comptées dans `bloc.attrs["lignes_invalides"]`. Un
+    site ou un type d'énergie absent reste manquant (et non le texte "nan") :
+    la ligne est signalée par le contrôle qualité.
+    """
+    format_date = None
+    for bloc in pd.read_csv(source, chunksize=lignes):
+        verifier_colonnes(bloc.columns)
+        bloc, format_date = _ecarter_dates_invalides(bloc[stockage.COLONNES].copy(), format_date)
+        for col in stockage.COLONNES_CATEGORIES:
+            # Texte nullable : même schéma d'un bloc à l'autre, valeurs absentes gardées
+            bloc[col] = bloc[col].astype("string")
+        for col in stockage.COLONNES_ENERGIE:
+            bloc[col] = bloc[col].astype("float32")
+        yield bloc
+        if progression is not None:
+            progression(source.tell(), taille_totale)
+
+
+def ingerer_par_blocs(source, empreinte_fichier, memoire_octets=MEMOIRE_BLOC_MO * 1024 ** 2,
+                      progression=None, taille_totale=None):
+    """Écrit un CSV dans le stockage Parquet sans jamais le charger entièrement."""
+    lignes = lignes_par_bloc(source, memoire_octets)
+    blocs = lire_par_blocs(source, lignes, progression, taille_totale)
+    return stockage.ecrire_par_blocs(blocs, empreinte_fichier)
+
+
+class CacheIngestion:
+    """Cache LRU des DataFrames lus, indexé par l'empreinte du contenu.
+
+    Le cache est prévu pour être partagé entre toutes les sessions : deux
+    opérateurs qui importent le même export obtiennent le même DataFrame.
+    Les DataFrames renvoyés sont partagés et ne doivent pas être modifiés.
+
+    Avec `persistant`, chaque fichier lu est aussi converti en Parquet
+    (voir `stockage`) : après une éviction ou un redémarrage, le même export
+    est rechargé depuis le disque au lieu d'être relu.
+    """
+
+    def __init__(self, budget_octets=BUDGET_CACHE_MO * 1024 ** 2, persistant=None):
+        self.budget_octets = budget_octets
+        if persistant is None:
+            persistant = stockage.parquet_disponible()
+        self.persistant = persistant
+        self.taille_octets = 0
+        self.hits = 0
+        self.misses = 0
+        self._entrees = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def __len__(self):
+        return len(self._entrees)
+
+    def charger(self, nom, contenu, cle=None, progression=None):
+        """Renvoie le DataFrame trié du fichier, en le lisant seulement si besoin.
+
+        `progression(octets_lus, taille_totale)` suit la lecture en flux des gros CSV.
+        """
+        extension = os.path.splitext(nom)[1].lower()
+        cle = (cle or empreinte(contenu), extension)
+
+        with self._verrou:
+            entree = self._entrees.get(cle)
+            if entree is not None:
+                self._entrees.move_to_end(cle)
+                self.hits += 1
+                return entree[0]
+            self.misses += 1
+
+        # La lecture se fait hors verrou pour ne pas bloquer les autres sessions
+        data = self._lire(nom, contenu, cle[0], progression)
+        self.ajouter(cle, data)
+        return data
+
+    def _lire(self, nom, contenu, empreinte_fichier, progression=None):
+        if self.persistant and stockage.existe(empreinte_fichier):
+            return stockage.lire(empreinte_fichier)
+
+        if self.persistant and nom.endswith(".csv") and len(contenu) > SEUIL_FLUX_MO * 1024 ** 2:
+            # Le texte est lu par blocs, mais `contenu` est déjà en mémoire et le
+            # jeu est relu en entier pour l'analyse : mémoire non bornée ici
+            ingerer_par_blocs(io.BytesIO(contenu), empreinte_fichier,
+                              progression=progression, taille_totale=len(contenu))
+            return stockage.lire(empreinte_fichier)
+
+        data = stockage.compacter(lire_fichier(nom, contenu))
+        if self.persistant:
+            stockage.ecrire(data, empreinte_fichier)
+        return data
+
+    def ajouter(self, cle, data):
+        taille = int(data.memory_usage(deep=True).sum())
+        if taille > self.budget_octets:
+            return
+
+        with self._verrou:
+            if cle in self._entrees:
+                self._entrees.move_to_end(cle)
+                return
+            self._entrees[cle] = (data, taille)
+            self.taille_octets += taille
+            # Éviction des entrées les moins récemment utilisées
+            while self.taille_octets > self.budget_octets:
+                _, (_, taille_evincee) = self._entrees.popitem(last=False)
+                self.taille_octets -= taille_evincee
+
+    def vider(self):
+        with self._verrou:
+            self._entrees.clear()
+            self.taille_octets = 0
+
+
+# ---------------------------
+# Import de plusieurs fichiers
+# ---------------------------
+
+def empreinte_lot(empreintes):
+    """Empreinte d'un ensemble de fichiers, indépendante de leur ordre."""
+    if len(empreintes) == 1:
+        return empreintes[0]
+    return empreinte("|".join(sorted(empreintes)).encode())
+
+
+def charger_plusieurs(cache, fichiers, workers=INGESTION_WORKERS, progression=None):
+    """Lit plusieurs fichiers en parallèle dans le cache d'ingestion.
+
+    `fichiers` : liste de (nom, contenu, empreinte). Chaque fichier est
+    vérifié séparément. Renvoie ({empreinte: DataFrame}, {empreinte: erreur}),
+    dans l'ordre de `fichiers` : deux fichiers de même nom mais de contenus
+    différents sont tous deux gardés, un même contenu n'est lu qu'une fois.
+    `progression(fichiers_lus, nombre_de_fichiers)` est appelée depuis le
+    thread appelant.
+    """
+    uniques = {}
+    for nom, contenu, cle in fichiers:
+        uniques.setdefault(cle or empreinte(contenu), (nom, contenu))
+    lus, erreurs = {}, {}
+    # La lecture (parseur C de pandas) libère le GIL : des threads suffisent
+    # et le cache d'ingestion reste partagé
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(uniques))),
+                            thread_name_prefix="ingestion") as pool:
+        taches = {pool.submit(cache.charger, nom, contenu, cle): cle for cle, (nom, contenu) in uniques.items()}
+        for faits, tache in enumerate(as_completed(taches), start=1):
+            cle = taches[tache]
+            try:
+                lus[cle] = tache.result()
+            except Exception as exc:
+                # Fichier invalide ou illisible : signalé sans bloquer les autres
+                erreurs[cle] = exc
+            if progression is not None:
+                progression(faits, len(uniques))
+    return ({cle: lus[cle] for cle in uniques if cle in lus},
+            {cle: erreurs[cle] for cle in uniques if cle in erreurs})
+
+
+def fusionner(morceaux):
+    """Réunit des imports en une seule concaténation, triée par site, type et date.
+
+    Les catégories de `Site` et `Type_Energie` sont unifiées au préalable :
+    la concaténation garde des catégories (et non des objets) et les codes
+    sont cohérents d'un fichier à l'autre.
+    """
+    if len(morceaux) == 1:
+        return morceaux[0]
+    morceaux = [stockage.compacter_colonnes(m.copy(deep=False)) for m in morceaux]
+    # Colonnes supplémentaires gardées seulement si tous les fichiers les ont
+    colonnes = [c for c in morceaux[0].columns if all(c in m.columns for m in morceaux)]
+    morceaux = [m[colonnes] for m in morceaux]
+    for col in stockage.COLONNES_CATEGORIES:
+        categories = union_categoricals([m[col] for m in morceaux], sort_categories=True).categories
+        for m in morceaux:
+            m[col] = m[col].cat.set_categories(categories)
+    return trier(pd.concat(morceaux, ignore_index=True))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importe un gros CSV dans le stockage Parquet, par blocs.")
+    parser.add_argument("fichier", help="export CSV à importer")
+    parser.add_argument("--memoire-mo", type=int, default=MEMOIRE_BLOC_MO,
+                        help=f"mémoire visée par bloc, en Mo (défaut : {MEMOIRE_BLOC_MO})")
+    args = parser.parse_args(argv)
+
+    cle = empreinte_chemin(args.fichier)
+    taille = os.path.getsize(args.fichier)
+
+    def progression(lus, total):
+        print(f"\r{lus / 1024 ** 2:.0f} / {total / 1024 ** 2:.0f} Mo", end="", file=sys.stderr)
+
+    with open(args.fichier, "rb") as source:
+        destination = ingerer_par_blocs(source, cle, args.memoire_mo * 1024 ** 2, progression, taille)
+    print(f"\n{args.fichier} → {destination}", file=sys.stderr)
+    print(cle)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""Surveillance de maintenance de toute la flotte, en un seul passage vectorisé.
+
+À partir des totaux journaliers (niveau jour du cube), trois indicateurs
+glissants sont calculés pour chaque site et chaque jour, sur une fenêtre de
+`fenetre` jours se terminant ce jour-là :
+- rendement : consommation / production (%), signalé sous `seuil_rendement` ;
+- part batterie : consommation batterie / consommation totale, signalée
+  au-dessus de `seuil_batterie` ;
+- baisse de production : production moyenne de la fenêtre comparée à celle
+  des `reference` jours précédents, signalée au-delà de `seuil_baisse`.
+
+Les données sont rangées dans des matrices sites × jours ; les fenêtres sont
+des différences de sommes cumulées, sans boucle sur les sites. Les jours
+signalés consécutifs forment une période, classée par gravité (somme des
+dépassements relatifs du seuil sur la période).
+"""
+import numpy as np
+import pandas as pd
+
+SEUIL_RENDEMENT = 70
+SEUIL_BATTERIE = 0.8
+SEUIL_BAISSE = 0.3
+FENETRE_JOURS = 7
+REFERENCE_JOURS = 28
+# Part minimale de jours avec des données dans une fenêtre pour la juger
+COUVERTURE_MIN = 0.8
+
+COLONNES_ANOMALIES = ["Site", "Indicateur", "Debut", "Fin", "Jours", "Valeur", "Seuil", "Gravite"]
+
+
+def _matrice(codes, colonnes, valeurs, forme):
+    # Somme des valeurs par (site, jour), jours sans données à 0
+    plat = np.bincount(codes * forme[1] + colonnes, weights=valeurs, minlength=forme[0] * forme[1])
+    return plat.reshape(forme)
+
+
+def _glissante(matrice, fenetre, decalage=0):
+    """Somme sur les `fenetre` jours finissant `decalage` jours avant chaque jour (NaN au début)."""
+    cumul = np.zeros((matrice.shape[0], matrice.shape[1] + 1))
+    np.cumsum(matrice, axis=1, out=cumul[:, 1:])
+    somme = np.full(matrice.shape, np.nan)
+    debut = fenetre + decalage - 1
+    if debut < matrice.shape[1]:
+        fin = cumul[:, debut + 1 - decalage:matrice.shape[1] + 1 - decalage]
+        somme[:, debut:] = fin - cumul[:, :fin.shape[1]]
+    return somme
+
+
+def _periodes(drapeaux, ecarts, valeurs, plus_bas_pire):
+    """(site, premier jour, jour suivant la fin, gravité, pire valeur) des suites de jours signalés."""
+    n_sites, n_jours = drapeaux.shape
+    bord = np.zeros((n_sites, 1), dtype=np.int8)
+    transitions = np.diff(np.concatenate([bord, drapeaux.astype(np.int8), bord], axis=1), axis=1)
+    lignes, debuts = np.nonzero(transitions == 1)
+    _, fins = np.nonzero(transitions == -1)
+
+    cumul = np.zeros((n_sites, n_jours + 1))
+    np.cumsum(ecarts, axis=1, out=cumul[:, 1:])
+    gravite = cumul[lignes, fins] - cumul[lignes, debuts]
+
+    # Pire valeur de chaque période : réduction par segments du tableau aplati
+    plat = np.append(valeurs.ravel(), np.nan)
+    bornes = np.empty(2 * len(debuts), dtype=np.int64)
+    bornes[0::2] = lignes * n_jours + debuts
+    bornes[1::2] = lignes * n_jours + fins
+    reduction = np.fmin if plus_bas_pire else np.fmax
+    pire = reduction.reduceat(plat, bornes)[0::2] if len(bornes) else np.array([])
+    return lignes, debuts, fins, gravite, pire
+
+
+def balayer_flotte(jours, fenetre=FENETRE_JOURS, reference=REFERENCE_JOURS,
+                   seuil_rendement=SEUIL_RENDEMENT, seuil_batterie=SEUIL_BATTERIE,
+                   seuil_baisse=SEUIL_BAISSE):
+    """Périodes signalées de tous les sites, de la plus grave à la moins grave.
+
+    `jours` : totaux journaliers (Site, Type_Energie, Date, Production_kWh,
+    Consommation_kWh), par exemple `CubeAgrege.niveaux["Jour"].data`. Les
+    dates `Debut` et `Fin` sont les derniers jours des fenêtres signalées.
+    `fenetre` et `reference` sont des nombres entiers de jours, au moins 1
+    (ValueError sinon).
+    """
+    for nom, valeur in (("fenetre", fenetre), ("reference", reference)):
+        if int(valeur) != valeur or valeur < 1:
+            raise ValueError(f"{nom} doit être un nombre entier de jours, au moins 1 (reçu : {valeur})")
+    if jours.empty:
+        return pd.DataFrame(columns=COLONNES_ANOMALIES)
+
+    codes_site, sites = pd.factorize(jours["Site"].astype(str), sort=True)
+    dates = pd.to_datetime(jours["Date"]).dt.normalize()
+    premier = dates.min()
+    colonnes = ((dates - premier) // pd.Timedelta(days=1)).to_numpy()
+    forme = (len(sites), int(colonnes.max()) + 1)
+
+    production = jours["Production_kWh"].to_numpy(dtype=np.float64)
+    consommation = jours["Consommation_kWh"].to_numpy(dtype=np.float64)
+    batterie = np.where(jours["Type_Energie"].astype(str).to_numpy() == "Batterie", consommation, 0.0)
+
+    prod = _matrice(codes_site, colonnes, production, forme)
+    cons = _matrice(codes_site, colonnes, consommation, forme)
+    bat = _matrice(codes_site, colonnes, batterie, forme)
+    presents = _matrice(codes_site, colonnes, np.ones(len(jours)), forme) > 0
+
+    prod_f = _glissante(prod, fenetre)
+    cons_f = _glissante(cons, fenetre)
+    bat_f = _glissante(bat, fenetre)
+    couverts = _glissante(presents.astype(np.float64), fenetre) >= COUVERTURE_MIN * fenetre
+
+    prod_ref = _glissante(prod, reference, decalage=fenetre)
+    ref_couverte = _glissante(presents.astype(np.float64), reference, decalage=fenetre) >= COUVERTURE_MIN * reference
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rendement = np.where(couverts & (prod_f > 0), cons_f / prod_f * 100, np.nan)
+        part_batterie = np.where(couverts & (cons_f > 0), bat_f / cons_f, np.nan)
+        baisse = np.where(couverts & ref_couverte & (prod_ref > 0),
+                          1 - (prod_f / fenetre) / (prod_ref / reference), np.nan)
+
+    indicateurs = [
+        # (nom, valeurs, seuil, signalé si, écart relatif au seuil, plus bas = pire, facteur d'affichage)
+        ("Rendement", rendement, seuil_rendement,
+         rendement < seuil_rendement, (seuil_rendement - rendement) / seuil_rendement, True, 1),
+        ("Part batterie", part_batterie, seuil_batterie,
+         part_batterie > seuil_batterie, (part_batterie - seuil_batterie) / seuil_batterie, False, 100),
+        ("Baisse de production", baisse, seuil_baisse,
+         baisse > seuil_baisse, (baisse - seuil_baisse) / seuil_baisse, False, 100),
+    ]
+
+    morceaux = []
+    for nom, valeurs, seuil, drapeaux, ecarts, plus_bas_pire, facteur in indicateurs:
+        ecarts = np.where(drapeaux, ecarts, 0.0)
+        lignes, debuts, fins, gravite, pire = _periodes(drapeaux, ecarts, valeurs, plus_bas_pire)
+        morceaux.append(pd.DataFrame({
+            "Site": sites[lignes],
+            "Indicateur": nom,
+            "Debut": premier + pd.to_timedelta(debuts, unit="D"),
+            "Fin": premier + pd.to_timedelta(fins - 1, unit="D"),
+            "Jours": fins - debuts,
+            "Valeur": pire * facteur,
+            "Seuil": seuil * facteur,
+            "Gravite": gravite,
+        }))
+
+    anomalies = pd.concat(morceaux, ignore_index=True)
+    return anomalies.sort_values(["Gravite", "Jours"], ascending=False, kind="stable").reset_index(drop=True)
+
+
+def sites_signales(anomalies):
+    """Classement des sites : gravité totale, nombre de périodes et jours signalés."""
+    return (
+        anomalies.groupby("Site", sort=False)
+        .agg(Gravite=("Gravite", "sum"), Periodes=("Indicateur", "size"), Jours=("Jours", "sum"))
+        .sort_values("Gravite", ascending=False)
+    )
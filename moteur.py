@@ -0,0 +1,367 @@
+"""Moteur d'analyse indépendant de Streamlit.
+
+Filtrage, indicateurs, regroupements par période, alertes de maintenance et
+exports Excel / PDF sont regroupés ici pour être utilisés sans navigateur :
+le tableau de bord (`app.py`) et le mode batch (`batch.py`) s'appuient dessus.
+"""
+import importlib.util
+import io
+import os
+import re
+
+import graphiques
+import periodes
+import stockage
+from cube import PERIODES, CubeAgrege
+from index_donnees import IndexSites, bornes_journees
+from ingestion import lire_fichier
+from maintenance import SEUIL_BATTERIE, SEUIL_RENDEMENT, balayer_flotte
+from stockage import compacter
+
+# Lignes converties en objets Python à la fois pendant l'écriture Excel
+LIGNES_PAR_BLOC_EXCEL = 50_000
+# Lignes de données d'une feuille Excel (1 048 576 lignes, en-tête compris)
+LIGNES_MAX_EXCEL = 1_048_575
+FORMAT_DATE_EXCEL = "yyyy-mm-dd hh:mm:ss"
+
+
+def charger(chemin):
+    """Lit un export CSV/Excel depuis le disque (colonnes vérifiées, types compacts)."""
+    with open(chemin, "rb") as f:
+        contenu = f.read()
+    return compacter(lire_fichier(os.path.basename(chemin), contenu))
+
+
+def calculer_rendement(total_prod, total_cons):
+    return (total_cons / total_prod * 100) if total_prod > 0 else 0
+
+
+class Analyse:
+    """Données d'un import avec leur index et leur cube d'agrégats."""
+
+    def __init__(self, data, jours=None, cumuls=None):
+        # `jours` : totaux journaliers déjà calculés à l'ingestion (stockage) ;
+        # `cumuls` : sommes cumulées d'un jeu partagé (voir `stockage.projeter`)
+        self.index = IndexSites(data, cumuls)
+        self.data = self.index.data
+        self.cube = CubeAgrege(self.data, jours=jours)
+
+    @classmethod
+    def partagee(cls, empreinte):
+        """Analyse d'un jeu publié par `publier`, projeté en mémoire sans copie."""
+        data, cumuls, jours = stockage.projeter(empreinte)
+        return cls(data, jours=jours, cumuls=cumuls)
+
+    def publier(self, empreinte):
+        """Publie données triées, sommes cumulées et totaux journaliers pour les autres processus."""
+        jours = self.cube.niveaux["Jour"].data[["Site", "Type_Energie", "Date"] + stockage.COLONNES_ENERGIE]
+        return stockage.publier(self.data, self.index.cumuls, jours, empreinte)
+
+    def sites(self):
+        return self.index.sites()
+
+    def types_energie(self):
+        return self.index.types_energie()
+
+    def bornes_dates(self):
+        """Première et dernière journée présentes dans les données."""
+        return self.data["Date"].min().date(), self.data["Date"].max().date()
+
+    def selection(self, site, types, debut, fin):
+        """Lignes du site et des types d'énergie entre les journées `debut` et `fin`."""
+        return self.index.selection(site, types, *bornes_journees(debut, fin))
+
+    def indicateurs(self, site, types, debut, fin):
+        """Production, consommation, rendement et consommation batterie de la sélection."""
+        debut, fin = bornes_journees(debut, fin)
+        totaux = self.index.sommes(site, types, debut, fin)
+        total_prod = totaux["Production_kWh"]
+        total_cons = totaux["Consommation_kWh"]
+
+        bat_cons = None
+        if "Batterie" in types:
+            bat_cons = self.index.sommes(site, ["Batterie"], debut, fin)["Consommation_kWh"]
+
+        return {
+            "total_prod": total_prod,
+            "total_cons": total_cons,
+            "rendement": calculer_rendement(total_prod, total_cons),
+            "bat_cons": bat_cons,
+        }
+
+    def _mesures(self, periode, site, types, debut, fin):
+        # Totaux journaliers du cube si les périodes sont des journées entières
+        if periodes.sur_totaux_journaliers(periode):
+            return self.cube.niveaux["Jour"].selection(site, types, debut, fin)
+        return self.index.selection(site, types, debut, fin)
+
+    def regroupement(self, periode, site, types, debut, fin):
+        """Totaux par période (index = clé de période).
+
+        Jour, semaine et mois sont lus dans le cube (voir `CubeAgrege.serie`) ;
+        15 min, heure et fenêtres personnalisées sont regroupés sur les
+        mesures (voir `periodes`).
+        """
+        debut, fin = bornes_journees(debut, fin)
+        if periode in PERIODES:
+            return self.cube.serie(periode, site, types, debut, fin)
+        return periodes.regrouper(self._mesures(periode, site, types, debut, fin), periode, debut, fin)
+
+    def comparaison(self, periode, site, types, debut, fin, reference="Année précédente"):
+        """Totaux par période et totaux de la période de référence (voir `periodes.comparer`)."""
+        debut, fin = bornes_journees(debut, fin)
+        mesures = self._mesures(periode, site, types, periodes.debut_reference(debut, periode, reference), fin)
+        return periodes.comparer(mesures, periode, debut, fin, reference)
+
+    def par_type(self, site, types, debut, fin):
+        return self.cube.par_type(site, types, *bornes_journees(debut, fin))
+
+    def par_site(self, sites):
+        return self.cube.par_site(sites)
+
+    def anomalies(self, **options):
+        """Périodes signalées de tous les sites (voir `maintenance.balayer_flotte`)."""
+        return balayer_flotte(self.cube.niveaux["Jour"].data, **options)
+
+
+class AnalyseHistorique:
+    """Même interface qu'`Analyse`, lue à la demande dans l'historique SQLite.
+
+    Seules les lignes de la sélection affichée sont chargées ; indicateurs,
+    regroupements et comparaisons sont calculés sur les totaux journaliers
+    de l'historique.
+    """
+
+    def __init__(self, historique):
+        self.historique = historique
+
+    def sites(self):
+        return self.historique.sites()
+
+    def types_energie(self):
+        return self.historique.types_energie()
+
+    def bornes_dates(self):
+        debut, fin = self.historique.bornes_dates()
+        return debut.date(), fin.date()
+
+    def selection(self, site, types, debut, fin):
+        return self.historique.lire(site, types, *bornes_journees(debut, fin))
+
+    def indicateurs(self, site, types, debut, fin):
+        debut, fin = bornes_journees(debut, fin)
+        totaux = self.historique.totaux("type_energie", site, types, debut, fin)
+        total_prod = float(totaux["Production_kWh"].sum())
+        total_cons = float(totaux["Consommation_kWh"].sum())
+
+        bat_cons = None
+        if "Batterie" in types:
+            bat_cons = float(totaux["Consommation_kWh"].get("Batterie", 0.0))
+
+        return {
+            "total_prod": total_prod,
+            "total_cons": total_cons,
+            "rendement": calculer_rendement(total_prod, total_cons),
+            "bat_cons": bat_cons,
+        }
+
+    def _mesures(self, periode, site, types, debut, fin):
+        if periodes.sur_totaux_journaliers(periode):
+            return self.historique.jours(site, types, debut, fin)
+        return self.historique.lire(site, types, debut, fin)
+
+    def regroupement(self, periode, site, types, debut, fin):
+        debut, fin = bornes_journees(debut, fin)
+        if periode not in PERIODES:
+            return periodes.regrouper(self._mesures(periode, site, types, debut, fin), periode, debut, fin)
+        jours = self.historique.jours(site, types, debut, fin)
+        return CubeAgrege(jours=jours).serie(periode, site, types, debut, fin)
+
+    def comparaison(self, periode, site, types, debut, fin, reference="Année précédente"):
+        debut, fin = bornes_journees(debut, fin)
+        mesures = self._mesures(periode, site, types, periodes.debut_reference(debut, periode, reference), fin)
+        return periodes.comparer(mesures, periode, debut, fin, reference)
+
+    def par_type(self, site, types, debut, fin):
+        totaux = self.historique.totaux("type_energie", site, types, *bornes_journees(debut, fin))
+        return totaux.reindex([t for t in types if t in totaux.index]).rename_axis(None)
+
+    def par_site(self, sites):
+        totaux = self.historique.totaux("site", sites=sites)
+        return totaux.reindex(list(sites), fill_value=0.0).rename_axis(None)
+
+    def anomalies(self, **options):
+        return balayer_flotte(self.historique.jours(), **options)
+
+
+def alertes_maintenance(indicateurs, seuil_rendement=SEUIL_RENDEMENT, seuil_batterie=SEUIL_BATTERIE):
+    """Liste de (niveau, message), niveau parmi "error", "warning" et "success"."""
+    alertes = []
+    rendement = indicateurs["rendement"]
+    if rendement < seuil_rendement:
+        alertes.append(("error", f"⚠️ Rendement faible : {rendement:.1f} % (seuil {seuil_rendement} %)"))
+    else:
+        alertes.append(("success", "✅ Rendement satisfaisant"))
+
+    bat_cons = indicateurs["bat_cons"]
+    if bat_cons is not None and bat_cons > seuil_batterie * indicateurs["total_cons"]:
+        alertes.append((
+            "warning",
+            "🔋 Les batteries supportent une forte charge de consommation. Vérifiez leur état de santé.",
+        ))
+    return alertes
+
+
+# ---------------------------
+# Exports des données
+# ---------------------------
+# Les classeurs sont écrits ligne à ligne (xlsxwriter en mode mémoire
+# constante, sinon openpyxl en écriture seule) : le classeur complet n'est
+# jamais construit en mémoire, contrairement à `DataFrame.to_excel`.
+
+class TropDeLignesExcel(ValueError):
+    """Une feuille dépasse la limite de lignes d'Excel."""
+
+
+def xlsxwriter_disponible():
+    return importlib.util.find_spec("xlsxwriter") is not None
+
+
+def _lignes(df):
+    """Lignes du DataFrame en objets Python, converties bloc par bloc."""
+    for i in range(0, len(df), LIGNES_PAR_BLOC_EXCEL):
+        bloc = df.iloc[i:i + LIGNES_PAR_BLOC_EXCEL]
+        # Valeurs manquantes (NaN, NaT) écrites comme cellules vides
+        colonnes = [
+            bloc[col].astype(object).where(bloc[col].notna(), None).tolist()
+            for col in bloc.columns
+        ]
+        yield from zip(*colonnes)
+
+
+def nom_feuille(nom, pris=None):
+    """Nom de feuille Excel valide (31 caractères, sans `[]:*?/\\`).
+
+    `pris` : noms déjà utilisés dans le classeur (complété au passage). Excel
+    ne distingue pas la casse ; deux noms identiques une fois tronqués sont
+    numérotés (« Site (2) »).
+    """
+    base = re.sub(r"[\[\]:*?/\\]", "_", str(nom))[:31] or "Feuille"
+    if pris is None:
+        return base
+    resultat, numero = base, 1
+    while resultat.lower() in pris:
+        numero += 1
+        suffixe = f" ({numero})"
+        resultat = base[:31 - len(suffixe)] + suffixe
+    pris.add(resultat.lower())
+    return resultat
+
+
+def _verifier_lignes(nom, df):
+    if len(df) > LIGNES_MAX_EXCEL:
+        raise TropDeLignesExcel(
+            f"Feuille {nom} : {len(df)} lignes, au-delà de la limite d'une feuille Excel "
+            f"({LIGNES_MAX_EXCEL} lignes) ; exportez en CSV ou Parquet"
+        )
+
+
+def _ecrire_xlsxwriter(destination, feuilles):
+    import xlsxwriter
+
+    classeur = xlsxwriter.Workbook(destination, {"constant_memory": True})
+    format_date = classeur.add_format({"num_format": FORMAT_DATE_EXCEL})
+    pris = set()
+    for nom, df in feuilles:
+        _verifier_lignes(nom, df)
+        feuille = classeur.add_worksheet(nom_feuille(nom, pris))
+        feuille.write_row(0, 0, list(df.columns))
+        for col, dtype in enumerate(df.dtypes):
+            if dtype.kind == "M":
+                feuille.set_column(col, col, 19, format_date)
+        for numero, ligne in enumerate(_lignes(df), start=1):
+            feuille.write_row(numero, 0, ligne)
+    classeur.close()
+
+
+def _ecrire_openpyxl(destination, feuilles):
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+
+    classeur = Workbook(write_only=True)
+    pris = set()
+    for nom, df in feuilles:
+        _verifier_lignes(nom, df)
+        feuille = classeur.create_sheet(nom_feuille(nom, pris))
+        feuille.append(list(df.columns))
+        dates = [dtype.kind == "M" for dtype in df.dtypes]
+        for ligne in _lignes(df):
+            cellules = []
+            for valeur, est_date in zip(ligne, dates):
+                if est_date:
+                    valeur = WriteOnlyCell(feuille, valeur)
+                    valeur.number_format = FORMAT_DATE_EXCEL
+                cellules.append(valeur)
+            feuille.append(cellules)
+    classeur.save(destination)
+
+
+def _ecrire_classeur(feuilles, destination=None):
+    # `destination` : chemin du fichier ; sans destination, le contenu est renvoyé.
+    # Une feuille trop longue lève TropDeLignesExcel avant d'être écrite
+    cible = io.BytesIO() if destination is None else destination
+    if xlsxwriter_disponible():
+        _ecrire_xlsxwriter(cible, feuilles)
+    else:
+        _ecrire_openpyxl(cible, feuilles)
+    return cible.getvalue() if destination is None else None
+
+
+def export_excel(df, destination=None):
+    """Classeur Excel des données sélectionnées, écrit en flux."""
+    return _ecrire_classeur([("Sheet1", df)], destination)
+
+
+def export_excel_par_site(feuilles, destination=None):
+    """Classeur Excel avec une feuille par site.
+
+    `feuilles` est un itérable de (site, DataFrame) : avec un générateur,
+    un seul site est en mémoire à la fois.
+    """
+    return _ecrire_classeur(feuilles, destination)
+
+
+def export_csv(df):
+    """Contenu CSV des données sélectionnées."""
+    return df.to_csv(index=False).encode("utf-8")
+
+
+def export_parquet(df):
+    """Contenu Parquet des données sélectionnées (types compacts conservés)."""
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+
+def rapport_pdf(indicateurs, df, titre="Rapport - Analyse du site solaire", reduire=graphiques.REDUCTION_ACTIVE):
+    """Contenu du rapport PDF (indicateurs et graphique production / consommation)."""
+    # ReportLab n'est chargé qu'au premier rapport demandé
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer)
+    styles = getSampleStyleSheet()
+    story = []
+
+    story.append(Paragraph(titre, styles["Title"]))
+    story.append(Spacer(1, 20))
+    story.append(Paragraph(f"Production totale : {indicateurs['total_prod']:.2f} kWh", styles["Normal"]))
+    story.append(Paragraph(f"Consommation totale : {indicateurs['total_cons']:.2f} kWh", styles["Normal"]))
+    story.append(Paragraph(f"Rendement global : {indicateurs['rendement']:.1f} %", styles["Normal"]))
+    story.append(Spacer(1, 20))
+
+    image = io.BytesIO(graphiques.rapport(df, reduire))
+    story.append(Image(image, width=400, height=200))
+    doc.build(story)
+    return buffer.getvalue()
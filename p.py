@@ -1,23 +1,47 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
-import io
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet
-import tempfile
+
+import diagnostics
+import graphiques
+from cube import CubeAgrege
+from index_donnees import IndexSites, bornes_journees
+from moteur import export_excel, rapport_pdf
 
 st.set_page_config(page_title="Analyse Site Solaire", layout="wide")
 st.title("☀️ Tableau de bord - Site Solaire")
 
+# Mesures du rerun (panneau 🩺 Diagnostics de la barre latérale)
+mesures = diagnostics.demarrer("p.py")
+
+
+@diagnostics.en_cache("index_sites", st.cache_resource(max_entries=8))
+def index_sites(cle, _data):
+    # Index (site, type, date) construit une fois par fichier importé
+    return IndexSites(_data)
+
+
+@diagnostics.en_cache("cube_agrege", st.cache_resource(max_entries=8))
+def cube_agrege(cle, _data):
+    # Agrégats jour / semaine / mois construits une fois par fichier importé
+    return CubeAgrege(_data)
+
+
+@diagnostics.en_cache("classeur_excel", st.cache_resource(max_entries=8))
+def classeur_excel(cle, _df):
+    # Classeur écrit en flux, une fois par état des filtres
+    return export_excel(_df)
+
+
 # --- Chargement des données ---
 uploaded_file = st.file_uploader("📂 Importer un fichier (CSV ou Excel)", type=["csv", "xlsx"])
 
 if uploaded_file:
     # Détection de l'extension
-    if uploaded_file.name.endswith(".csv"):
-        data = pd.read_csv(uploaded_file, parse_dates=["Date"])
-    else:
-        data = pd.read_excel(uploaded_file, parse_dates=["Date"])
+    with mesures.etape("lecture"):
+        if uploaded_file.name.endswith(".csv"):
+            data = pd.read_csv(uploaded_file, parse_dates=["Date"])
+        else:
+            data = pd.read_excel(uploaded_file, parse_dates=["Date"])
 
     # Vérification des colonnes obligatoires
     colonnes_attendues = {"Date", "Site", "Type_Energie", "Production_kWh", "Consommation_kWh"}
@@ -25,8 +49,11 @@ if uploaded_file:
         st.error(f"❌ Le fichier doit contenir les colonnes suivantes : {colonnes_attendues}")
         st.stop()
 
-    # Tri par date
-    data = data.sort_values("Date")
+    # Tri par site, type d'énergie et date (index mis en cache)
+    with mesures.etape("index et cube"):
+        index = index_sites(uploaded_file.file_id, data)
+        data = index.data
+        cube = cube_agrege(uploaded_file.file_id, data)
 
     # -----------------------------
     # ⚙️ Filtres généraux (sidebar)
@@ -45,12 +72,9 @@ if uploaded_file:
     )
 
     # Application des filtres
-    mask = (
-        (data["Date"].between(pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1]))) &
-        (data["Site"] == site_choice) &
-        (data["Type_Energie"].isin(energy_types))
-    )
-    df_filtered = data.loc[mask]
+    debut, fin = bornes_journees(date_range[0], date_range[1])
+    with mesures.etape("filtrage"):
+        df_filtered = index.selection(site_choice, energy_types, debut, fin)
 
     if df_filtered.empty:
         st.warning("⚠️ Aucune donnée disponible pour les filtres sélectionnés.")
@@ -66,12 +90,14 @@ if uploaded_file:
         ])
 
         # --- Onglet 1 : Performance ---
-        with tab1:
+        with tab1, mesures.etape("onglet Performance"):
             st.subheader(f"Performance du site : {site_choice}")
             st.write(df_filtered.head())
 
-            total_prod = df_filtered["Production_kWh"].sum()
-            total_cons = df_filtered["Consommation_kWh"].sum()
+            # Totaux lus dans les sommes cumulées de l'index
+            totaux = index.sommes(site_choice, energy_types, debut, fin)
+            total_prod = totaux["Production_kWh"]
+            total_cons = totaux["Consommation_kWh"]
             rendement = (total_cons / total_prod * 100) if total_prod > 0 else 0
 
             col1, col2, col3 = st.columns(3)
@@ -80,44 +106,40 @@ if uploaded_file:
             col3.metric("Rendement global", f"{rendement:.1f} %")
 
             # Graphique production vs consommation
-            fig, ax = plt.subplots()
+            fig, ax = graphiques.nouvelle_figure()
             ax.plot(df_filtered["Date"], df_filtered["Production_kWh"], label="Production")
             ax.plot(df_filtered["Date"], df_filtered["Consommation_kWh"], label="Consommation")
             ax.set_xlabel("Date")
             ax.set_ylabel("Énergie (kWh)")
             ax.legend()
-            st.pyplot(fig)
+            with mesures.etape("graphique performance"):
+                st.pyplot(fig)
 
         # --- Onglet 2 : Consommation ---
-        with tab2:
+        with tab2, mesures.etape("onglet Consommation"):
             st.subheader("Analyse de la consommation par type d’énergie")
             for etype in df_filtered["Type_Energie"].unique():
                 subset = df_filtered[df_filtered["Type_Energie"] == etype]
                 st.line_chart(subset.set_index("Date")["Consommation_kWh"], height=200)
 
-            st.bar_chart(df_filtered.groupby("Type_Energie")["Consommation_kWh"].sum())
+            st.bar_chart(cube.par_type(site_choice, energy_types, debut, fin)["Consommation_kWh"])
 
         # --- Onglet 3 : Comparaison ---
-        with tab3:
+        with tab3, mesures.etape("onglet Comparaison"):
             st.subheader("Comparaison de périodes et de sites")
 
             periode = st.radio("Choisir la période :", ["Jour", "Semaine", "Mois"], horizontal=True)
-            if periode == "Jour":
-                df_grouped = df_filtered.groupby(df_filtered["Date"].dt.date).sum(numeric_only=True)
-            elif periode == "Semaine":
-                df_grouped = df_filtered.groupby(df_filtered["Date"].dt.isocalendar().week).sum(numeric_only=True)
-            else:
-                df_grouped = df_filtered.groupby(df_filtered["Date"].dt.to_period("M")).sum(numeric_only=True)
+            df_grouped = cube.serie(periode, site_choice, energy_types, debut, fin)
 
             st.line_chart(df_grouped["Consommation_kWh"])
 
             st.markdown("### Comparaison multi-sites")
             sites_selected = st.multiselect("Sélectionner les sites :", sites, default=sites)
-            df_sites = data[data["Site"].isin(sites_selected)].groupby("Site")["Consommation_kWh"].sum()
+            df_sites = cube.par_site(sites_selected)["Consommation_kWh"]
             st.bar_chart(df_sites)
 
         # --- Onglet 4 : Maintenance ---
-        with tab4:
+        with tab4, mesures.etape("onglet Maintenance"):
             st.subheader("Indicateurs de maintenance")
             seuil_rendement = 70
             if rendement < seuil_rendement:
@@ -125,63 +147,41 @@ if uploaded_file:
             else:
                 st.success("✅ Rendement satisfaisant")
 
-            if "Batterie" in df_filtered["Type_Energie"].values:
-                bat_cons = df_filtered[df_filtered["Type_Energie"] == "Batterie"]["Consommation_kWh"].sum()
+            if "Batterie" in energy_types:
+                bat_cons = index.sommes(site_choice, ["Batterie"], debut, fin)["Consommation_kWh"]
                 if bat_cons > 0.8 * total_cons:
                     st.warning("🔋 Les batteries supportent une forte charge de consommation. Vérifiez leur état de santé.")
 
         # -----------------------------
         # 📥 Export Excel
         # -----------------------------
-        buffer = io.BytesIO()
-        df_filtered.to_excel(buffer, index=False)
-        st.download_button(
-            label="📥 Télécharger les données en Excel",
-            data=buffer,
-            file_name="rapport_site_solaire.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+        # Écrit seulement à la demande, plus à chaque rerun
+        if st.button("📥 Préparer l'export Excel"):
+            cle_export = (uploaded_file.file_id, site_choice, tuple(energy_types), debut, fin)
+            with mesures.etape("export Excel"):
+                classeur = classeur_excel(cle_export, df_filtered)
+            st.download_button(
+                label="📥 Télécharger les données en Excel",
+                data=classeur,
+                file_name="rapport_site_solaire.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            )
 
         # -----------------------------
         # 📑 Export PDF
         # -----------------------------
         if st.button("📑 Générer rapport PDF"):
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmpfile:
-                doc = SimpleDocTemplate(tmpfile.name)
-                styles = getSampleStyleSheet()
-                story = []
-
-                # Titre
-                story.append(Paragraph("Rapport - Analyse du site solaire", styles["Title"]))
-                story.append(Spacer(1, 20))
-
-                # Indicateurs
-                story.append(Paragraph(f"Production totale : {total_prod:.2f} kWh", styles["Normal"]))
-                story.append(Paragraph(f"Consommation totale : {total_cons:.2f} kWh", styles["Normal"]))
-                story.append(Paragraph(f"Rendement global : {rendement:.1f} %", styles["Normal"]))
-                story.append(Spacer(1, 20))
-
-                # Graphique production vs consommation
-                fig, ax = plt.subplots()
-                ax.plot(df_filtered["Date"], df_filtered["Production_kWh"], label="Production")
-                ax.plot(df_filtered["Date"], df_filtered["Consommation_kWh"], label="Consommation")
-                ax.set_title("Production vs Consommation")
-                ax.legend()
-
-                # Sauvegarde du graphique
-                graph_path = tmpfile.name.replace(".pdf", ".png")
-                fig.savefig(graph_path)
-
-                story.append(Image(graph_path, width=400, height=200))
-
-                # Génération PDF
-                doc.build(story)
-
-                # Lecture du PDF généré
-                with open(tmpfile.name, "rb") as f:
-                    st.download_button(
-                        "📥 Télécharger rapport PDF",
-                        f,
-                        file_name="rapport_site_solaire.pdf",
-                        mime="application/pdf"
-                    )
+            # Rapport construit en mémoire : plus de fichiers laissés dans /tmp
+            with st.spinner("Génération du rapport…"), mesures.etape("rapport PDF"):
+                pdf = rapport_pdf(
+                    {"total_prod": total_prod, "total_cons": total_cons, "rendement": rendement},
+                    df_filtered,
+                )
+            st.download_button(
+                "📥 Télécharger rapport PDF",
+                pdf,
+                file_name="rapport_site_solaire.pdf",
+                mime="application/pdf"
+            )
+
+diagnostics.panneau(mesures)
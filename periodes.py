@@ -0,0 +1,219 @@
+"""Regroupement des mesures par période, du quart d'heure au mois, et comparaison à une période de référence.
+
+Les périodes fixes (15 min, heure, jour, semaine ISO ou fenêtre
+personnalisée) sont des intervalles de même durée comptés depuis une
+origine : le numéro de période d'une mesure s'obtient par une division
+entière de sa date. Les mois sont comptés en mois calendaires. Les totaux
+sont ensuite calculés par `np.bincount`, sans groupby ni boucle Python sur
+les lignes.
+
+La comparaison (ce mois-ci contre le même mois de l'année précédente, ou
+contre la période précédente) se fait en un seul passage sur les mesures :
+les mesures de la période de référence sont décalées d'un an (ou d'une
+période) avant d'être numérotées, puis totalisées dans les mêmes cases que
+les mesures de la période courante.
+"""
+import numpy as np
+import pandas as pd
+
+from cube import COLONNES_ENERGIE, cles_periode
+
+PERIODES = ["15 min", "Heure", "Jour", "Semaine", "Mois"]
+REFERENCES = ["Année précédente", "Période précédente"]
+
+# Durée des périodes fixes
+PAS = {
+    "15 min": pd.Timedelta(minutes=15),
+    "Heure": pd.Timedelta(hours=1),
+    "Jour": pd.Timedelta(days=1),
+    "Semaine": pd.Timedelta(days=7),
+}
+JOUR = pd.Timedelta(days=1)
+EPOQUE = np.datetime64("1970-01-01", "ns")
+# Les semaines ISO commencent le lundi ; le 5 janvier 1970 est un lundi
+ORIGINE_SEMAINES = np.datetime64("1970-01-05", "ns")
+
+COLONNES_REFERENCE = ["Production_reference_kWh", "Consommation_reference_kWh"]
+
+# Une case de totaux est allouée par période entre le début et la fin, avec
+# ou sans mesure : fenêtre personnalisée d'au moins un quart d'heure, et
+# nombre de périodes borné (environ 28 ans de quarts d'heure)
+PAS_MIN = PAS["15 min"]
+PERIODES_MAX = 1_000_000
+
+
+def pas_periode(periode):
+    """Durée d'une période fixe, ou None pour le mois calendaire.
+
+    `periode` est un nom de `PERIODES` ou, pour une fenêtre personnalisée,
+    une durée (`pd.Timedelta` ou texte comme "6h" ou "3D") d'au moins
+    `PAS_MIN`.
+    """
+    if periode == "Mois":
+        return None
+    if periode in PAS:
+        return PAS[periode]
+    try:
+        pas = pd.Timedelta(periode)
+    except ValueError:
+        raise ValueError(f"Période inconnue : {periode}") from None
+    if pas < PAS_MIN:
+        raise ValueError(f"Durée de période invalide : {periode} (au moins {PAS_MIN.total_seconds() / 60:g} min)")
+    return pas
+
+
+def libelle_periode(periode):
+    """Nom lisible d'une période (titre d'axe)."""
+    if isinstance(periode, str) and periode in PERIODES:
+        return periode
+    pas = pas_periode(periode)
+    if pas % JOUR == pd.Timedelta(0):
+        return f"Fenêtre de {pas.days} j"
+    return f"Fenêtre de {pas.total_seconds() / 3600:g} h"
+
+
+def sur_totaux_journaliers(periode):
+    """Vrai si les périodes sont faites de journées entières : les totaux journaliers suffisent."""
+    pas = pas_periode(periode)
+    return pas is None or pas % JOUR == pd.Timedelta(0)
+
+
+def _origine(periode, debut):
+    if periode == "Semaine":
+        return ORIGINE_SEMAINES
+    if periode in PAS or periode == "Mois":
+        return EPOQUE
+    # Fenêtre personnalisée : comptée depuis le début de la sélection
+    return pd.Timestamp(debut).to_datetime64().astype("datetime64[ns]")
+
+
+def _numeros(dates, pas, origine):
+    # Numéro de la période de chaque date (datetime64[ns])
+    if pas is None:
+        return dates.astype("datetime64[M]").astype(np.int64)
+    return (dates - origine).view(np.int64) // pas.value
+
+
+def _debuts(numeros, pas, origine):
+    if pas is None:
+        return numeros.astype("datetime64[M]").astype("datetime64[ns]")
+    return origine + (numeros * pas.value).astype("timedelta64[ns]")
+
+
+def _libelles(debuts, periode, pas):
+    # Mêmes clés que le cube d'agrégats ; np.datetime_as_string est bien plus
+    # rapide que strftime sur les dizaines de milliers de quarts d'heure d'une année
+    if periode == "Semaine":
+        return cles_periode(debuts, periode)[1].to_numpy()
+    if pas is None:
+        return np.datetime_as_string(debuts, unit="M")
+    if pas % JOUR == pd.Timedelta(0):
+        return np.datetime_as_string(debuts, unit="D")
+    return np.char.replace(np.datetime_as_string(debuts, unit="m"), "T", " ")
+
+
+def _decaler_mois(dates, mois):
+    """Dates décalées de `mois` mois ; un jour absent du mois visé (29 février) devient son dernier jour."""
+    debut_mois = dates.astype("datetime64[M]")
+    jours = dates.astype("datetime64[D]")
+    heures = dates - jours.astype("datetime64[ns]")
+    rang = jours - debut_mois.astype("datetime64[D]")
+    cible = debut_mois + mois
+    longueur = (cible + 1).astype("datetime64[D]") - cible.astype("datetime64[D]")
+    rang = np.minimum(rang, longueur - np.timedelta64(1, "D"))
+    return (cible.astype("datetime64[D]") + rang).astype("datetime64[ns]") + heures
+
+
+def _decalage(periode, pas, reference):
+    # (mois, durée) séparant la période de référence de la période courante
+    if reference == "Année précédente":
+        if periode == "Semaine":
+            # 52 semaines : même semaine ISO, mêmes jours de la semaine
+            return 0, pd.Timedelta(weeks=52)
+        return 12, None
+    if reference == "Période précédente":
+        return (1, None) if pas is None else (0, pas)
+    raise ValueError(f"Référence inconnue : {reference} (parmi {', '.join(REFERENCES)})")
+
+
+def _decaler(dates, decalage, sens=1):
+    mois, duree = decalage
+    if mois:
+        return _decaler_mois(dates, sens * mois)
+    return dates + sens * duree.to_timedelta64()
+
+
+def debut_reference(debut, periode, reference):
+    """Première date à lire pour comparer à partir de `debut` (début de la période de référence)."""
+    if reference is None:
+        return pd.Timestamp(debut)
+    decalage = _decalage(periode, pas_periode(periode), reference)
+    dates = np.array([pd.Timestamp(debut).to_datetime64()], dtype="datetime64[ns]")
+    return pd.Timestamp(_decaler(dates, decalage, sens=-1)[0])
+
+
+def comparer(data, periode, debut, fin, reference="Année précédente"):
+    """Totaux par période entre `debut` et `fin` inclus, avec ceux de la période de référence.
+
+    `data` doit couvrir la période de référence (voir `debut_reference`).
+    Index : clé de période ; colonnes : énergies de la période, énergies de
+    la référence (NaN sans mesure de référence) et `Evolution_pct` de la
+    consommation. Sans `reference`, seuls les totaux par période sont
+    calculés (voir `regrouper`). Le résultat est vide si `debut` est après
+    `fin` ; ValueError au-delà de `PERIODES_MAX` périodes.
+    """
+    pas = pas_periode(periode)
+    colonnes = COLONNES_ENERGIE if reference is None else COLONNES_ENERGIE + COLONNES_REFERENCE + ["Evolution_pct"]
+    if pd.Timestamp(debut) > pd.Timestamp(fin):
+        return pd.DataFrame(columns=colonnes, index=pd.Index([], name="Cle"), dtype=np.float64)
+    origine = _origine(periode, debut)
+    debut = pd.Timestamp(debut).to_datetime64().astype("datetime64[ns]")
+    fin = pd.Timestamp(fin).to_datetime64().astype("datetime64[ns]")
+    premier, dernier = _numeros(np.array([debut, fin]), pas, origine)
+    n = int(dernier - premier + 1)
+    if n > PERIODES_MAX:
+        raise ValueError(f"Trop de périodes ({n}, au plus {PERIODES_MAX}) : choisir une période plus longue "
+                         "ou une plage de dates plus courte")
+
+    dates = data["Date"].to_numpy(dtype="datetime64[ns]")
+    valeurs = np.nan_to_num(data[COLONNES_ENERGIE].to_numpy(dtype=np.float64))
+
+    # Cases [0, n) : période courante ; [n, 2n) : référence décalée
+    courant = (dates >= debut) & (dates <= fin)
+    numeros = [_numeros(dates[courant], pas, origine) - premier]
+    poids = [valeurs[courant]]
+    cases = n
+    if reference is not None:
+        decalees = _decaler(dates, _decalage(periode, pas, reference))
+        dans_reference = (decalees >= debut) & (decalees <= fin)
+        numeros.append(_numeros(decalees[dans_reference], pas, origine) - premier + n)
+        poids.append(valeurs[dans_reference])
+        cases = 2 * n
+    numeros = np.concatenate(numeros)
+    poids = np.concatenate(poids)
+
+    comptes = np.bincount(numeros, minlength=cases)
+    totaux = np.column_stack([
+        np.bincount(numeros, weights=poids[:, k], minlength=cases) for k in range(len(COLONNES_ENERGIE))
+    ])
+
+    avec_mesures = comptes[:n] > 0
+    if reference is not None:
+        avec_mesures |= comptes[n:] > 0
+    debuts = _debuts(np.arange(premier, dernier + 1)[avec_mesures], pas, origine)
+    index = pd.Index(_libelles(debuts, periode, pas), name="Cle")
+    resultat = pd.DataFrame(totaux[:n][avec_mesures], index=index, columns=COLONNES_ENERGIE)
+    if reference is None:
+        return resultat
+
+    resultat.loc[comptes[:n][avec_mesures] == 0, COLONNES_ENERGIE] = np.nan
+    references = np.where((comptes[n:][avec_mesures] > 0)[:, None], totaux[n:][avec_mesures], np.nan)
+    resultat[COLONNES_REFERENCE] = references
+    conso, conso_ref = resultat["Consommation_kWh"], resultat["Consommation_reference_kWh"]
+    resultat["Evolution_pct"] = ((conso - conso_ref) / conso_ref * 100).where(conso_ref > 0)
+    return resultat
+
+
+def regrouper(data, periode, debut, fin):
+    """Totaux des énergies par période entre `debut` et `fin` inclus (périodes sans mesure omises)."""
+    return comparer(data, periode, debut, fin, reference=None)
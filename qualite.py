@@ -0,0 +1,180 @@
+"""Contrôle qualité des données importées, en un seul passage vectorisé.
+
+Sur les lignes triées par site, type d'énergie et date (voir
+`index_donnees.trier`), chaque contrôle est une comparaison de colonnes
+numpy, sans boucle Python sur les lignes :
+- `doublon` : même site, type d'énergie et date qu'une ligne suivante (seule
+  la dernière occurrence est gardée, comme dans l'historique) ;
+- `negatif` : production ou consommation négative ;
+- `manquant` : production ou consommation absente ;
+- `production_hors_solaire` : production non nulle sur une ligne Batterie
+  ou Réseau, qui gonflerait la production totale et fausserait le rendement ;
+- `cle_manquante` : site ou type d'énergie absent ; la ligne n'appartient à
+  aucun groupe de l'index et n'entre dans aucun indicateur.
+
+Les anomalies de chaque ligne sont codées dans un octet (un bit par
+contrôle). Les trous de mesure (écart entre deux dates consécutives d'un
+même site et type supérieur à `SEUIL_TROU` fois l'écart habituel) sont
+listés à part : il n'y a pas de ligne à écarter. Les lignes signalées
+peuvent être mises en quarantaine (`quarantaine`).
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from index_donnees import codes_tries
+
+CONTROLES = {
+    "doublon": "Mesure en double (même site, type d'énergie et date)",
+    "negatif": "Énergie négative",
+    "manquant": "Énergie manquante",
+    "production_hors_solaire": "Production non nulle sur une ligne Batterie / Réseau",
+    "cle_manquante": "Site ou type d'énergie manquant",
+}
+BITS = {controle: np.uint8(1 << rang) for rang, controle in enumerate(CONTROLES)}
+# Libellé de chaque combinaison de bits ("negatif, manquant"...)
+LIBELLES_ANOMALIES = [
+    ", ".join(c for c, bit in BITS.items() if combinaison & bit) for combinaison in range(1 << len(BITS))
+]
+
+TYPES_SANS_PRODUCTION = ["Batterie", "Réseau"]
+# Un écart entre deux mesures au-delà de SEUIL_TROU × l'écart habituel est un trou
+SEUIL_TROU = float(os.environ.get("SOLAIRE_SEUIL_TROU", "1.5"))
+# Lignes signalées écartées des analyses par défaut
+QUARANTAINE_PAR_DEFAUT = os.environ.get("SOLAIRE_QUARANTAINE", "0") == "1"
+
+
+def bits_controles(controles=None):
+    """Masque de bits des `controles` (tous par défaut)."""
+    return np.uint8(sum(BITS[c] for c in (CONTROLES if controles is None else controles)))
+
+
+class RapportQualite:
+    """Résultat de `valider` : anomalies de chaque ligne et trous de mesure."""
+
+    def __init__(self, defauts, trous):
+        # defauts[i] : bits des contrôles en échec pour la ligne i (ordre de `trier`)
+        self.defauts = defauts
+        self.trous = trous
+
+    def __len__(self):
+        return len(self.defauts)
+
+    def comptes(self):
+        """{contrôle: nombre de lignes signalées}."""
+        return {controle: int(np.count_nonzero(self.defauts & bit)) for controle, bit in BITS.items()}
+
+    def masque(self, controles=None):
+        """Lignes en échec pour au moins un des `controles` (tous par défaut)."""
+        return (self.defauts & bits_controles(controles)) != 0
+
+    def lignes_signalees(self, controles=None):
+        return int(np.count_nonzero(self.masque(controles)))
+
+    def propre(self):
+        return not self.defauts.any() and self.trous.empty
+
+    def resume(self):
+        """Tableau (contrôle, lignes, part en %), avec le nombre de trous de mesure en dernière ligne."""
+        comptes = self.comptes()
+        resume = pd.DataFrame({
+            "Controle": [CONTROLES[c] for c in comptes] + ["Trous de mesure"],
+            "Lignes": list(comptes.values()) + [len(self.trous)],
+        })
+        resume["Part_pct"] = resume["Lignes"] / max(len(self), 1) * 100
+        resume.loc[resume.index[-1], "Part_pct"] = np.nan
+        return resume
+
+    def to_dict(self):
+        return {"lignes": len(self), "anomalies": self.comptes(),
+                "lignes_signalees": self.lignes_signalees(), "trous": len(self.trous)}
+
+
+def _trous(codes_site, codes_type, sites, types, dates, seuil_trou):
+    # Écarts entre dates consécutives de chaque groupe (site, type), comparés
+    # à l'écart médian du groupe ; une boucle par groupe, pas par ligne
+    colonnes = ["Site", "Type_Energie", "Debut", "Fin", "Duree", "Mesures_manquantes"]
+    if len(dates) < 2:
+        return pd.DataFrame(columns=colonnes)
+    changements = np.flatnonzero((np.diff(codes_site) != 0) | (np.diff(codes_type) != 0)) + 1
+    debuts = np.concatenate(([0], changements))
+    fins = np.concatenate((changements, [len(dates)]))
+    ecarts = np.diff(dates.view(np.int64))
+
+    morceaux = []
+    for i, j in zip(debuts, fins):
+        if codes_site[i] < 0 or codes_type[i] < 0:
+            # Lignes sans site ou sans type (code -1) : pas un groupe
+            continue
+        ecarts_groupe = ecarts[i:j - 1]
+        positifs = ecarts_groupe[ecarts_groupe > 0]
+        if len(positifs) < 2:
+            continue
+        pas = np.median(positifs)
+        rangs = np.flatnonzero(ecarts_groupe > seuil_trou * pas) + i
+        if len(rangs):
+            morceaux.append((rangs, np.full(len(rangs), pas)))
+    if not morceaux:
+        return pd.DataFrame(columns=colonnes)
+
+    rangs = np.concatenate([r for r, _ in morceaux])
+    pas = np.concatenate([p for _, p in morceaux])
+    duree = ecarts[rangs]
+    return pd.DataFrame({
+        "Site": sites[codes_site[rangs]],
+        "Type_Energie": types[codes_type[rangs]],
+        "Debut": dates[rangs],
+        "Fin": dates[rangs + 1],
+        "Duree": pd.to_timedelta(duree, unit="ns"),
+        "Mesures_manquantes": np.rint(duree / pas).astype(np.int64) - 1,
+    })
+
+
+def valider(data, types_sans_production=TYPES_SANS_PRODUCTION, seuil_trou=SEUIL_TROU):
+    """Rapport qualité des lignes de `data`, triées dans l'ordre de l'index.
+
+    `data` doit être trié (voir `index_donnees.trier`, sans copie s'il l'est
+    déjà) : les positions du rapport sont celles des lignes triées.
+    """
+    codes_site, sites = codes_tries(data["Site"])
+    codes_type, types = codes_tries(data["Type_Energie"])
+    dates = data["Date"].to_numpy(dtype="datetime64[ns]")
+    production = data["Production_kWh"].to_numpy()
+    consommation = data["Consommation_kWh"].to_numpy()
+    defauts = np.zeros(len(data), dtype=np.uint8)
+
+    # Clé incomplète : code -1 pour un site ou un type absent
+    cle_manquante = (codes_site < 0) | (codes_type < 0)
+    defauts |= cle_manquante * BITS["cle_manquante"]
+
+    # Doublons : ligne identique à la suivante (dernière occurrence gardée)
+    doublons = ((codes_site[1:] == codes_site[:-1]) & (codes_type[1:] == codes_type[:-1])
+                & (dates[1:] == dates[:-1]) & ~cle_manquante[1:])
+    defauts[:-1] |= doublons * BITS["doublon"]
+
+    with np.errstate(invalid="ignore"):
+        defauts |= ((production < 0) | (consommation < 0)) * BITS["negatif"]
+        manquantes = np.isnan(production) | np.isnan(consommation)
+        defauts |= manquantes * BITS["manquant"]
+
+        sans_production = np.isin(codes_type, np.flatnonzero(pd.Index(types).isin(types_sans_production)))
+        defauts |= (sans_production & (production != 0) & ~np.isnan(production)) * BITS["production_hors_solaire"]
+
+    trous = _trous(codes_site, codes_type, np.asarray(sites), np.asarray(types), dates, seuil_trou)
+    return RapportQualite(defauts, trous)
+
+
+def quarantaine(data, rapport, controles=None):
+    """(lignes gardées, lignes en quarantaine avec la colonne `Anomalies`).
+
+    `data` est le DataFrame validé par `rapport` (mêmes lignes, même ordre).
+    """
+    masque = rapport.masque(controles)
+    ecartees = data[masque].copy()
+    # Codes de bits convertis en libellés par une seule conversion en catégories
+    ecartees["Anomalies"] = pd.Categorical.from_codes(rapport.defauts[masque] & bits_controles(controles),
+                                                      LIBELLES_ANOMALIES)
+    if not len(ecartees):
+        return data, ecartees
+    return data[~masque].reset_index(drop=True), ecartees
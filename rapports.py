@@ -0,0 +1,92 @@
+"""Génération des rapports PDF en arrière-plan, seuls ou par lots.
+
+Les rapports sont construits entièrement en mémoire (aucun fichier
+temporaire) par un pool de threads partagé : le script Streamlit n'est pas
+bloqué et suit l'avancement. Un lot (un rapport par site ou par mois) est
+livré dans une seule archive ZIP.
+"""
+import io
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import graphiques
+from moteur import rapport_pdf
+
+RAPPORTS_WORKERS = int(os.environ.get("SOLAIRE_RAPPORTS_WORKERS", "4"))
+
+# Découpage d'un lot de rapports
+LOTS = ["Site affiché", "Tous les sites", "Un rapport par mois"]
+
+
+def nouveau_pool(workers=RAPPORTS_WORKERS):
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rapport")
+
+
+def archive_zip(fichiers):
+    """Contenu d'une archive ZIP à partir de {nom: contenu}."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for nom, contenu in fichiers.items():
+            archive.writestr(nom, contenu)
+    return buffer.getvalue()
+
+
+def _rapport(analyse, site, types, debut, fin, titre, reduire):
+    indicateurs = analyse.indicateurs(site, types, debut, fin)
+    df = analyse.selection(site, types, debut, fin)
+    return rapport_pdf(indicateurs, df, titre=titre, reduire=reduire)
+
+
+def travaux(lot, analyse, site, types, debut, fin):
+    """Liste de (nom du fichier, site, debut, fin, titre) des rapports d'un lot.
+
+    Les sites ou mois sans données dans la plage sont écartés.
+    """
+    if lot == "Tous les sites":
+        return [
+            (f"rapport_{s}.pdf", s, debut, fin, f"Rapport - {s}")
+            for s in analyse.sites()
+            if not analyse.selection(s, types, debut, fin).empty
+        ]
+    if lot == "Un rapport par mois":
+        liste = []
+        for mois in pd.period_range(debut, fin, freq="M"):
+            debut_mois = max(mois.start_time.date(), debut)
+            fin_mois = min(mois.end_time.date(), fin)
+            if not analyse.selection(site, types, debut_mois, fin_mois).empty:
+                liste.append((f"rapport_{site}_{mois}.pdf", site, debut_mois, fin_mois,
+                              f"Rapport - {site} - {mois}"))
+        return liste
+    return [("rapport_site_solaire.pdf", site, debut, fin, "Rapport - Analyse du site solaire")]
+
+
+class TacheRapports:
+    """Rapports d'un lot en cours de génération dans le pool."""
+
+    def __init__(self, pool, analyse, liste, types, reduire=graphiques.REDUCTION_ACTIVE):
+        self.noms = [nom for nom, *_ in liste]
+        self.futures = [
+            pool.submit(_rapport, analyse, site, types, debut, fin, titre, reduire)
+            for _, site, debut, fin, titre in liste
+        ]
+
+    def avancement(self):
+        """(rapports terminés, nombre de rapports)."""
+        return sum(f.done() for f in self.futures), len(self.futures)
+
+    def terminee(self):
+        return all(f.done() for f in self.futures)
+
+    def resultat(self):
+        """(nom du fichier, contenu, type MIME) : le PDF seul, ou une archive ZIP du lot.
+
+        Lève l'exception d'un rapport en échec.
+        """
+        fichiers = {nom: f.result() for nom, f in zip(self.noms, self.futures)}
+        if len(fichiers) == 1:
+            nom, contenu = next(iter(fichiers.items()))
+            return nom, contenu, "application/pdf"
+        return "rapports_site_solaire.zip", archive_zip(fichiers), "application/zip"
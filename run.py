@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
+
+import graphiques
 
 st.title("📊 Analyse de performance d’un site solaire")
 
@@ -13,7 +14,7 @@ if uploaded_file:
 
     # Exemple : graphique de la production
     st.subheader("Production solaire (kWh)")
-    fig, ax = plt.subplots()
+    fig, ax = graphiques.nouvelle_figure()
     ax.plot(data["Date"], data["Production_kWh"], label="Production réelle")
     ax.set_xlabel("Date")
     ax.set_ylabel("Énergie (kWh)")
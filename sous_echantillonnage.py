@@ -0,0 +1,94 @@
+"""Réduction du nombre de points des séries temporelles avant affichage.
+
+Deux méthodes, qui renvoient les positions des points à garder :
+- `lttb` : Largest-Triangle-Three-Buckets, garde la forme de la courbe ;
+- `min_max` : enveloppe min / max par seau, garde exactement pics et creux.
+
+Au-delà d'environ un point par pixel, les points supplémentaires ne changent
+pas l'image mais coûtent du temps de tracé.
+"""
+import numpy as np
+
+METHODES = ("lttb", "min_max")
+
+
+def _numerique(x):
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype("datetime64[ns]").view(np.int64).astype(np.float64)
+    if np.issubdtype(x.dtype, np.number):
+        return x.astype(np.float64)
+    # Abscisses non numériques (libellés de périodes) : positions
+    return np.arange(len(x), dtype=np.float64)
+
+
+def _seaux(n, n_seaux):
+    # Bornes de `n_seaux` seaux de tailles (presque) égales couvrant n points
+    return np.linspace(0, n, n_seaux + 1).astype(np.int64)
+
+
+def min_max(y, n_points):
+    """Positions du minimum et du maximum de chaque seau (2 points par seau)."""
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= n_points or n_points < 4:
+        return np.arange(n)
+
+    bornes = _seaux(n, n_points // 2)
+    debuts, tailles = bornes[:-1], np.diff(bornes)
+    numero = np.repeat(np.arange(len(debuts)), tailles)
+
+    positions = [np.array([0, n - 1])]
+    for reduction in (np.fmin, np.fmax):
+        extremes = reduction.reduceat(y, debuts)
+        trouves = np.flatnonzero(y == extremes[numero])
+        # Premier point atteignant l'extremum dans chaque seau
+        _, premiers = np.unique(numero[trouves], return_index=True)
+        positions.append(trouves[premiers])
+    return np.unique(np.concatenate(positions))
+
+
+def lttb(x, y, n_points):
+    """Positions retenues par Largest-Triangle-Three-Buckets.
+
+    Le premier et le dernier point sont toujours gardés ; dans chaque seau
+    on garde le point qui forme le plus grand triangle avec le point retenu
+    au seau précédent et la moyenne du seau suivant.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= n_points or n_points < 3:
+        return np.arange(n)
+    x = _numerique(x)
+
+    # Seaux intérieurs (le premier et le dernier point sont à part)
+    bornes = 1 + _seaux(n - 2, n_points - 2)
+    debuts, fins = bornes[:-1], bornes[1:]
+
+    # Moyennes de tous les seaux en une fois, puis celle du dernier point
+    tailles = np.diff(bornes)
+    moy_x = np.add.reduceat(x[1:n - 1], debuts - 1) / tailles
+    moy_y = np.add.reduceat(np.nan_to_num(y[1:n - 1]), debuts - 1) / tailles
+    moy_x = np.append(moy_x[1:], x[-1])
+    moy_y = np.append(moy_y[1:], y[-1])
+
+    positions = np.empty(n_points, dtype=np.int64)
+    positions[0], positions[-1] = 0, n - 1
+    a = 0
+    for k, (i, j) in enumerate(zip(debuts, fins)):
+        ax_, ay_ = x[a], y[a]
+        aires = np.abs(
+            (ax_ - moy_x[k]) * (y[i:j] - ay_) - (ax_ - x[i:j]) * (moy_y[k] - ay_)
+        )
+        a = i + int(np.nanargmax(aires)) if not np.all(np.isnan(aires)) else i
+        positions[k + 1] = a
+    return positions
+
+
+def reduire(x, y, n_points, methode="lttb"):
+    """Positions des points à tracer pour la série (x, y)."""
+    if methode == "lttb":
+        return lttb(x, y, n_points)
+    if methode == "min_max":
+        return min_max(y, n_points)
+    raise ValueError(f"Méthode inconnue : {methode}")
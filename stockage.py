@@ -0,0 +1,401 @@
+"""Stockage Parquet partitionné (Site / Mois) des données importées.
+
+Les données sont converties en types compacts (catégories pour `Site` et
+`Type_Energie`, float32 pour les énergies, datetime64 pour les dates) puis
+écrites en Parquet partitionné par site et par mois. Le tableau de bord
+recharge un import en entier (`lire` sans filtre) ; `lire` peut aussi ne
+lire que certaines colonnes et partitions (sites, mois) pour un script.
+
+Avec `SOLAIRE_PARTAGE=1`, un import analysé est aussi publié en Arrow IPC
+non compressé (voir `publier`) : les autres processus serveur le projettent
+en mémoire au lieu de le relire et d'en garder chacun une copie.
+"""
+import importlib.util
+import json
+import os
+import shutil
+import time
+import uuid
+
+import pandas as pd
+
+from cube import agreger_jours, fusionner_jours
+from index_donnees import trier
+
+RACINE_STOCKAGE = os.environ.get("SOLAIRE_STOCKAGE", ".solaire_donnees")
+# Jeux analysés publiés pour les autres processus (voir `publier`)
+PARTAGE_ACTIF = os.environ.get("SOLAIRE_PARTAGE", "0") == "1"
+# Rétention (voir `nettoyer`) : taille totale des jeux gardés sur disque, et
+# jours sans utilisation au-delà desquels un jeu est supprimé (0 : sans limite)
+RETENTION_MO = int(os.environ.get("SOLAIRE_RETENTION_MO", "10240"))
+RETENTION_JOURS = float(os.environ.get("SOLAIRE_RETENTION_JOURS", "30"))
+# Un dossier temporaire (écriture interrompue) plus vieux que ce délai est abandonné
+DELAI_TEMPORAIRE_S = 24 * 3600
+
+COLONNES = ["Date", "Site", "Type_Energie", "Production_kWh", "Consommation_kWh"]
+COLONNES_ENERGIE = ["Production_kWh", "Consommation_kWh"]
+COLONNES_CATEGORIES = ["Site", "Type_Energie"]
+
+# Totaux journaliers enregistrés avec le jeu de données ("_" : ignoré à la
+# lecture du jeu partitionné)
+FICHIER_JOURS = "_jours.parquet"
+# Compte rendu de l'ingestion (lignes écartées), relu dans `data.attrs`
+FICHIER_INGESTION = "_ingestion.json"
+
+
+def parquet_disponible():
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def compacter(data):
+    """Convertit les colonnes dans des types compacts (sans copie inutile)."""
+    data = data.copy(deep=False)
+    data["Date"] = pd.to_datetime(data["Date"])
+    return compacter_colonnes(data)
+
+
+def compacter_colonnes(data):
+    """Comme `compacter`, limité aux colonnes présentes."""
+    for col in COLONNES_CATEGORIES:
+        if col in data.columns:
+            if isinstance(data[col].dtype, pd.StringDtype):
+                # Blocs écrits en texte (`ingestion.lire_par_blocs`) : catégories
+                # en objets, comme pour les autres chemins de lecture
+                data[col] = data[col].astype(object)
+            data[col] = data[col].astype("category")
+    for col in COLONNES_ENERGIE:
+        if col in data.columns:
+            data[col] = data[col].astype("float32")
+    return data
+
+
+def chemin_jeu(empreinte_fichier, racine=RACINE_STOCKAGE):
+    return os.path.join(racine, empreinte_fichier)
+
+
+def existe(empreinte_fichier, racine=RACINE_STOCKAGE):
+    if not os.path.isdir(chemin_jeu(empreinte_fichier, racine)):
+        return False
+    _marquer_utilise(chemin_jeu(empreinte_fichier, racine))
+    return True
+
+
+def ecrire(data, empreinte_fichier, racine=RACINE_STOCKAGE):
+    """Écrit le jeu de données en Parquet partitionné par Site et Mois."""
+    destination = chemin_jeu(empreinte_fichier, racine)
+    if os.path.isdir(destination):
+        return destination
+
+    return ecrire_par_blocs([compacter(data)], empreinte_fichier, racine)
+
+
+def ecrire_par_blocs(blocs, empreinte_fichier, racine=RACINE_STOCKAGE):
+    """Écrit une suite de blocs dans un même jeu partitionné, avec ses totaux journaliers.
+
+    Un seul bloc est en mémoire à la fois ; les totaux journaliers sont mis à
+    jour bloc par bloc. Tous les blocs doivent avoir les mêmes colonnes et types.
+    Les fichiers écrits par les blocs sont ensuite réunis, un par partition.
+    """
+    destination = chemin_jeu(empreinte_fichier, racine)
+    if os.path.isdir(destination):
+        return destination
+
+    # Écriture dans un dossier temporaire puis renommage : une autre session
+    # ne voit jamais un jeu de données à moitié écrit
+    temporaire = os.path.join(racine, f".{empreinte_fichier}.{uuid.uuid4().hex}")
+    os.makedirs(racine, exist_ok=True)
+    jours = []
+    invalides = 0
+    try:
+        for numero, bloc in enumerate(blocs):
+            table = bloc.assign(Mois=bloc["Date"].dt.strftime("%Y-%m"))
+            table.to_parquet(
+                temporaire, partition_cols=["Site", "Mois"], index=False,
+                basename_template=f"bloc-{numero:05d}-{{i}}.parquet",
+            )
+            jours.append(agreger_jours(bloc))
+            invalides += bloc.attrs.get("lignes_invalides", 0)
+            # Fusion régulière : les totaux partiels restent de taille bornée
+            if len(jours) >= 16:
+                jours = [fusionner_jours(jours)]
+        _regrouper_fichiers(temporaire)
+        if jours:
+            fusionner_jours(jours).to_parquet(os.path.join(temporaire, FICHIER_JOURS), index=False)
+        with open(os.path.join(temporaire, FICHIER_INGESTION), "w", encoding="utf-8") as f:
+            json.dump({"lignes_invalides": invalides}, f)
+    except BaseException:
+        shutil.rmtree(temporaire, ignore_errors=True)
+        raise
+
+    try:
+        os.rename(temporaire, destination)
+    except OSError:
+        # Jeu déjà écrit par une autre session entre-temps
+        shutil.rmtree(temporaire, ignore_errors=True)
+    nettoyer(racine, garder={empreinte_fichier})
+    return destination
+
+
+def _regrouper_fichiers(dossier):
+    """Réunit en un seul fichier les fichiers de chaque partition (Site / Mois).
+
+    Chaque bloc écrit un fichier dans chaque partition qu'il touche : un
+    export trié par date, lu en de nombreux blocs, laisse des milliers de
+    petits fichiers qui ralentissent toutes les lectures. Une partition
+    (un site, un mois) est relue à la fois.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    for chemin, _, noms in os.walk(dossier):
+        noms = sorted(nom for nom in noms if nom.endswith(".parquet"))
+        if len(noms) < 2:
+            continue
+        # Ordre des blocs conservé (bloc-00000, bloc-00001…)
+        table = pa.concat_tables([pq.ParquetFile(os.path.join(chemin, nom)).read() for nom in noms])
+        # Dossier temporaire, pas encore visible des autres sessions
+        pq.write_table(table, os.path.join(chemin, "partition.parquet"))
+        for nom in noms:
+            os.remove(os.path.join(chemin, nom))
+
+
+def lire_jours(empreinte_fichier, racine=RACINE_STOCKAGE):
+    """Totaux journaliers enregistrés à l'ingestion, ou None."""
+    chemin = os.path.join(chemin_jeu(empreinte_fichier, racine), FICHIER_JOURS)
+    if not os.path.isfile(chemin):
+        return None
+    _marquer_utilise(chemin_jeu(empreinte_fichier, racine))
+    return pd.read_parquet(chemin)
+
+
+def lire_compte_rendu(empreinte_fichier, racine=RACINE_STOCKAGE):
+    """Compte rendu de l'ingestion ({"lignes_invalides": n}), vide pour un jeu plus ancien."""
+    chemin = os.path.join(chemin_jeu(empreinte_fichier, racine), FICHIER_INGESTION)
+    if not os.path.isfile(chemin):
+        return {}
+    with open(chemin, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _filtres(sites=None, debut=None, fin=None):
+    filtres = []
+    if sites is not None:
+        filtres.append(("Site", "in", list(sites)))
+    if debut is not None:
+        filtres.append(("Mois", ">=", pd.Timestamp(debut).strftime("%Y-%m")))
+    if fin is not None:
+        filtres.append(("Mois", "<=", pd.Timestamp(fin).strftime("%Y-%m")))
+    return filtres or None
+
+
+# ---------------------------
+# Rétention
+# ---------------------------
+# La date de modification du dossier d'un jeu sert de date de dernière
+# utilisation. Un jeu supprimé est d'abord renommé (dossier caché) : une
+# autre session le voit présent et complet, ou absent, jamais à moitié effacé.
+
+def _marquer_utilise(dossier):
+    try:
+        os.utime(dossier)
+    except OSError:
+        pass
+
+
+def _taille(dossier):
+    return sum(os.path.getsize(os.path.join(chemin, nom))
+               for chemin, _, noms in os.walk(dossier) for nom in noms)
+
+
+def _supprimer(dossier):
+    parent, nom = os.path.split(dossier)
+    corbeille = os.path.join(parent, f".{nom}.supprime.{uuid.uuid4().hex}")
+    try:
+        os.rename(dossier, corbeille)
+    except OSError:
+        # Déjà supprimé par une autre session
+        return False
+    shutil.rmtree(corbeille, ignore_errors=True)
+    return True
+
+
+def _nettoyer_dossier(dossier, budget_octets, age_max_s, garder=(), ignorer=()):
+    """Supprime les jeux de `dossier` inutilisés depuis `age_max_s`, puis les moins
+    récemment utilisés tant que la taille totale dépasse `budget_octets`."""
+    if not os.path.isdir(dossier):
+        return []
+    maintenant = time.time()
+    jeux = []
+    for entree in os.scandir(dossier):
+        if not entree.is_dir() or entree.name in ignorer:
+            continue
+        utilise = entree.stat().st_mtime
+        if entree.name.startswith("."):
+            # Écriture interrompue ou suppression inachevée
+            if maintenant - utilise > DELAI_TEMPORAIRE_S:
+                shutil.rmtree(entree.path, ignore_errors=True)
+            continue
+        jeux.append((utilise, entree.name, entree.path))
+
+    supprimes = []
+    total = sum(_taille(chemin) for _, _, chemin in jeux)
+    # Du moins récemment utilisé au plus récent
+    for utilise, nom, chemin in sorted(jeux):
+        if nom in garder:
+            continue
+        trop_vieux = age_max_s and maintenant - utilise > age_max_s
+        if not trop_vieux and total <= budget_octets:
+            break
+        taille = _taille(chemin)
+        if _supprimer(chemin):
+            supprimes.append(nom)
+            total -= taille
+    return supprimes
+
+
+def nettoyer(racine=RACINE_STOCKAGE, budget_octets=RETENTION_MO * 1024 ** 2,
+             age_max_s=RETENTION_JOURS * 86400, garder=()):
+    """Applique la rétention aux jeux stockés ; renvoie les empreintes supprimées.
+
+    Appelé après chaque écriture ; `garder` : empreintes à ne pas supprimer
+    (le jeu qui vient d'être écrit).
+    """
+    return _nettoyer_dossier(racine, budget_octets, age_max_s, garder, ignorer={"partage"})
+
+
+def nettoyer_partage(racine=RACINE_STOCKAGE, budget_octets=RETENTION_MO * 1024 ** 2,
+                     age_max_s=RETENTION_JOURS * 86400, garder=()):
+    """Même rétention pour les jeux publiés (voir `publier`), appelée après chaque publication.
+
+    Un jeu supprimé reste lisible par les processus qui l'ont déjà projeté ;
+    les autres le republient au besoin.
+    """
+    return _nettoyer_dossier(os.path.join(racine, "partage"), budget_octets, age_max_s, garder)
+
+
+def lire(empreinte_fichier, colonnes=None, sites=None, debut=None, fin=None,
+         racine=RACINE_STOCKAGE):
+    """Recharge le jeu de données en ne lisant que les colonnes et partitions utiles.
+
+    `colonnes` limite les colonnes lues, `sites` et `debut`/`fin` élaguent les
+    partitions (le filtre exact sur les dates est appliqué ensuite).
+    """
+    import pyarrow.dataset as ds
+
+    lues = None
+    if colonnes is not None:
+        lues = list(dict.fromkeys(list(colonnes) + (["Date"] if debut or fin else [])))
+
+    _marquer_utilise(chemin_jeu(empreinte_fichier, racine))
+    data = pd.read_parquet(
+        chemin_jeu(empreinte_fichier, racine),
+        columns=lues,
+        filters=_filtres(sites, debut, fin),
+        # Partitions lues en texte : un site manquant (partition
+        # __HIVE_DEFAULT_PARTITION__) ne peut pas entrer dans un dictionnaire Arrow
+        partitioning=ds.partitioning(flavor="hive"),
+    )
+    # Types compacts quel que soit le chemin d'écriture (blocs en texte brut)
+    data = compacter_colonnes(data.drop(columns=["Mois"], errors="ignore"))
+    data.attrs = lire_compte_rendu(empreinte_fichier, racine)
+
+    if debut is not None:
+        data = data[data["Date"] >= pd.Timestamp(debut)]
+    if fin is not None:
+        data = data[data["Date"] <= pd.Timestamp(fin)]
+    # Les partitions sont relues dans l'ordre des dossiers : on remet les
+    # lignes dans l'ordre de l'index (site, type, date)
+    if {"Site", "Type_Energie", "Date"}.issubset(data.columns):
+        data = trier(data)
+    elif "Date" in data.columns:
+        data = data.sort_values("Date", kind="stable")
+    if colonnes is None:
+        # Les colonnes de partition sont relues en dernier : ordre d'origine
+        colonnes = [c for c in COLONNES if c in data.columns]
+        colonnes += [c for c in data.columns if c not in colonnes]
+    return data[list(colonnes)].reset_index(drop=True)
+
+
+# ---------------------------
+# Jeu partagé entre processus
+# ---------------------------
+# Un jeu publié est un dossier de fichiers Arrow IPC (format de fichier,
+# sans compression) : données triées et sommes cumulées de l'index, plus les
+# totaux journaliers. Projetés en mémoire (mmap), ils sont lus directement
+# dans le cache de pages du système : chaque processus et chaque session
+# construit ses DataFrames sur les mêmes pages, sans copie. Les tableaux
+# obtenus sont en lecture seule.
+
+def chemin_partage(empreinte_fichier, racine=RACINE_STOCKAGE):
+    return os.path.join(racine, "partage", empreinte_fichier)
+
+
+def partage_publie(empreinte_fichier, racine=RACINE_STOCKAGE):
+    if not os.path.isdir(chemin_partage(empreinte_fichier, racine)):
+        return False
+    _marquer_utilise(chemin_partage(empreinte_fichier, racine))
+    return True
+
+
+def _ecrire_ipc(table, chemin):
+    import pyarrow as pa
+
+    # Un seul lot par colonne : chaque colonne se projette en un tableau numpy contigu
+    table = table.combine_chunks()
+    with pa.OSFile(chemin, "wb") as fichier, pa.ipc.new_file(fichier, table.schema) as ecrivain:
+        ecrivain.write_table(table)
+
+
+def _projeter_ipc(chemin):
+    import pyarrow as pa
+
+    return pa.ipc.open_file(pa.memory_map(chemin, "r")).read_all()
+
+
+def publier(data, cumuls, jours, empreinte_fichier, racine=RACINE_STOCKAGE):
+    """Publie un jeu trié, ses sommes cumulées ({colonne: tableau}) et ses totaux journaliers."""
+    import pyarrow as pa
+
+    destination = chemin_partage(empreinte_fichier, racine)
+    if os.path.isdir(destination):
+        return destination
+
+    # Même écriture atomique que `ecrire_par_blocs`
+    temporaire = os.path.join(racine, "partage", f".{empreinte_fichier}.{uuid.uuid4().hex}")
+    os.makedirs(temporaire)
+    try:
+        _ecrire_ipc(pa.Table.from_pandas(data, preserve_index=False), os.path.join(temporaire, "donnees.arrow"))
+        _ecrire_ipc(pa.table(cumuls), os.path.join(temporaire, "cumuls.arrow"))
+        jours.to_parquet(os.path.join(temporaire, FICHIER_JOURS), index=False)
+    except BaseException:
+        shutil.rmtree(temporaire, ignore_errors=True)
+        raise
+
+    try:
+        os.rename(temporaire, destination)
+    except OSError:
+        shutil.rmtree(temporaire, ignore_errors=True)
+    nettoyer_partage(racine, garder={empreinte_fichier})
+    return destination
+
+
+def _colonne_numpy(colonne):
+    # Un seul lot (cas courant) : vue sans copie ; aucun lot (table vide) : tableau vide
+    if colonne.num_chunks == 1:
+        return colonne.chunk(0).to_numpy(zero_copy_only=True)
+    return colonne.combine_chunks().to_numpy(zero_copy_only=True)
+
+
+def projeter(empreinte_fichier, racine=RACINE_STOCKAGE):
+    """(données, sommes cumulées, totaux journaliers) d'un jeu publié, projetés en mémoire.
+
+    Dates et énergies sont des vues sur les pages projetées ; seuls les
+    codes des catégories sont convertis.
+    """
+    dossier = chemin_partage(empreinte_fichier, racine)
+    _marquer_utilise(dossier)
+    # split_blocks : un bloc par colonne, pas de consolidation (qui copierait)
+    data = _projeter_ipc(os.path.join(dossier, "donnees.arrow")).to_pandas(split_blocks=True)
+    table_cumuls = _projeter_ipc(os.path.join(dossier, "cumuls.arrow"))
+    cumuls = {col: _colonne_numpy(table_cumuls.column(col)) for col in table_cumuls.column_names}
+    return data, cumuls, pd.read_parquet(os.path.join(dossier, FICHIER_JOURS))
@@ -0,0 +1,36 @@
+"""Tests de la lecture incrémentale du dossier de dépôt."""
+import depot
+from historique import Historique
+
+ENTETE = "Date,Site,Type_Energie,Production_kWh,Consommation_kWh\n"
+
+
+def _ligne(jour, production):
+    return f"2025-01-{jour:02d},Site_A,Solaire,{production},1.0\n"
+
+
+def _production(historique):
+    return historique._requete("SELECT date, production FROM mesures ORDER BY date")
+
+
+def test_ajout_lu_seul(tmp_path):
+    historique = Historique(str(tmp_path / "h.sqlite"))
+    chemin = tmp_path / "export.csv"
+    chemin.write_text(ENTETE + _ligne(1, 1.0) + _ligne(2, 2.0))
+    assert depot.traiter_fichier(historique, str(chemin)) == 2
+
+    with open(chemin, "a") as f:
+        f.write(_ligne(3, 3.0))
+    assert depot.traiter_fichier(historique, str(chemin)) == 1
+
+
+def test_reecriture_sur_place_relue_en_entier(tmp_path):
+    historique = Historique(str(tmp_path / "h.sqlite"))
+    chemin = tmp_path / "export.csv"
+    chemin.write_text(ENTETE + _ligne(1, 1.0) + _ligne(2, 2.0))
+    depot.traiter_fichier(historique, str(chemin))
+
+    # Même en-tête, taille supérieure, mais lignes déjà lues corrigées
+    chemin.write_text(ENTETE + _ligne(1, 5.0) + _ligne(2, 6.0) + _ligne(3, 7.0))
+    assert depot.traiter_fichier(historique, str(chemin)) == 3
+    assert [production for _, production in _production(historique)] == [5.0, 6.0, 7.0]
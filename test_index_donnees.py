@@ -0,0 +1,43 @@
+"""Tests de l'index trié (Site, Type_Energie, Date)."""
+import numpy as np
+import pandas as pd
+
+from index_donnees import IndexSites
+
+
+def _donnees(sites):
+    return pd.DataFrame({
+        "Date": pd.to_datetime(["2025-01-01", "2025-01-02", "2025-01-01", "2025-01-02", "2025-01-03"]),
+        "Site": sites,
+        "Type_Energie": ["Solaire"] * 5,
+        "Production_kWh": [1.0, 2.0, 3.0, 4.0, 100.0],
+        "Consommation_kWh": [1.0, 1.0, 1.0, 1.0, 100.0],
+    })
+
+
+def test_site_manquant_hors_des_groupes():
+    # Une ligne sans site ne doit pas remplacer le groupe du dernier site
+    index = IndexSites(_donnees(["A", "A", "B", "B", None]))
+
+    assert index.sites() == ["A", "B"]
+    assert len(index.selection("B", ["Solaire"])) == 2
+    assert index.sommes("B", ["Solaire"]) == {"Production_kWh": 7.0, "Consommation_kWh": 2.0}
+
+
+def test_site_manquant_categorie():
+    data = _donnees(["A", "A", "B", "B", np.nan])
+    data["Site"] = data["Site"].astype("category")
+    index = IndexSites(data)
+
+    assert index.sites() == ["A", "B"]
+    assert index.sommes("B", ["Solaire"])["Production_kWh"] == 7.0
+    assert index.selection("B", ["Solaire"])["Production_kWh"].tolist() == [3.0, 4.0]
+
+
+def test_type_manquant_hors_des_groupes():
+    data = _donnees(["A", "A", "B", "B", "B"])
+    data.loc[4, "Type_Energie"] = None
+    index = IndexSites(data)
+
+    assert index.types_energie() == ["Solaire"]
+    assert index.sommes("B", ["Solaire"])["Production_kWh"] == 7.0
@@ -0,0 +1,24 @@
+"""Tests des exports Excel."""
+import io
+
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+import moteur
+
+
+def test_noms_de_feuilles_uniques():
+    df = pd.DataFrame({"a": [1, 2]})
+    long = "Centrale_photovoltaique_du_nord"
+    contenu = moteur.export_excel_par_site([(long + "_1", df), (long + "_2", df), ("Site", df), ("SITE", df)])
+
+    assert load_workbook(io.BytesIO(contenu)).sheetnames == [long, long[:27] + " (2)", "Site", "SITE (2)"]
+
+
+def test_trop_de_lignes_pour_excel(monkeypatch):
+    monkeypatch.setattr(moteur, "LIGNES_MAX_EXCEL", 3)
+
+    with pytest.raises(moteur.TropDeLignesExcel):
+        moteur.export_excel(pd.DataFrame({"a": range(4)}))
+    assert moteur.export_excel(pd.DataFrame({"a": range(3)}))
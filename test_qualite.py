@@ -0,0 +1,26 @@
+"""Tests du contrôle qualité des imports."""
+import pandas as pd
+
+import qualite
+from index_donnees import trier
+
+
+def test_cle_manquante_signalee_et_ecartee():
+    data = trier(pd.DataFrame({
+        "Date": pd.to_datetime(["2025-01-01", "2025-01-02", "2025-01-01", "2025-01-02",
+                                "2025-01-01", "2025-01-02", "2025-01-20"]),
+        "Site": ["A", "A", "B", "B", None, None, None],
+        "Type_Energie": ["Solaire"] * 7,
+        "Production_kWh": [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0],
+        "Consommation_kWh": [1.0] * 7,
+    }))
+    rapport = qualite.valider(data)
+
+    assert rapport.comptes()["cle_manquante"] == 3
+    assert rapport.lignes_signalees() == 3
+    # L'écart entre les lignes sans site n'est attribué à aucun site
+    assert rapport.trous.empty
+
+    gardees, ecartees = qualite.quarantaine(data, rapport)
+    assert gardees["Site"].notna().all()
+    assert ecartees["Anomalies"].tolist() == ["cle_manquante"] * 3